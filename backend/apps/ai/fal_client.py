@@ -10,6 +10,7 @@ from urllib.parse import urlparse, urlunparse
 import ipaddress
 
 import requests
+from apps.chats import timing
 from .errors import FALError
 
 FAL_BASE = 'https://fal.run'
@@ -134,7 +135,8 @@ def chat_completion(prompt: str, model: str = 'google/gemini-2.5-flash', system_
         payload['system_prompt'] = system_prompt
     if max_tokens is not None:
         payload['max_tokens'] = max_tokens
-    r = requests.post(f'{FAL_BASE}/{FAL_CHAT_ENDPOINT}', headers=_fal_headers(), json=payload, timeout=120)
+    with timing.span('fal.chat', model=model, prompt_chars=len(prompt) + len(system_prompt or '')):
+        r = requests.post(f'{FAL_BASE}/{FAL_CHAT_ENDPOINT}', headers=_fal_headers(), json=payload, timeout=120)
     r.raise_for_status()
     data = r.json()
     if 'output' not in data:
@@ -267,7 +269,8 @@ def image_generation_fal(prompt: str, model: str = FAL_IMAGEN4, aspect_ratio: st
 
     if _fal_debug_enabled():
         logger.info("fal request: endpoint=%s payload=%s", endpoint, _sanitize_payload(payload))
-    r = requests.post(f'{FAL_BASE}/{endpoint}', headers=_fal_headers(), json=payload, timeout=180)
+    with timing.span('fal.image', endpoint=endpoint, num_images=num_images):
+        r = requests.post(f'{FAL_BASE}/{endpoint}', headers=_fal_headers(), json=payload, timeout=180)
     if not r.ok:
         try:
             err = r.json()
@@ -326,7 +329,8 @@ def tts_minimax(
             'pitch': 0,
         },
     }
-    r = requests.post(f'{FAL_BASE}/{FAL_TTS_MINIMAX}', headers=_fal_headers(), json=payload, timeout=120)
+    with timing.span('fal.tts', chars=len(payload['prompt'])):
+        r = requests.post(f'{FAL_BASE}/{FAL_TTS_MINIMAX}', headers=_fal_headers(), json=payload, timeout=120)
     r.raise_for_status()
     data = r.json()
     audio = data.get('audio') or {}
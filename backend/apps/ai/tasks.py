@@ -1,10 +1,13 @@
 from typing import Optional, Tuple
+import functools
 import re
 
 from celery import shared_task
 from django.db import transaction
 from apps.chats.models import Message, ImageRecord, Job, Document
 from apps.chats.services import memory_service
+from apps.chats.indexing import index_memory
+from apps.chats import timing
 from .router import (
     run_chat,
     run_image,
@@ -70,7 +73,20 @@ def strip_doc_marker(prompt: str, marker: str) -> str:
     return cleaned.strip()
 
 
+def traced_job(task_fn):
+    """Runs a job task inside a timing trace and stores the spans on Job.timings."""
+    @functools.wraps(task_fn)
+    def wrapper(self, job_id: int, *args, **kwargs):
+        with timing.trace() as trace:
+            try:
+                return task_fn(self, job_id, *args, **kwargs)
+            finally:
+                Job.objects.filter(pk=job_id).update(timings=trace.as_dict())
+    return wrapper
+
+
 @shared_task(bind=True, max_retries=2)
+@traced_job
 def task_chat(self, job_id: int, prompt: str, model: str, system_prompt: Optional[str] = None):
     job = Job.objects.get(pk=job_id)
     job.status = 'running'
@@ -120,12 +136,13 @@ def task_chat(self, job_id: int, prompt: str, model: str, system_prompt: Optiona
             if not prompt_for_model:
                 prompt_for_model = prompt
 
-            memories = memory_service.search_memory(
-                [job.session.id],
-                prompt_for_model,
-                limit=6,
-                document_id=doc.id
-            )
+            with timing.span('task_chat.context', document_scoped=True):
+                memories = memory_service.search_memory(
+                    [job.session.id],
+                    prompt_for_model,
+                    limit=6,
+                    document_id=doc.id
+                )
 
             context_lines = []
             for idx, m in enumerate(memories, start=1):
@@ -164,16 +181,19 @@ def task_chat(self, job_id: int, prompt: str, model: str, system_prompt: Optiona
                 f"{doc_context}\n\n"
                 f"{doc_rules}"
             )
-            reply = run_chat(prompt_for_model, model=model, system_prompt=enhanced_system_prompt)
+            with timing.span('task_chat.generate', model=model):
+                reply = run_chat(prompt_for_model, model=model, system_prompt=enhanced_system_prompt)
         else:
-            enhanced_system_prompt = get_rag_enhanced_system_prompt(
-                job.session.id,
-                prompt,
-                base_system_prompt,
-                recent_conversation=recent_conversation,
-                exclude_sources=['pdf'],
-            )
-            reply = run_chat(prompt, model=model, system_prompt=enhanced_system_prompt)
+            with timing.span('task_chat.context', document_scoped=False):
+                enhanced_system_prompt = get_rag_enhanced_system_prompt(
+                    job.session.id,
+                    prompt,
+                    base_system_prompt,
+                    recent_conversation=recent_conversation,
+                    exclude_sources=['pdf'],
+                )
+            with timing.span('task_chat.generate', model=model):
+                reply = run_chat(prompt, model=model, system_prompt=enhanced_system_prompt)
         with transaction.atomic():
             msg = Message.objects.create(session=job.session, role='assistant', content=reply, citations=citations)
             job.message = msg
@@ -182,12 +202,13 @@ def task_chat(self, job_id: int, prompt: str, model: str, system_prompt: Optiona
             job.save(update_fields=['message_id', 'status', 'error_message', 'updated_at'])
 
         # Index assistant response in RAG
-        # Optimal point: After transaction commit to ensure data consistency
-        memory_service.add_memory(
-            job.session.id,
-            reply,
-            metadata={'role': 'assistant', 'message_id': msg.id, 'model': model}
-        )
+        # Queued after the transaction commit; embedded and inserted in the background
+        with timing.span('task_chat.index'):
+            index_memory(
+                job.session.id,
+                reply,
+                metadata={'role': 'assistant', 'message_id': msg.id, 'model': model}
+            )
 
         return {'message_id': msg.id, 'content': reply}
     except AIError as e:
@@ -203,6 +224,7 @@ def task_chat(self, job_id: int, prompt: str, model: str, system_prompt: Optiona
 
 
 @shared_task(bind=True, max_retries=2)
+@traced_job
 def task_image(
     self,
     job_id: int,
@@ -255,20 +277,22 @@ def task_image(
             ref_url = attachments[0]
 
     try:
-        rag_context = get_rag_context_string(job.session.id, prompt)
+        with timing.span('task_image.context'):
+            rag_context = get_rag_context_string(job.session.id, prompt)
         effective_prompt = f"{rag_context}\n\nRequest: {prompt}" if rag_context else prompt
-        images = run_image(
-            effective_prompt,
-            model=effective_model,
-            aspect_ratio=aspect_ratio,
-            num_images=num_images,
-            seed=seed,
-            reference_image_url=ref_url,
-            mask_url=mask_url,
-            resolution=resolution,
-            output_format=output_format,
-            **({'image_urls': edit_image_urls} if edit_image_urls else {}),
-        )
+        with timing.span('task_image.generate', model=effective_model, num_images=num_images):
+            images = run_image(
+                effective_prompt,
+                model=effective_model,
+                aspect_ratio=aspect_ratio,
+                num_images=num_images,
+                seed=seed,
+                reference_image_url=ref_url,
+                mask_url=mask_url,
+                resolution=resolution,
+                output_format=output_format,
+                **({'image_urls': edit_image_urls} if edit_image_urls else {}),
+            )
 
         if not images:
             raise AIError('No image URL returned')
@@ -296,18 +320,19 @@ def task_image(
             job.save(update_fields=['image_record_id', 'status', 'error_message', 'updated_at'])
 
         # Index generated image in RAG
-        # Optimal point: After transaction, ensures ImageRecord exists
+        # Queued after the transaction, so the ImageRecord exists
         if job.image_record:
-            memory_service.add_memory(
-                job.session.id,
-                f"Generated image with prompt: {prompt}",
-                metadata={
-                    'type': 'image_generation',
-                    'image_record_id': job.image_record.id,
-                    'image_url': job.image_record.image_url,
-                    'model': effective_model
-                }
-            )
+            with timing.span('task_image.index'):
+                index_memory(
+                    job.session.id,
+                    f"Generated image with prompt: {prompt}",
+                    metadata={
+                        'type': 'image_generation',
+                        'image_record_id': job.image_record.id,
+                        'image_url': job.image_record.image_url,
+                        'model': effective_model
+                    }
+                )
 
         return {'image_record_id': job.image_record_id, 'url': job.image_record.image_url}
     except AIError as e:
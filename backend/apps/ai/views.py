@@ -73,7 +73,8 @@ def complete_image(request):
     session = get_object_or_404(Session, pk=session_id)
     if session.kind != SESSION_KIND_IMAGE:
         return Response({'detail': 'Not an image session'}, status=status.HTTP_400_BAD_REQUEST)
-    if Job.objects.filter(session_id=session.pk, kind='image').count() == 0:
+    # Jobs can be dropped by partition retention; the session's images are kept
+    if not session.image_records.exists() and not Job.objects.filter(session_id=session.pk, kind='image').exists():
         new_title = (body.prompt.strip() or session.title)[:255]
         session.title = new_title
         session.save(update_fields=['title', 'updated_at'])
@@ -0,0 +1,111 @@
+"""
+In-process coalescing of single-text embedding requests.
+
+Concurrent callers (Celery task threads, retrieval executor threads) each embed one
+string at nearly the same moment. EmbeddingCoalescer hands every caller a Future and a
+background flusher hands the pending texts to one provider call once `max_batch`
+texts are waiting or the oldest has waited `max_wait` seconds. Up to
+`max_concurrency` provider calls run at once on a thread pool; only while all of
+them are busy do further texts pile up into the next batch. Identical texts that
+are pending or already in flight share one Future (singleflight).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable
+
+
+class EmbeddingCoalescer:
+    def __init__(self, embed_batch: Callable[[list[str]], list[list[float]]],
+                 max_batch: int = 64, max_wait: float = 0.005, max_concurrency: int = 8):
+        self.embed_batch = embed_batch
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self.max_concurrency = max(1, max_concurrency)
+        self._cond = threading.Condition()
+        self._pending: OrderedDict[str, Future] = OrderedDict()
+        self._inflight: dict[str, Future] = {}
+        self._oldest = 0.0
+        self._thread = None
+        self._pid = None
+        self._executor = None
+        self._slots = None
+        self.batches = 0
+        self.coalesced = 0
+
+    def submit(self, text: str) -> Future:
+        with self._cond:
+            self._ensure_flusher()
+            future = self._inflight.get(text)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = Future()
+            self._inflight[text] = future
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending[text] = future
+            self._cond.notify()
+            return future
+
+    def _ensure_flusher(self):
+        # A flusher started before a prefork worker forked does not exist in the child.
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        self._pending.clear()
+        self._inflight.clear()
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="embedding-batch")
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._thread = threading.Thread(target=self._run, name="embedding-coalescer", daemon=True)
+        self._thread.start()
+
+    def _take_batch(self) -> list[tuple[str, Future]]:
+        with self._cond:
+            while True:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+                remaining = self._oldest + self.max_wait - time.monotonic()
+                if len(self._pending) >= self.max_batch or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = []
+            while self._pending and len(batch) < self.max_batch:
+                batch.append(self._pending.popitem(last=False))
+            # Texts left over keep the old timestamp, so they go out on the next pass.
+            return batch
+
+    def _run(self):
+        executor, slots = self._executor, self._slots
+        while True:
+            # Waiting for a free slot first lets texts keep arriving into the next batch
+            slots.acquire()
+            batch = self._take_batch()
+            executor.submit(self._flush, batch, slots)
+
+    def _flush(self, batch: list[tuple[str, Future]], slots: threading.BoundedSemaphore):
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = self.embed_batch(texts)
+            if len(embeddings) != len(texts):
+                raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+        except Exception as e:
+            embeddings = None
+            error = e
+        finally:
+            slots.release()
+        with self._cond:
+            self.batches += 1
+            for text, _ in batch:
+                self._inflight.pop(text, None)
+        for index, (_, future) in enumerate(batch):
+            if embeddings is None:
+                future.set_exception(error)
+            else:
+                future.set_result(embeddings[index])
+
+    def stats(self) -> dict:
+        return {"batches": self.batches, "coalesced": self.coalesced, "pending": len(self._pending)}
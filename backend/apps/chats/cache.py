@@ -0,0 +1,238 @@
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from typing import Optional
+
+from django.conf import settings
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """NFC-normalize and collapse whitespace so trivially different strings share a key."""
+    text = unicodedata.normalize("NFC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class RedisConnection:
+    """
+    Lazily connected Redis client that backs off for a while after a failure,
+    so an unavailable Redis never adds a connect timeout to every call.
+    """
+
+    def __init__(self, url: Optional[str] = None, retry_after: float = 30.0):
+        self.url = url or os.environ.get(
+            "CACHE_REDIS_URL",
+            getattr(settings, "CELERY_BROKER_URL", "redis://localhost:6379/0"),
+        )
+        self.retry_after = retry_after
+        self._client = None
+        self._down_until = 0.0
+
+    def get(self):
+        if redis is None or not self.url:
+            return None
+        if time.monotonic() < self._down_until:
+            return None
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.2, socket_connect_timeout=0.2)
+        return self._client
+
+    def mark_down(self, error: Exception):
+        logger.warning(f"Redis cache unavailable, bypassing for {self.retry_after:.0f}s: {error}")
+        self._down_until = time.monotonic() + self.retry_after
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache: an in-process LRU in front of Redis.
+    Keys are the embedding model name plus SHA-256 of the normalized text.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        local_ttl: float = 3600.0,
+        redis_ttl: int = 7 * 24 * 3600,
+        redis_connection: Optional[RedisConnection] = None,
+        use_redis: bool = True,
+    ):
+        self.max_entries = max_entries
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.redis = (redis_connection or RedisConnection()) if use_redis else None
+        self._local: OrderedDict[str, tuple[float, list[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits_local = 0
+        self.hits_redis = 0
+        self.misses = 0
+
+    def key(self, model: str, text: str) -> str:
+        return f"emb:{model}:{content_hash(text)}"
+
+    def _get_local(self, key: str) -> Optional[list[float]]:
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires_at, vector = entry
+            if expires_at < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return vector
+
+    def _set_local(self, key: str, vector: list[float]):
+        with self._lock:
+            self._local[key] = (time.monotonic() + self.local_ttl, vector)
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get_many(self, model: str, texts: list[str]) -> dict[str, list[float]]:
+        """Returns {text: vector} for every text found in either tier."""
+        found: dict[str, list[float]] = {}
+        pending: dict[str, str] = {}
+        for text in texts:
+            key = self.key(model, text)
+            vector = self._get_local(key)
+            if vector is not None:
+                found[text] = vector
+                self.hits_local += 1
+            else:
+                pending[text] = key
+
+        client = self.redis.get() if (self.redis and pending) else None
+        if client is not None:
+            try:
+                raw_values = client.mget(list(pending.values()))
+            except Exception as e:
+                self.redis.mark_down(e)
+                raw_values = [None] * len(pending)
+            for (text, key), raw in zip(list(pending.items()), raw_values):
+                if raw is None:
+                    continue
+                vector = array("f")
+                vector.frombytes(raw)
+                vector = vector.tolist()
+                found[text] = vector
+                self._set_local(key, vector)
+                self.hits_redis += 1
+                del pending[text]
+
+        self.misses += len(pending)
+        return found
+
+    def get(self, model: str, text: str) -> Optional[list[float]]:
+        return self.get_many(model, [text]).get(text)
+
+    def set_many(self, model: str, vectors: dict[str, list[float]]):
+        if not vectors:
+            return
+        keyed = {self.key(model, text): vector for text, vector in vectors.items()}
+        for key, vector in keyed.items():
+            self._set_local(key, vector)
+        client = self.redis.get() if self.redis else None
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for key, vector in keyed.items():
+                pipe.set(key, array("f", vector).tobytes(), ex=self.redis_ttl)
+            pipe.execute()
+        except Exception as e:
+            self.redis.mark_down(e)
+
+    def set(self, model: str, text: str, vector: list[float]):
+        self.set_many(model, {text: vector})
+
+    def clear_local(self):
+        with self._lock:
+            self._local.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits_local + self.hits_redis + self.misses
+        hits = self.hits_local + self.hits_redis
+        return {
+            "hits_local": self.hits_local,
+            "hits_redis": self.hits_redis,
+            "misses": self.misses,
+            "hit_rate": (hits / lookups) if lookups else 0.0,
+            "local_entries": len(self._local),
+        }
+
+
+class RerankCache:
+    """
+    Redis cache of rerank orderings keyed by (rerank model, normalized query,
+    ordered candidate ids). Document-scoped entries also carry the document's
+    generation counter, which is bumped when its memories are deleted.
+    """
+
+    def __init__(self, ttl: int = 24 * 3600, redis_connection: Optional[RedisConnection] = None):
+        self.ttl = ttl
+        self.redis = redis_connection or RedisConnection()
+        self.hits = 0
+        self.misses = 0
+
+    def _generation_key(self, document_id: int) -> str:
+        return f"rerank:gen:{document_id}"
+
+    def key(self, client, model: str, query: str, candidate_ids: list[int], document_id: Optional[int]) -> str:
+        scope = "session"
+        if document_id is not None:
+            generation = client.get(self._generation_key(document_id)) or b"0"
+            scope = f"doc{document_id}.{generation.decode()}"
+        digest = hashlib.sha256(
+            f"{normalize_text(query).lower()}|{','.join(map(str, candidate_ids))}".encode("utf-8")
+        ).hexdigest()
+        return f"rerank:{model}:{scope}:{digest}"
+
+    def get(self, model: str, query: str, candidate_ids: list[int], document_id: Optional[int] = None) -> Optional[list[int]]:
+        client = self.redis.get()
+        if client is None:
+            return None
+        try:
+            raw = client.get(self.key(client, model, query, candidate_ids, document_id))
+        except Exception as e:
+            self.redis.mark_down(e)
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return [int(i) for i in raw.decode().split(",") if i]
+
+    def set(self, model: str, query: str, candidate_ids: list[int], ranked_ids: list[int], document_id: Optional[int] = None):
+        client = self.redis.get()
+        if client is None:
+            return
+        try:
+            key = self.key(client, model, query, candidate_ids, document_id)
+            client.set(key, ",".join(map(str, ranked_ids)), ex=self.ttl)
+        except Exception as e:
+            self.redis.mark_down(e)
+
+    def invalidate_document(self, document_id: int):
+        client = self.redis.get()
+        if client is None:
+            return
+        try:
+            client.incr(self._generation_key(document_id))
+        except Exception as e:
+            self.redis.mark_down(e)
@@ -0,0 +1,157 @@
+"""
+Compaction of chat-history memories in long-running sessions.
+
+Assistant replies and image prompts (ChatMemory rows with source='' and no
+document) accumulate for the life of a session. The newest COMPACTION_KEEP_RECENT
+of them stay as they are; older ones are merged in chronological groups of
+COMPACTION_GROUP_SIZE into one re-embedded summary memory per group. Summaries are
+themselves merged into the next level once more than a group of them sits behind the
+newest group, up to COMPACTION_MAX_LEVEL, so the number of chat rows a session
+search sees stays bounded. Document chunks (source='pdf') are never touched.
+Each summary has a MemoryCompaction row recording the rows, messages and images it
+replaced. When a summary is merged into the next level its row is kept, linked to the
+new one through `parent`, so the provenance chain survives to the original memories.
+"""
+import logging
+import os
+import re
+from typing import Optional
+
+from django.db import transaction
+
+from .models import ChatMemory, MemoryCompaction, Session
+from .services import ChatMemoryService, memory_service, run_chat
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_SOURCE_TYPE = 'summary'
+
+
+class MemoryCompactor:
+    def __init__(self, service: Optional[ChatMemoryService] = None):
+        self.service = service or memory_service
+        self.keep_recent = int(os.environ.get("COMPACTION_KEEP_RECENT", "200"))
+        self.group_size = max(2, int(os.environ.get("COMPACTION_GROUP_SIZE", "20")))
+        self.max_level = int(os.environ.get("COMPACTION_MAX_LEVEL", "3"))
+        self.max_chars = int(os.environ.get("COMPACTION_SUMMARY_MAX_CHARS", "1500"))
+        # Empty: extractive summaries; otherwise the chat model used to write them
+        self.summary_model = os.environ.get("COMPACTION_SUMMARY_MODEL", "")
+
+    def chat_memories(self, session_id: int):
+        return ChatMemory.objects.filter(session_id=session_id, source='', document__isnull=True)
+
+    def _level_rows(self, session_id: int, level: int) -> list[dict]:
+        qs = self.chat_memories(session_id)
+        if level == 0:
+            qs = qs.exclude(source_type=SUMMARY_SOURCE_TYPE)
+        else:
+            qs = qs.filter(source_type=SUMMARY_SOURCE_TYPE, metadata__level=level)
+        return list(qs.order_by('created_at', 'id').values('id', 'content', 'metadata', 'created_at'))
+
+    def plan(self, rows: list[dict], keep: int) -> list[list[dict]]:
+        """Full groups of the oldest rows, leaving at least `keep` newest rows alone."""
+        compactable = rows[:max(0, len(rows) - keep)]
+        size = self.group_size
+        return [compactable[i:i + size] for i in range(0, len(compactable) - size + 1, size)]
+
+    def _extractive_summary(self, group: list[dict]) -> str:
+        budget = max(80, self.max_chars // len(group))
+        lines = []
+        for row in group:
+            text = re.sub(r"\s+", " ", row['content'] or "").strip()
+            if len(text) > budget:
+                text = text[:budget] + "..."
+            lines.append(f"- {text}")
+        return "\n".join(lines)
+
+    def _llm_summary(self, group: list[dict]) -> Optional[str]:
+        if not (self.summary_model and run_chat and self.service.client):
+            return None
+        system_prompt = (
+            "Summarize the conversation memories below into a compact note in Korean. "
+            "Keep names, numbers, dates, decisions, user preferences and image prompts verbatim. "
+            "Return only the summary."
+        )
+        prompt = "\n".join(f"- {row['content']}" for row in group)
+        try:
+            summary = run_chat(prompt, model=self.summary_model, system_prompt=system_prompt,
+                               temperature=0, max_tokens=600)
+        except Exception as e:
+            logger.warning(f"Compaction summary failed, using extractive summary: {e}")
+            return None
+        return (summary or "").strip()[:self.max_chars] or None
+
+    def summarize(self, group: list[dict], first, last) -> str:
+        header = f"[대화 요약 {first:%Y-%m-%d} ~ {last:%Y-%m-%d}]"
+        return f"{header}\n{self._llm_summary(group) or self._extractive_summary(group)}"
+
+    def _provenance(self, group: list[dict], level: int) -> dict:
+        ids = [row['id'] for row in group]
+        if level == 0:
+            meta = [row['metadata'] or {} for row in group]
+            return {
+                'source_memory_ids': ids,
+                'message_ids': [m['message_id'] for m in meta if isinstance(m.get('message_id'), int)],
+                'image_record_ids': [m['image_record_id'] for m in meta if isinstance(m.get('image_record_id'), int)],
+                'memory_count': len(group),
+                'first_created_at': group[0]['created_at'],
+                'last_created_at': group[-1]['created_at'],
+            }
+        children = list(MemoryCompaction.objects.filter(summary_id__in=ids).order_by('first_created_at'))
+        return {
+            'source_memory_ids': ids,
+            'message_ids': [i for c in children for i in c.message_ids],
+            'image_record_ids': [i for c in children for i in c.image_record_ids],
+            'memory_count': sum(c.memory_count for c in children) or len(group),
+            'first_created_at': min((c.first_created_at for c in children), default=group[0]['created_at']),
+            'last_created_at': max((c.last_created_at for c in children), default=group[-1]['created_at']),
+        }
+
+    def compact_session(self, session_id: int) -> dict:
+        """Returns {'summaries': created, 'compacted': rows replaced}."""
+        created = compacted = 0
+        for level in range(self.max_level):
+            keep = self.keep_recent if level == 0 else self.group_size
+            groups = self.plan(self._level_rows(session_id, level), keep)
+            if not groups:
+                continue
+            provenances = [self._provenance(group, level) for group in groups]
+            texts = [
+                self.summarize(group, p['first_created_at'], p['last_created_at'])
+                for group, p in zip(groups, provenances)
+            ]
+            # Summaries and embeddings are produced before the session lock is taken. A
+            # summary without a real embedding could never be found again, so a failed
+            # embedding call stops the run with the originals still in place.
+            try:
+                embeddings = self.service.embed_texts(texts, strict=True)
+            except Exception as e:
+                logger.warning(f"Compaction of session {session_id} stopped at level {level}: {e}")
+                break
+            with transaction.atomic():
+                if not Session.objects.select_for_update().filter(pk=session_id).exists():
+                    return {'summaries': created, 'compacted': compacted}
+                for group, provenance, text, embedding in zip(groups, provenances, texts, embeddings):
+                    ids = [row['id'] for row in group]
+                    # A concurrent run may already have compacted this group
+                    if ChatMemory.objects.filter(id__in=ids).count() != len(ids):
+                        continue
+                    summary = ChatMemory.objects.create(
+                        session_id=session_id,
+                        content=text,
+                        embedding=embedding,
+                        metadata={'type': 'memory_summary', 'level': level + 1, 'source_type': SUMMARY_SOURCE_TYPE},
+                        source_type=SUMMARY_SOURCE_TYPE,
+                    )
+                    # Keep the summary in the chronological position of what it replaces
+                    ChatMemory.objects.filter(pk=summary.pk).update(created_at=group[-1]['created_at'])
+                    compaction = MemoryCompaction.objects.create(
+                        session_id=session_id, summary=summary, level=level + 1, **provenance
+                    )
+                    MemoryCompaction.objects.filter(summary_id__in=ids).update(parent=compaction)
+                    ChatMemory.objects.filter(id__in=ids).delete()
+                    created += 1
+                    compacted += len(ids)
+        if created:
+            logger.info(f"Compacted session {session_id}: {compacted} memories into {created} summaries")
+        return {'summaries': created, 'compacted': compacted}
@@ -0,0 +1,141 @@
+"""
+Background deletion of sessions and documents.
+
+The API only sets deleted_at, which hides the row from the default managers, and
+queues a Celery task that runs BulkDeleter. It removes chat memories, n-gram postings
+and messages in batches of DELETE_BATCH_SIZE rows, so no single statement cascades
+through a whole session, and deletes the stored files through batched S3
+DeleteObjects calls: uploads, converted PDFs and the images extracted under
+images/{session_id}/. Images are stored once per session by content hash and each
+document records the ones it uses as DocumentImage rows, so a document only takes
+with it the images no other document of the session has claimed.
+Last, the row itself is deleted together with whatever small relations remain. Every
+step is idempotent, so a failed run can simply be retried.
+"""
+import logging
+import os
+from typing import Iterable, Optional
+
+from django.db import transaction
+
+from .models import ChatMemory, Document, DocumentImage, DocumentNgramPosting, Message, Session
+from .services import ChatMemoryService, memory_service
+
+try:
+    from storage.s3 import minio_client
+except ImportError:
+    minio_client = None
+
+logger = logging.getLogger(__name__)
+
+
+def session_prefixes(session_id: int) -> list[str]:
+    """Storage prefixes owned by a session: uploads/converted PDFs and extracted images."""
+    return [f"{session_id}/", f"images/{session_id}/"]
+
+
+def document_keys(document: Document) -> set[str]:
+    return {key for key in (document.file_name, document.pdf_file_name) if key}
+
+
+def document_prefixes(document: Document) -> list[str]:
+    # Per-document image layout used before images were keyed by content hash
+    return [f"images/{document.session_id}/{document.id}/"]
+
+
+def _lock_session_images(session_id: int):
+    """Serializes image claims and image deletes of one session (call inside a transaction)."""
+    Session.all_objects.select_for_update().filter(pk=session_id).exists()
+
+
+def claim_document_images(document_id: int, session_id: int, images: list[tuple[str, str]]):
+    """
+    Records the (key, sha256) image objects a document is about to use. Claims are
+    committed before the caller checks for or uploads the objects, so a concurrent
+    delete of another document either sees the claim and keeps the object, or
+    finished deleting it first and the caller uploads it again.
+    """
+    with transaction.atomic():
+        _lock_session_images(session_id)
+        DocumentImage.objects.bulk_create(
+            [DocumentImage(document_id=document_id, key=key, sha256=sha256) for key, sha256 in images],
+            ignore_conflicts=True,
+        )
+
+
+def exclusive_image_keys(document: Document) -> set[str]:
+    """Image keys of a document that no other document of its session uses."""
+    keys = set(DocumentImage.objects.filter(document_id=document.id).values_list('key', flat=True))
+    if not keys:
+        return keys
+    shared = set(
+        DocumentImage.objects.filter(document__session_id=document.session_id, key__in=keys)
+        .exclude(document_id=document.id)
+        .values_list('key', flat=True)
+    )
+    return keys - shared
+
+
+class BulkDeleter:
+    def __init__(self, storage=None, service: Optional[ChatMemoryService] = None):
+        self.storage = storage if storage is not None else minio_client
+        self.service = service or memory_service
+        self.batch_size = max(1, int(os.environ.get("DELETE_BATCH_SIZE", "2000")))
+
+    def delete_in_batches(self, queryset) -> int:
+        """Deletes the rows of `queryset` at most batch_size at a time."""
+        model = queryset.model
+        deleted = 0
+        while True:
+            ids = list(queryset.order_by().values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return deleted
+            model._base_manager.filter(pk__in=ids).delete()
+            deleted += len(ids)
+
+    def delete_objects(self, keys: Iterable[str], prefixes: Iterable[str] = ()) -> int:
+        """Deletes the given keys plus everything under `prefixes`; raises if any key is left."""
+        if not self.storage:
+            return 0
+        keys = {key for key in keys if key}
+        for prefix in prefixes:
+            keys.update(self.storage.list_keys(prefix))
+        failed = self.storage.delete_files(sorted(keys))
+        if failed:
+            raise RuntimeError(f"{len(failed)} storage objects could not be deleted")
+        return len(keys)
+
+    def _purge_document_rows(self, document_id: int) -> int:
+        memories = self.delete_in_batches(ChatMemory.objects.filter(document_id=document_id))
+        self.delete_in_batches(DocumentNgramPosting.objects.filter(document_id=document_id))
+        self.service.invalidate_document_caches(document_id)
+        return memories
+
+    def delete_document(self, document_id: int) -> dict:
+        document = Document.all_objects.filter(pk=document_id).first()
+        if document is None:
+            return {'memories': 0, 'objects': 0}
+        with transaction.atomic():
+            # No image claim of the session can slip in between choosing and deleting keys
+            _lock_session_images(document.session_id)
+            keys = document_keys(document) | exclusive_image_keys(document)
+            objects = self.delete_objects(keys, document_prefixes(document))
+            DocumentImage.objects.filter(document_id=document_id).delete()
+        memories = self._purge_document_rows(document_id)
+        document.delete()
+        logger.info(f"Deleted document {document_id}: {memories} memories, {objects} stored objects")
+        return {'memories': memories, 'objects': objects}
+
+    def delete_session(self, session_id: int) -> dict:
+        session = Session.all_objects.filter(pk=session_id).first()
+        if session is None:
+            return {'memories': 0, 'messages': 0, 'objects': 0}
+        documents = list(Document.all_objects.filter(session_id=session_id))
+        memories = sum(self._purge_document_rows(document.id) for document in documents)
+        memories += self.delete_in_batches(ChatMemory.objects.filter(session_id=session_id))
+        messages = self.delete_in_batches(Message.objects.filter(session_id=session_id))
+        keys = set().union(*(document_keys(document) for document in documents))
+        objects = self.delete_objects(keys, session_prefixes(session_id))
+        session.delete()
+        logger.info(f"Deleted session {session_id}: {memories} memories, {messages} messages, {objects} stored objects")
+        return {'memories': memories, 'messages': messages, 'objects': objects}
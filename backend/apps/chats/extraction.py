@@ -0,0 +1,472 @@
+"""
+Per-page PDF extraction, optionally fanned out over a process pool.
+
+Every page yields its PyMuPDF text blocks, its embedded images (bytes and placement;
+uploading stays with the caller) and, with pytesseract installed, the Tesseract blocks
+of the rendered page, unless OcrPageClassifier finds that the page's text layer
+already covers it (born-digital pages are skipped; scanned and image-heavy pages are
+OCRed). PdfExtractor splits a document into page ranges and runs
+extract_page_range for each in a ProcessPoolExecutor. Each worker opens the PDF by
+path, so only the path and the extracted blocks cross process boundaries. Results
+are concatenated in page order, which gives the same output as a sequential run.
+Workers run with an address-space cap (PDF_EXTRACT_WORKER_MEMORY_MB) that the
+Tesseract subprocesses inherit. A worker killed by the cap breaks the whole pool;
+ranges that had not started yet are retried on one fresh shared pool, and only the
+range that crashed is retried page by page, each page in a fresh capped worker.
+Pages that fail again are reported in failed_pages instead of being re-run without
+the cap. Daemonic processes (Celery
+prefork children) cannot start a pool, so process_pdf_document is routed to the
+'pdf' queue, whose worker runs with --pool=solo; anywhere else extraction falls
+back to a sequential run with a warning.
+
+This module must not import Django: spawned workers import it on their own.
+"""
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Optional
+
+import fitz  # PyMuPDF
+
+try:
+    from PIL import Image
+    import pytesseract
+except ImportError:
+    Image = None
+    pytesseract = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Embedded images smaller than this (points, either side) are icons or noise
+MIN_IMAGE_SIZE = 50
+# Tesseract words below this confidence are dropped
+MIN_OCR_CONFIDENCE = 30
+
+
+def page_text_blocks(page, page_num: int) -> list[dict]:
+    """Text blocks of the PyMuPDF text layer: {'text', 'bbox', 'page', 'source_type': 'parsed', ...}."""
+    page_width = float(page.rect.width)
+    page_height = float(page.rect.height)
+    blocks = []
+    # "blocks" -> (x0, y0, x1, y1, "lines", block_no, block_type); block_type 0 is text
+    for block in page.get_text("blocks"):
+        if block[6] != 0:
+            continue
+        text = block[4].strip()
+        if not text:
+            continue
+        blocks.append({
+            'text': text,
+            'bbox': list(block[0:4]),
+            'page': page_num + 1,  # 1-indexed for user friendliness
+            'source_type': 'parsed',
+            'page_width': page_width,
+            'page_height': page_height,
+        })
+    return blocks
+
+
+def page_images(doc, page, page_num: int, seen_xrefs: Optional[set] = None) -> list[dict]:
+    """
+    Embedded images of a page with their first placement, bytes ('image_bytes', 'ext')
+    and SHA-256. An xref already in `seen_xrefs` is returned without its bytes.
+    """
+    page_width = float(page.rect.width)
+    page_height = float(page.rect.height)
+    images = []
+    for img_idx, img in enumerate(page.get_images(full=True)):
+        xref = img[0]
+        try:
+            rects = page.get_image_rects(xref)
+            if not rects:
+                continue
+            r = rects[0]
+            bbox = [r.x0, r.y0, r.x1, r.y1]
+            if (bbox[2] - bbox[0] < MIN_IMAGE_SIZE) or (bbox[3] - bbox[1] < MIN_IMAGE_SIZE):
+                continue
+            image = {'xref': xref, 'page': page_num + 1}
+            if seen_xrefs is not None:
+                if xref in seen_xrefs:
+                    images.append(image)
+                    continue
+                seen_xrefs.add(xref)
+            base_image = doc.extract_image(xref)
+            images.append({
+                **image,
+                'text': '',
+                'bbox': bbox,
+                'index': img_idx,
+                'image_bytes': base_image["image"],
+                'ext': base_image["ext"],
+                'sha256': hashlib.sha256(base_image["image"]).hexdigest(),
+                'source_type': 'image_ocr',
+                'page_width': page_width,
+                'page_height': page_height,
+                'is_image_ocr': True,
+            })
+        except Exception as e:
+            logger.warning(f"Image extraction error on page {page_num}: {e}")
+    return images
+
+
+def page_ocr_blocks(page, page_num: int) -> list[dict]:
+    """Tesseract blocks of the rendered page: {'text', 'bbox', 'page', 'source_type': 'ocr', ...}."""
+    page_width = float(page.rect.width)
+    page_height = float(page.rect.height)
+    image = Image.open(io.BytesIO(page.get_pixmap().tobytes("png")))
+    ocr_res = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
+
+    # block_num -> {'text': [words], 'bbox': union of word boxes}
+    blocks = {}
+    for i in range(len(ocr_res['text'])):
+        if float(ocr_res['conf'][i]) < MIN_OCR_CONFIDENCE:
+            continue
+        text = ocr_res['text'][i].strip()
+        if not text:
+            continue
+        block_num = ocr_res['block_num'][i]
+        x, y, w, h = ocr_res['left'][i], ocr_res['top'][i], ocr_res['width'][i], ocr_res['height'][i]
+        x0, y0, x1, y1 = x, y, x + w, y + h
+        if block_num not in blocks:
+            blocks[block_num] = {'text': [text], 'bbox': [x0, y0, x1, y1]}
+        else:
+            blocks[block_num]['text'].append(text)
+            b = blocks[block_num]['bbox']
+            blocks[block_num]['bbox'] = [min(b[0], x0), min(b[1], y0), max(b[2], x1), max(b[3], y1)]
+
+    extracted = []
+    for content in blocks.values():
+        full_text = " ".join(content['text'])
+        if len(full_text) > 3:  # Ignore tiny noise
+            extracted.append({
+                'text': full_text,
+                'bbox': content['bbox'],
+                'page': page_num + 1,
+                'source_type': 'ocr',
+                'page_width': page_width,
+                'page_height': page_height,
+            })
+    return extracted
+
+
+def _clipped_area(bbox, width: float, height: float) -> float:
+    x0, y0 = max(bbox[0], 0.0), max(bbox[1], 0.0)
+    x1, y1 = min(bbox[2], width), min(bbox[3], height)
+    return max(0.0, x1 - x0) * max(0.0, y1 - y0)
+
+
+class OcrPageClassifier:
+    """
+    Decides per page whether Tesseract is worth running. A page is OCRed when its text
+    layer has fewer than OCR_PAGE_MIN_CHARS characters (scanned or outlined text), or
+    when images cover at least OCR_PAGE_IMAGE_RATIO of it while text blocks cover less
+    than OCR_PAGE_TEXT_COVERAGE (image-heavy). OCR_PAGE_MODE=always|never overrides.
+    """
+
+    def __init__(self):
+        self.mode = os.environ.get("OCR_PAGE_MODE", "auto").lower()
+        self.min_chars = int(os.environ.get("OCR_PAGE_MIN_CHARS", "80"))
+        self.image_ratio = float(os.environ.get("OCR_PAGE_IMAGE_RATIO", "0.5"))
+        self.text_coverage = float(os.environ.get("OCR_PAGE_TEXT_COVERAGE", "0.2"))
+
+    def measure(self, page, text_blocks: list[dict]) -> dict:
+        width, height = float(page.rect.width), float(page.rect.height)
+        page_area = width * height or 1.0
+        text_area = sum(_clipped_area(b['bbox'], width, height) for b in text_blocks)
+        image_area = sum(_clipped_area(info['bbox'], width, height) for info in page.get_image_info())
+        return {
+            'text_chars': sum(len(b['text']) for b in text_blocks),
+            'text_coverage': round(min(1.0, text_area / page_area), 3),
+            'image_ratio': round(min(1.0, image_area / page_area), 3),
+        }
+
+    def decide(self, stats: dict) -> tuple[bool, str]:
+        if self.mode in ('always', 'never'):
+            return self.mode == 'always', self.mode
+        if stats['text_chars'] < self.min_chars:
+            return True, 'sparse_text'
+        if stats['image_ratio'] >= self.image_ratio and stats['text_coverage'] < self.text_coverage:
+            return True, 'image_heavy'
+        return False, 'text_layer'
+
+    def classify(self, page, text_blocks: list[dict]) -> dict:
+        """{'ocr': bool, 'reason': str, 'text_chars', 'text_coverage', 'image_ratio'}"""
+        stats = self.measure(page, text_blocks)
+        ocr, reason = self.decide(stats)
+        return {'ocr': ocr, 'reason': reason, **stats}
+
+
+def ocr_available() -> bool:
+    return bool(pytesseract and Image)
+
+
+@dataclass
+class PageExtraction:
+    parsed: list[dict] = field(default_factory=list)
+    images: list[dict] = field(default_factory=list)
+    ocr: list[dict] = field(default_factory=list)
+    # 1-indexed page -> OcrPageClassifier decision
+    ocr_decisions: dict[int, dict] = field(default_factory=dict)
+    # 1-indexed pages whose extraction failed in every capped worker
+    failed_pages: list[int] = field(default_factory=list)
+    # Pool worker processes that produced this result
+    worker_pids: set[int] = field(default_factory=set)
+
+    def extend(self, other: 'PageExtraction'):
+        self.parsed.extend(other.parsed)
+        self.images.extend(other.images)
+        self.ocr.extend(other.ocr)
+        self.ocr_decisions.update(other.ocr_decisions)
+        self.failed_pages.extend(other.failed_pages)
+        self.worker_pids |= other.worker_pids
+
+
+def extract_pages(doc, start: int, end: int, ocr: bool = True,
+                  classifier: Optional[OcrPageClassifier] = None) -> PageExtraction:
+    """
+    Extracts pages [start, end) of an open document; a failing page only loses its own
+    output. With a classifier, only the pages it selects are OCRed.
+    """
+    result = PageExtraction()
+    seen_xrefs = set()
+    for page_num in range(start, end):
+        page = doc[page_num]
+        text_blocks = []
+        try:
+            text_blocks = page_text_blocks(page, page_num)
+            result.parsed.extend(text_blocks)
+        except Exception as e:
+            logger.error(f"PyMuPDF block extraction failed on page {page_num}: {e}")
+        try:
+            result.images.extend(page_images(doc, page, page_num, seen_xrefs))
+        except Exception as e:
+            logger.error(f"Failed to get images from page {page_num}: {e}")
+        if not ocr:
+            continue
+        if classifier is not None:
+            decision = classifier.classify(page, text_blocks)
+            result.ocr_decisions[page_num + 1] = decision
+            if not decision['ocr']:
+                continue
+        try:
+            result.ocr.extend(page_ocr_blocks(page, page_num))
+        except Exception as e:
+            logger.error(f"OCR extraction failed on page {page_num}: {e}")
+    return result
+
+
+def dedupe_images(images: list[dict]) -> list[dict]:
+    """
+    Keeps the first occurrence of every distinct image in a document, matched by xref
+    (repeated placements) and by SHA-256 of the bytes (identical images stored twice).
+    Each kept image lists every page it appears on in 'pages'.
+    """
+    xref_hashes = {image['xref']: image['sha256'] for image in images if 'sha256' in image}
+    unique: dict[str, dict] = {}
+    for image in images:
+        sha256 = xref_hashes.get(image['xref'])
+        if sha256 is None:
+            continue
+        if sha256 not in unique:
+            if 'image_bytes' not in image:
+                continue
+            unique[sha256] = {**image, 'sha256': sha256, 'pages': []}
+        pages = unique[sha256]['pages']
+        if image['page'] not in pages:
+            pages.append(image['page'])
+    return list(unique.values())
+
+
+def extract_page_range(pdf_path: str, start: int, end: int, ocr: bool = True,
+                       classifier: Optional[OcrPageClassifier] = None) -> PageExtraction:
+    """Process pool entry point: opens the PDF by path and extracts pages [start, end)."""
+    with fitz.open(pdf_path) as doc:
+        result = extract_pages(doc, start, end, ocr, classifier)
+    result.worker_pids.add(os.getpid())
+    return result
+
+
+def _in_daemon_process() -> bool:
+    """True inside daemonic processes (e.g. Celery prefork children), which cannot start a pool."""
+    if multiprocessing.current_process().daemon:
+        return True
+    try:
+        import billiard
+    except ImportError:
+        return False
+    return bool(billiard.current_process().daemon)
+
+
+# Worker side: shared flags set when a range starts running (see PdfExtractor._run_ranges)
+_started_ranges = None
+
+
+def _init_worker(memory_limit: int, started_ranges=None):
+    global _started_ranges
+    _started_ranges = started_ranges
+    # One Tesseract thread per worker; the pool already spreads pages over the cores
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    if resource and memory_limit > 0:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _extract_tracked_range(index: int, pdf_path: str, start: int, end: int, ocr: bool = True,
+                           classifier: Optional[OcrPageClassifier] = None) -> PageExtraction:
+    """extract_page_range that first flags range `index` as started."""
+    if _started_ranges is not None:
+        _started_ranges[index] = 1
+    return extract_page_range(pdf_path, start, end, ocr, classifier)
+
+
+class PdfExtractor:
+    def __init__(self):
+        self.workers = int(os.environ.get("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+        self.pages_per_task = max(1, int(os.environ.get("PDF_EXTRACT_PAGES_PER_TASK", "4")))
+        # Smaller documents are not worth the process start-up
+        self.min_pages = int(os.environ.get("PDF_EXTRACT_PARALLEL_MIN_PAGES", "8"))
+        self.memory_limit_mb = int(os.environ.get("PDF_EXTRACT_WORKER_MEMORY_MB", "1536"))
+        self.classifier = OcrPageClassifier()
+
+    def page_ranges(self, page_count: int) -> list[tuple[int, int]]:
+        size = self.pages_per_task
+        return [(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+
+    def extract(self, pdf_path: str) -> PageExtraction:
+        ocr = ocr_available()
+        if not ocr:
+            logger.warning("pytesseract or PIL not installed. Skipping OCR.")
+        with fitz.open(pdf_path) as doc:
+            page_count = doc.page_count
+            sequential = self.workers <= 1 or page_count < self.min_pages
+            if sequential:
+                result = extract_pages(doc, 0, page_count, ocr, self.classifier)
+        if not sequential:
+            result = self._extract_parallel(pdf_path, self.page_ranges(page_count), ocr)
+        if result.ocr_decisions:
+            ocr_pages = sum(1 for d in result.ocr_decisions.values() if d['ocr'])
+            logger.info(f"OCR selected for {ocr_pages} of {page_count} pages")
+        return result
+
+    def _run_ranges(self, pdf_path: str, ranges: list[tuple[int, int]], ocr: bool,
+                    workers: int) -> tuple[list[Optional[PageExtraction]], set[int]]:
+        """
+        Extracts `ranges` in a fresh capped pool. Returns the results, None where a range
+        failed, and the indexes of the failed ranges that had started running: a range
+        that raised, or one in flight when a crashing worker broke the pool. Failed
+        ranges that never started are collateral of another range's crash.
+        """
+        ctx = multiprocessing.get_context('spawn')
+        started = ctx.Array('b', len(ranges), lock=False)
+        results: list[Optional[PageExtraction]] = [None] * len(ranges)
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            # Workers must not inherit the Celery process's threads, sockets or locks
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(self.memory_limit_mb * 1024 * 1024, started),
+        ) as pool:
+            futures = {
+                pool.submit(_extract_tracked_range, i, pdf_path, start, end, ocr, self.classifier): i
+                for i, (start, end) in enumerate(ranges)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    start, end = ranges[i]
+                    logger.warning(f"Extraction of pages {start + 1}-{end} failed in worker: {e}")
+        return results, {i for i, result in enumerate(results) if result is None and started[i]}
+
+    def _retry_pages(self, pdf_path: str, start: int, end: int, ocr: bool) -> PageExtraction:
+        """Retries a crashed range one page per fresh worker, so a crashing page cannot take others with it."""
+        result = PageExtraction()
+        for page_num in range(start, end):
+            try:
+                page = self._run_ranges(pdf_path, [(page_num, page_num + 1)], ocr, 1)[0][0]
+            except Exception as e:
+                logger.warning(f"Retry of page {page_num + 1} could not start a worker: {e}")
+                page = None
+            if page is None:
+                result.failed_pages.append(page_num + 1)
+            else:
+                result.extend(page)
+        return result
+
+    def _extract_in_pools(self, pdf_path: str, ranges: list[tuple[int, int]], ocr: bool) -> list[PageExtraction]:
+        """
+        Runs every range in capped pools. A crashing worker breaks the whole pool, so:
+        - ranges that never started are retried together on one fresh shared pool;
+        - when several ranges were in flight at the crash, they are re-run one at a time
+          in a single-worker pool to find the one that crashed;
+        - only a range known to have failed itself is isolated page by page.
+        The first pool raising (spawn unavailable) propagates to the caller.
+        """
+        results: list[Optional[PageExtraction]] = [None] * len(ranges)
+        shared, suspects, crashed = list(range(len(ranges))), [], []
+        first = True
+        while shared or suspects:
+            if shared:
+                batch, workers, shared = shared, min(self.workers, len(shared)), []
+            else:
+                batch, workers, suspects = suspects, 1, []
+            try:
+                outcomes, started = self._run_ranges(pdf_path, [ranges[i] for i in batch], ocr, workers)
+            except Exception as e:
+                if first:
+                    raise
+                logger.warning(f"Could not start an extraction pool for the retry: {e}")
+                outcomes, started = [None] * len(batch), set()
+            first = False
+            if not started and all(outcome is None for outcome in outcomes):
+                # No worker got as far as a range (e.g. it died on start-up): retrying
+                # would not progress, so the pages are reported as failed
+                for i in batch:
+                    start, end = ranges[i]
+                    results[i] = PageExtraction(failed_pages=list(range(start + 1, end + 1)))
+                continue
+            for j, i in enumerate(batch):
+                if outcomes[j] is not None:
+                    results[i] = outcomes[j]
+                elif j not in started:
+                    (shared if workers > 1 else suspects).append(i)
+            started_ranges = [batch[j] for j in sorted(started)]
+            if len(started_ranges) == 1 or workers == 1:
+                crashed.extend(started_ranges)
+            else:
+                suspects.extend(started_ranges)
+        for i in sorted(crashed):
+            # Never re-run uncapped: the worker may have been killed by the memory cap
+            results[i] = self._retry_pages(pdf_path, *ranges[i], ocr)
+        return results
+
+    def _extract_parallel(self, pdf_path: str, ranges: list[tuple[int, int]], ocr: bool) -> PageExtraction:
+        results = None
+        if _in_daemon_process():
+            logger.warning("Running in a daemonic process (Celery prefork?), extracting sequentially; "
+                           "route process_pdf_document to a --pool=solo or --pool=threads worker")
+        else:
+            try:
+                results = self._extract_in_pools(pdf_path, ranges, ocr)
+            except Exception as e:
+                logger.warning(f"Parallel extraction unavailable, extracting in process: {e}")
+
+        if results is None:
+            with fitz.open(pdf_path) as doc:
+                results = [extract_pages(doc, start, end, ocr, self.classifier) for start, end in ranges]
+
+        merged = PageExtraction()
+        for result in results:
+            merged.extend(result)
+        if merged.failed_pages:
+            logger.error(f"Extraction failed for pages {merged.failed_pages} of {pdf_path}")
+        return merged
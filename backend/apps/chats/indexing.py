@@ -0,0 +1,145 @@
+"""
+Background indexing queue for chat replies and generated images.
+
+Tasks push (session_id, content, metadata) records onto a Redis list instead of
+embedding and inserting them inline. The first push schedules one delayed
+drain_index_queue task; records pushed before it runs join the same batch, so a
+burst of replies from many sessions costs one batched embeddings call and one
+bulk insert. When Redis is unavailable or INDEX_QUEUE_ENABLED=0 the record is
+indexed synchronously, as before.
+
+One drain runs at a time (draining_key lock). It LMOVEs each batch onto a processing
+list and only deletes it once the batch is committed, so a drain that dies mid-batch
+loses nothing: the next drain moves the leftovers back to the head of the queue. A
+failed batch, including one whose embeddings call failed, is moved back the same way
+and a new drain is scheduled for it after INDEX_QUEUE_RETRY_DELAY seconds.
+"""
+import json
+import logging
+import os
+from typing import Optional
+
+from .cache import RedisConnection
+from .services import memory_service
+
+logger = logging.getLogger(__name__)
+
+
+class IndexQueue:
+    pending_key = "rag:index:pending"
+    processing_key = "rag:index:processing"
+    scheduled_key = "rag:index:scheduled"
+    draining_key = "rag:index:draining"
+
+    def __init__(self, redis_connection: Optional[RedisConnection] = None):
+        self.enabled = os.environ.get("INDEX_QUEUE_ENABLED", "1") == "1"
+        self.delay = float(os.environ.get("INDEX_QUEUE_DELAY", "0.5"))
+        self.batch_size = int(os.environ.get("INDEX_QUEUE_BATCH_SIZE", "128"))
+        self.retry_delay = float(os.environ.get("INDEX_QUEUE_RETRY_DELAY", "30"))
+        # A drain holding the lock longer than this without taking a batch is presumed dead
+        self.lease = int(os.environ.get("INDEX_QUEUE_LEASE_SECONDS", "300"))
+        self.queue_name = os.environ.get("INDEX_QUEUE_NAME") or None
+        self.redis = redis_connection or RedisConnection()
+
+    def push(self, session_id: int, content: str, metadata: Optional[dict] = None) -> bool:
+        """Returns False when the record could not be queued."""
+        client = self.redis.get() if self.enabled else None
+        if client is None:
+            return False
+        payload = json.dumps({"session_id": session_id, "content": content, "metadata": metadata or {}})
+        try:
+            client.rpush(self.pending_key, payload)
+            # Keep the flag alive long enough to cover a slow worker pickup, but let it
+            # expire so a lost drain task cannot stall the queue for good.
+            scheduled = client.set(self.scheduled_key, "1", nx=True, ex=max(int(self.delay * 4), 30))
+        except Exception as e:
+            self.redis.mark_down(e)
+            return False
+        if scheduled:
+            self._schedule_drain()
+        return True
+
+    def _schedule_drain(self, countdown: Optional[float] = None):
+        from .tasks import drain_index_queue
+
+        drain_index_queue.apply_async(countdown=self.delay if countdown is None else countdown,
+                                      queue=self.queue_name)
+
+    def acquire(self) -> bool:
+        """Takes the drain lock and moves batches a dead drain left in processing back to the queue."""
+        client = self.redis.get()
+        if client is None or not client.set(self.draining_key, "1", nx=True, ex=self.lease):
+            return False
+        self._restore(client)
+        return True
+
+    def release_drain(self, countdown: Optional[float] = None):
+        """Drops the drain lock; schedules a drain if records are still queued."""
+        client = self.redis.get()
+        if client is None:
+            return
+        client.delete(self.draining_key)
+        # Covers requeued batches and records whose drain found the lock taken
+        if client.llen(self.pending_key):
+            self._schedule_drain(countdown)
+
+    def _restore(self, client):
+        # Oldest first at the head, in their original order
+        while client.lmove(self.processing_key, self.pending_key, "RIGHT", "LEFT") is not None:
+            pass
+
+    def pop_batch(self) -> list[tuple[int, str, dict]]:
+        """Moves the next batch onto the processing list; ack() once it is committed."""
+        client = self.redis.get()
+        if client is None:
+            return []
+        pipe = client.pipeline(transaction=True)
+        pipe.expire(self.draining_key, self.lease)
+        for _ in range(self.batch_size):
+            pipe.lmove(self.pending_key, self.processing_key, "LEFT", "RIGHT")
+        raw_items = [raw for raw in pipe.execute()[1:] if raw is not None]
+        records = []
+        for raw in raw_items:
+            try:
+                item = json.loads(raw)
+                records.append((int(item["session_id"]), item["content"], item.get("metadata") or {}))
+            except (ValueError, KeyError, TypeError):
+                logger.warning(f"Dropping malformed index queue entry: {raw!r}")
+        return records
+
+    def ack(self):
+        """Forgets the batch taken by pop_batch; call after its records are committed."""
+        client = self.redis.get()
+        if client is not None:
+            client.delete(self.processing_key)
+
+    def requeue(self):
+        """Puts the batch taken by pop_batch back at the head; release_drain schedules its retry."""
+        client = self.redis.get()
+        if client is not None:
+            self._restore(client)
+
+    def release(self):
+        """Clears the scheduled flag so the next push schedules a new drain."""
+        client = self.redis.get()
+        if client is None:
+            return
+        client.delete(self.scheduled_key)
+
+    def backlog(self) -> int:
+        client = self.redis.get()
+        if client is None:
+            return 0
+        return client.llen(self.pending_key)
+
+
+index_queue = IndexQueue()
+
+
+def index_memory(session_id: int, content: str, metadata: Optional[dict] = None):
+    """Queues a memory item for background indexing, falling back to an inline add_memory."""
+    if not content:
+        return
+    if index_queue.push(session_id, content, metadata):
+        return
+    memory_service.add_memory(session_id, content, metadata=metadata)
@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from benchmarks.merge import run
+
+
+class Command(BaseCommand):
+    help = "Times merge_parsed_and_ocr against the all-pairs merge on synthetic dense pages."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,400,1600,6400',
+                            help="Comma-separated parsed blocks per page.")
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--naive-limit', type=int, default=5000,
+                            help="Largest size the all-pairs merge is run for.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers")
+        report = run(sizes, repeat=options['repeat'], naive_limit=options['naive_limit'])
+        self.stdout.write(json.dumps(report, indent=2))
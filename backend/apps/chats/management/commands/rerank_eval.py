@@ -0,0 +1,36 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from apps.chats.rerank import LexicalReranker
+from apps.chats.services import ChatMemoryService
+from benchmarks.rerank_eval import evaluate
+
+
+class Command(BaseCommand):
+    help = "Compares rerank backends (hybrid first-stage order, local lexical, LLM) on the fixture corpus."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=3)
+        parser.add_argument('--depth', type=int, default=12, help="First-stage candidates passed to the rerankers.")
+        parser.add_argument('--no-llm', action='store_true', help="Skip the LLM reranker baseline.")
+
+    def handle(self, *args, **options):
+        service = ChatMemoryService()
+        service.rerank_enabled = True
+        service.local_reranker = service.local_reranker or LexicalReranker()
+        backends = ['none', 'local']
+        llm_skipped = None
+        if options['no_llm']:
+            llm_skipped = "skipped with --no-llm"
+        elif not os.environ.get('FAL_KEY'):
+            llm_skipped = "FAL_KEY not set"
+        else:
+            backends.append('llm')
+        report = evaluate(service, backends, k=options['k'], depth=options['depth'])
+        if llm_skipped:
+            # Keep the baseline row in the report so a missing LLM run is visible, not silent
+            report['llm'] = {'measured': False, 'reason': llm_skipped}
+            self.stderr.write(f"LLM reranker not measured: {llm_skipped}.")
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from benchmarks.retrieval import RetrievalBenchmark
+
+
+class Command(BaseCommand):
+    help = "Measures search_memory recall, MRR and per-stage latency over growing synthetic corpora."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000',
+                            help="Comma-separated corpus sizes in chunks, e.g. 1000,10000,100000,1000000.")
+        parser.add_argument('--k', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per query.")
+        parser.add_argument('--rerank', action='store_true', help="Rerank with the local lexical reranker.")
+        parser.add_argument('--output', help="Write the JSON report to this path.")
+        parser.add_argument('--baseline', help="Previous JSON report to print deltas against.")
+        parser.add_argument('--keep', action='store_true', help="Keep the benchmark session afterwards.")
+        parser.add_argument('--allow-write', action='store_true',
+                            help="Run against a database whose name does not start with 'test'.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',') if size.strip()]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers")
+        database = connection.settings_dict['NAME'] or ''
+        if not str(database).rsplit('/', 1)[-1].startswith('test') and not options['allow_write']:
+            raise CommandError(
+                f"Refusing to insert benchmark rows into '{database}'; "
+                "use a test database or pass --allow-write."
+            )
+
+        benchmark = RetrievalBenchmark(rerank=options['rerank'], k=options['k'], repeat=options['repeat'])
+        report = benchmark.run(sizes, keep=options['keep'])
+        rendered = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(rendered)
+        self.stdout.write(rendered)
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+            self._print_deltas(baseline, report, options['k'])
+
+    def _print_deltas(self, baseline: dict, report: dict, k: int):
+        recall_key = f'recall@{k}'
+        for size, current in report['sizes'].items():
+            previous = baseline.get('sizes', {}).get(size)
+            if not previous:
+                continue
+            recall_delta = current[recall_key] - previous.get(recall_key, 0.0)
+            p95 = current['latency_ms'].get('total', {}).get('p95', 0.0)
+            previous_p95 = previous.get('latency_ms', {}).get('total', {}).get('p95', 0.0)
+            self.stdout.write(
+                f"size={size} {recall_key} {recall_delta:+.3f} mrr {current['mrr'] - previous.get('mrr', 0.0):+.3f} "
+                f"total p95 {p95 - previous_p95:+.1f}ms"
+            )
@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from apps.chats.services import ChatMemoryService
+from benchmarks.vector_dims import evaluate, storage
+
+
+class Command(BaseCommand):
+    help = "Compares recall@k and latency of full, binary and truncated-dimension vector search."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--rescore-factor', type=int, default=None)
+        parser.add_argument('--storage', action='store_true',
+                            help="Also report heap and vector index sizes.")
+
+    def handle(self, *args, **options):
+        service = ChatMemoryService()
+        if options['rescore_factor']:
+            service.vector_rescore_factor = options['rescore_factor']
+        report = evaluate(service, queries=options['queries'], k=options['k'])
+        if options['storage']:
+            report['storage'] = storage()
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,25 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations
+import pgvector.django
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('chats', '0009_document_pdf_file_name'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='chatmemory',
+            index=pgvector.django.HnswIndex(
+                ef_construction=64,
+                fields=['embedding'],
+                m=16,
+                name='chatmemory_embedding_hnsw',
+                opclasses=['vector_cosine_ops'],
+            ),
+        ),
+    ]
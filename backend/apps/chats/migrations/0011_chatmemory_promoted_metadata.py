@@ -0,0 +1,48 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_SQL = """
+UPDATE chats_chatmemory AS m
+SET
+    source = COALESCE(LEFT(m.metadata->>'source', 32), ''),
+    source_type = COALESCE(LEFT(m.metadata->>'source_type', 32), ''),
+    page = CASE WHEN m.metadata->>'page' ~ '^[0-9]{1,9}$' THEN (m.metadata->>'page')::integer END,
+    document_id = (
+        SELECT d.id FROM chats_document AS d
+        WHERE m.metadata->>'document_id' ~ '^[0-9]{1,18}$'
+          AND d.id = (m.metadata->>'document_id')::bigint
+    )
+WHERE m.metadata ?| array['source', 'source_type', 'page', 'document_id'];
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0010_chatmemory_embedding_hnsw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmemory',
+            name='document',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='memories', to='chats.document'),
+        ),
+        migrations.AddField(
+            model_name='chatmemory',
+            name='page',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmemory',
+            name='source',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='chatmemory',
+            name='source_type',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.RunSQL(BACKFILL_SQL, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,17 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('chats', '0011_chatmemory_promoted_metadata'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='chatmemory',
+            index=models.Index(fields=['session', 'document', 'page'], name='chatmemory_session_doc_page'),
+        ),
+    ]
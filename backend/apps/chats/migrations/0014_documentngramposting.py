@@ -0,0 +1,29 @@
+# Generated by Django 4.2 on 2026-10-18 06:03
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0013_chatmemory_content_trgm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentNgramPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gram', models.CharField(max_length=2)),
+                ('memory_ids', django.contrib.postgres.fields.ArrayField(base_field=models.BigIntegerField(), default=list, size=None)),
+                ('tfs', django.contrib.postgres.fields.ArrayField(base_field=models.PositiveSmallIntegerField(), default=list, size=None)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ngram_postings', to='chats.document')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='documentngramposting',
+            constraint=models.UniqueConstraint(fields=('document', 'gram'), name='ngram_posting_document_gram'),
+        ),
+    ]
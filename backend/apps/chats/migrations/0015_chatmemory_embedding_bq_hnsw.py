@@ -0,0 +1,33 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.comparison
+import pgvector.django.bit
+import pgvector.django.indexes
+
+
+class Migration(migrations.Migration):
+    # Existing rows are covered by the index build itself; no data migration needed.
+    atomic = False
+
+    dependencies = [
+        ('chats', '0014_documentngramposting'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='chatmemory',
+            index=pgvector.django.indexes.HnswIndex(
+                django.contrib.postgres.indexes.OpClass(
+                    django.db.models.functions.comparison.Cast(
+                        models.Func(models.F('embedding'), function='binary_quantize', output_field=pgvector.django.bit.BitField()),
+                        pgvector.django.bit.BitField(length=1536),
+                    ),
+                    name='bit_hamming_ops',
+                ),
+                ef_construction=64,
+                m=16,
+                name='chatmemory_embedding_bq_hnsw',
+            ),
+        ),
+    ]
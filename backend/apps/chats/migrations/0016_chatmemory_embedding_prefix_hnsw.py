@@ -0,0 +1,35 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.comparison
+import pgvector.django.indexes
+import pgvector.django.vector
+
+
+def prefix_index(dims):
+    return pgvector.django.indexes.HnswIndex(
+        django.contrib.postgres.indexes.OpClass(
+            django.db.models.functions.comparison.Cast(
+                models.Func(models.F('embedding'), models.Value(1), models.Value(dims), function='subvector', output_field=pgvector.django.vector.VectorField()),
+                pgvector.django.vector.VectorField(dimensions=dims),
+            ),
+            name='vector_cosine_ops',
+        ),
+        ef_construction=64,
+        m=16,
+        name=f'chatmemory_embedding_d{dims}_hnsw',
+    )
+
+
+class Migration(migrations.Migration):
+    # Expression indexes over subvector(embedding, 1, n): existing rows are covered by the build.
+    atomic = False
+
+    dependencies = [
+        ('chats', '0015_chatmemory_embedding_bq_hnsw'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(model_name='chatmemory', index=prefix_index(256)),
+        AddIndexConcurrently(model_name='chatmemory', index=prefix_index(512)),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 06:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0016_chatmemory_embedding_prefix_hnsw'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='timings',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,203 @@
+"""
+Converts chats_chatmemory and chats_job into declaratively partitioned tables
+(see apps.chats.partitions for the layout and the retention job).
+
+chats_chatmemory: the existing table keeps its document chunks and becomes the
+('pdf') partition in place, indexes included; chat-history rows are copied into
+monthly partitions of chats_chatmemory_history. chats_job: the existing table is
+attached in place as the partition for everything before the cut-over month.
+
+Partitioned tables cannot have a primary key or unique constraint without the
+partition key and (before PostgreSQL 17) cannot use identity columns, so:
+- the primary keys become (id, source, created_at) and (id, created_at), ids keep
+  coming from a plain sequence continuing after the current maximum;
+- task_id uniqueness becomes (task_id, created_at) (task ids are UUIDs);
+- MemoryCompaction.summary no longer has a database foreign key.
+Indexes on partitioned tables cannot be built CONCURRENTLY; later index migrations on
+these tables must use AddIndex.
+
+Each table is converted in its own transaction, so chats_job is not held locked
+while chat history is copied. Both steps still take ACCESS EXCLUSIVE locks for their
+duration (the chat-history copy and the index rebuilds are proportional to table
+size), so run this migration in a maintenance window:
+1. stop the Celery workers and beat and put the API in maintenance mode;
+2. run `manage.py migrate chats 0019`; on failure, only the step that failed is
+   rolled back, and re-running resumes at that step;
+3. run `manage.py migrate`, then start workers, beat and the API again.
+Estimate the window beforehand with
+`SELECT COUNT(*) FROM chats_chatmemory WHERE source <> 'pdf'`, the rows copied.
+"""
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+PREMAKE_MONTHS = 3
+
+
+def _month(value, offset=0):
+    index = value.year * 12 + value.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _index_defs(cursor, table):
+    """(name, CREATE INDEX statement) of the non-constraint indexes of `table`."""
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_indexdef(i.indexrelid)
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE i.indrelid = %s::regclass
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = i.indexrelid)
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _constraints(cursor, table, kinds):
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype = ANY(%s)",
+        [table, list(kinds)],
+    )
+    return cursor.fetchall()
+
+
+def _detach_from_identity(cursor, table, sequence):
+    """Moves the id default of `table` to a standalone sequence starting after MAX(id)."""
+    cursor.execute(f"CREATE SEQUENCE {sequence} AS bigint")
+    cursor.execute(f"SELECT setval('{sequence}', COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)")
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id DROP IDENTITY IF EXISTS")
+    cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+
+
+def _rename_indexes(cursor, indexes, suffix):
+    for name, _ in indexes:
+        cursor.execute(f'ALTER INDEX "{name}" RENAME TO "{name[:63 - len(suffix)]}{suffix}"')
+
+
+def _create_month_partitions(cursor, parent, first, last):
+    month = first
+    while month <= last:
+        end = _month(month, 1)
+        cursor.execute(
+            f"CREATE TABLE {parent}_p{month:%Y_%m} PARTITION OF {parent} FOR VALUES FROM (%s) TO (%s)",
+            [month, end],
+        )
+        month = end
+
+
+def partition_chatmemory(cursor, now):
+    indexes = _index_defs(cursor, 'chats_chatmemory')
+    foreign_keys = _constraints(cursor, 'chats_chatmemory', 'f')
+    primary_key = _constraints(cursor, 'chats_chatmemory', 'p')
+
+    cursor.execute("ALTER TABLE chats_chatmemory RENAME TO chats_chatmemory_pdf")
+    _rename_indexes(cursor, indexes, '_pdf')
+    _detach_from_identity(cursor, 'chats_chatmemory_pdf', 'chats_chatmemory_id_seq_p')
+
+    cursor.execute(
+        "CREATE TABLE chats_chatmemory (LIKE chats_chatmemory_pdf INCLUDING DEFAULTS) PARTITION BY LIST (source)"
+    )
+    cursor.execute("ALTER SEQUENCE chats_chatmemory_id_seq_p OWNED BY chats_chatmemory.id")
+    cursor.execute(
+        "CREATE TABLE chats_chatmemory_history PARTITION OF chats_chatmemory DEFAULT PARTITION BY RANGE (created_at)"
+    )
+    cursor.execute("CREATE TABLE chats_chatmemory_history_default PARTITION OF chats_chatmemory_history DEFAULT")
+    cursor.execute("SELECT MIN(created_at) FROM chats_chatmemory_pdf WHERE source <> 'pdf'")
+    oldest = cursor.fetchone()[0] or now
+    _create_month_partitions(cursor, 'chats_chatmemory_history', _month(oldest), _month(now, PREMAKE_MONTHS))
+
+    # Chat history moves out; document chunks stay where they are
+    cursor.execute("INSERT INTO chats_chatmemory_history SELECT * FROM chats_chatmemory_pdf WHERE source <> 'pdf'")
+    cursor.execute("DELETE FROM chats_chatmemory_pdf WHERE source <> 'pdf'")
+    for name, _, _ in primary_key:
+        cursor.execute(f'ALTER TABLE chats_chatmemory_pdf DROP CONSTRAINT "{name}"')
+    cursor.execute("ALTER TABLE chats_chatmemory_pdf ADD CONSTRAINT chatmemory_pdf_source CHECK (source = 'pdf')")
+    cursor.execute("ALTER TABLE chats_chatmemory ATTACH PARTITION chats_chatmemory_pdf FOR VALUES IN ('pdf')")
+
+    # Parent indexes adopt the equivalent existing indexes of the pdf partition
+    for _, definition in indexes:
+        cursor.execute(definition)
+    cursor.execute("ALTER TABLE chats_chatmemory ADD PRIMARY KEY (id, source, created_at)")
+    for name, _, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE chats_chatmemory ADD CONSTRAINT "{name}" {definition}')
+    cursor.execute("ANALYZE chats_chatmemory")
+
+
+def partition_job(cursor, now):
+    indexes = _index_defs(cursor, 'chats_job')
+    foreign_keys = _constraints(cursor, 'chats_job', 'f')
+    keys = _constraints(cursor, 'chats_job', 'pu')
+    cutover = _month(now, 1)
+
+    cursor.execute("ALTER TABLE chats_job RENAME TO chats_job_p_legacy")
+    _rename_indexes(cursor, indexes, '_legacy')
+    _detach_from_identity(cursor, 'chats_job_p_legacy', 'chats_job_id_seq_p')
+
+    cursor.execute("CREATE TABLE chats_job (LIKE chats_job_p_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    cursor.execute("ALTER SEQUENCE chats_job_id_seq_p OWNED BY chats_job.id")
+    for name, _, _ in keys:
+        cursor.execute(f'ALTER TABLE chats_job_p_legacy DROP CONSTRAINT "{name}"')
+    # The check constraint lets ATTACH skip its validation scan
+    cursor.execute("ALTER TABLE chats_job_p_legacy ADD CONSTRAINT chats_job_legacy_range CHECK (created_at < %s)", [cutover])
+    cursor.execute(
+        "ALTER TABLE chats_job ATTACH PARTITION chats_job_p_legacy FOR VALUES FROM (MINVALUE) TO (%s)", [cutover]
+    )
+    cursor.execute("CREATE TABLE chats_job_default PARTITION OF chats_job DEFAULT")
+    _create_month_partitions(cursor, 'chats_job', cutover, _month(now, PREMAKE_MONTHS))
+
+    for _, definition in indexes:
+        cursor.execute(definition)
+    cursor.execute("ALTER TABLE chats_job ADD PRIMARY KEY (id, created_at)")
+    cursor.execute("ALTER TABLE chats_job ADD CONSTRAINT chats_job_task_id_created_uniq UNIQUE (task_id, created_at)")
+    for name, _, definition in foreign_keys:
+        cursor.execute(f'ALTER TABLE chats_job ADD CONSTRAINT "{name}" {definition}')
+    cursor.execute("ANALYZE chats_job")
+
+
+def _step(convert, table):
+    def forwards(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        with schema_editor.connection.cursor() as cursor:
+            # Makes a re-run after a failed later step a no-op for this table
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = %s::regclass", [table])
+            if cursor.fetchone()[0] == 'p':
+                return
+            convert(cursor, datetime.now(timezone.utc))
+    return forwards
+
+
+class Migration(migrations.Migration):
+    # Every RunPython below runs in its own transaction
+    atomic = False
+
+    dependencies = [
+        ('chats', '0018_memorycompaction'),
+    ]
+
+    operations = [
+        # Unique constraints on a partitioned table must include the partition key
+        migrations.AlterField(
+            model_name='memorycompaction',
+            name='summary',
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='compaction', to='chats.chatmemory'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='job',
+                    name='task_id',
+                    field=models.CharField(blank=True, max_length=255, null=True),
+                ),
+                migrations.AddConstraint(
+                    model_name='job',
+                    constraint=models.UniqueConstraint(fields=('task_id', 'created_at'), name='chats_job_task_id_created_uniq'),
+                ),
+            ],
+        ),
+        migrations.RunPython(_step(partition_chatmemory, 'chats_chatmemory'), migrations.RunPython.noop, atomic=True),
+        migrations.RunPython(_step(partition_job, 'chats_job'), migrations.RunPython.noop, atomic=True),
+    ]
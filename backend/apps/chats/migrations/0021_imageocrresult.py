@@ -0,0 +1,27 @@
+# Generated by Django 4.2 on 2026-10-18 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0020_session_document_deleted_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageOcrResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64)),
+                ('endpoint', models.CharField(max_length=100)),
+                ('text', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='imageocrresult',
+            constraint=models.UniqueConstraint(fields=('sha256', 'endpoint'), name='image_ocr_result_sha256_endpoint'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2 on 2026-10-18 06:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_document_images(apps, schema_editor):
+    """Claims the images of documents processed before the table existed, from their memories."""
+    ChatMemory = apps.get_model('chats', 'ChatMemory')
+    DocumentImage = apps.get_model('chats', 'DocumentImage')
+    rows = (
+        ChatMemory.objects.filter(document_id__isnull=False)
+        .exclude(metadata__image_key=None)
+        .values_list('document_id', 'metadata__image_key', 'metadata__image_sha256')
+        .distinct()
+    )
+    batch = []
+    for document_id, key, sha256 in rows.iterator():
+        if not key:
+            continue
+        batch.append(DocumentImage(document_id=document_id, key=key, sha256=sha256 or ''))
+        if len(batch) >= 2000:
+            DocumentImage.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    DocumentImage.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0021_imageocrresult'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('sha256', models.CharField(max_length=64)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='chats.document')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='documentimage',
+            index=models.Index(fields=['key'], name='document_image_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='documentimage',
+            constraint=models.UniqueConstraint(fields=('document', 'key'), name='document_image_document_key'),
+        ),
+        migrations.RunPython(backfill_document_images, migrations.RunPython.noop),
+    ]
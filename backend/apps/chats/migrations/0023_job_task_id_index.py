@@ -0,0 +1,17 @@
+# Generated by Django 4.2 on 2026-10-18 06:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0022_documentimage'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['task_id'], name='chats_job_task_id_idx'),
+        ),
+    ]
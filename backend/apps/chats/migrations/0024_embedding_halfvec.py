@@ -0,0 +1,64 @@
+# Generated by Django 4.2 on 2026-10-18 06:52
+
+"""
+Stores ChatMemory.embedding as halfvec(1536) instead of vector(1536) (pgvector >= 0.7).
+
+Binary and matryoshka search (0015, 0016) added coarse-pass indexes next to the
+float32 column and its HNSW index. Half precision halves the two largest structures,
+so the total ends up below the single-index footprint from before those migrations.
+Estimated per million rows (vector payload only, excluding page and graph overhead):
+  heap embedding   6.1 GB -> 3.1 GB
+  full HNSW        6.1 GB -> 3.1 GB
+  d512 / d256 HNSW 2.0 / 1.0 GB -> 1.0 / 0.5 GB
+  binary HNSW      0.2 GB (unchanged, 1 bit per dimension)
+`manage.py vector_benchmark --storage` reports the measured sizes and the recall of
+every mode; its recall@k numbers show the effect of the lower precision, whose
+cosine distance error is on the order of 1e-3.
+
+ALTER COLUMN TYPE rewrites every partition and the HNSW indexes are rebuilt without
+CONCURRENTLY (partitioned table), so run it in a maintenance window.
+"""
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.comparison
+import pgvector.django.halfvec
+import pgvector.django.indexes
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0023_job_task_id_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='chatmemory',
+            name='chatmemory_embedding_hnsw',
+        ),
+        migrations.RemoveIndex(
+            model_name='chatmemory',
+            name='chatmemory_embedding_d256_hnsw',
+        ),
+        migrations.RemoveIndex(
+            model_name='chatmemory',
+            name='chatmemory_embedding_d512_hnsw',
+        ),
+        migrations.AlterField(
+            model_name='chatmemory',
+            name='embedding',
+            field=pgvector.django.halfvec.HalfVectorField(dimensions=1536),
+        ),
+        migrations.AddIndex(
+            model_name='chatmemory',
+            index=pgvector.django.indexes.HnswIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.comparison.Cast(models.Func(models.F('embedding'), models.Value(1), models.Value(256), function='subvector', output_field=pgvector.django.halfvec.HalfVectorField()), pgvector.django.halfvec.HalfVectorField(dimensions=256)), name='halfvec_cosine_ops'), ef_construction=64, m=16, name='chatmemory_embedding_d256_hnsw'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmemory',
+            index=pgvector.django.indexes.HnswIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.comparison.Cast(models.Func(models.F('embedding'), models.Value(1), models.Value(512), function='subvector', output_field=pgvector.django.halfvec.HalfVectorField()), pgvector.django.halfvec.HalfVectorField(dimensions=512)), name='halfvec_cosine_ops'), ef_construction=64, m=16, name='chatmemory_embedding_d512_hnsw'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmemory',
+            index=pgvector.django.indexes.HnswIndex(ef_construction=64, fields=['embedding'], m=16, name='chatmemory_embedding_hnsw', opclasses=['halfvec_cosine_ops']),
+        ),
+    ]
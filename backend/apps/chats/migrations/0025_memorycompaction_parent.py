@@ -0,0 +1,24 @@
+# Generated by Django 4.2 on 2026-10-18 06:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0024_embedding_halfvec'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='memorycompaction',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='children', to='chats.memorycompaction'),
+        ),
+        migrations.AlterField(
+            model_name='memorycompaction',
+            name='summary',
+            field=models.OneToOneField(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='compaction', to='chats.chatmemory'),
+        ),
+    ]
@@ -1,6 +1,13 @@
 from django.conf import settings
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.db import models
-from pgvector.django import VectorField
+from django.db.models import F, Func, Value
+from django.db.models.functions import Cast, Upper
+from pgvector.django import BitField, HalfVectorField, HnswIndex
+
+# Prefix lengths with their own ANN index for Matryoshka-style first-pass search
+SHORT_VECTOR_DIMENSIONS = (256, 512)
 
 SESSION_KIND_CHAT = 'chat'
 SESSION_KIND_IMAGE = 'image'
@@ -12,6 +19,13 @@ SESSION_KIND_CHOICES = [
 ]
 
 
+class ActiveManager(models.Manager):
+    """Hides rows marked for deletion; apps.chats.deletion removes them in the background."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 class Session(models.Model):
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -24,20 +38,70 @@ class Session(models.Model):
     title = models.CharField(max_length=255, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     class Meta:
         ordering = ['-updated_at']
 
 
 class ChatMemory(models.Model):
+    # Partitioned by source, chat history further by created_at month (migration 0019,
+    # apps.chats.partitions). Index migrations can no longer use AddIndexConcurrently.
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='memories')
     content = models.TextField()
-    embedding = VectorField(dimensions=1536)  # OpenAI text-embedding-3-small
+    # OpenAI text-embedding-3-small, stored at half precision: half the heap and HNSW
+    # size of float32, which leaves room for the coarse-pass indexes below
+    embedding = HalfVectorField(dimensions=1536)
     metadata = models.JSONField(default=dict, blank=True)
+    # Promoted from metadata so retrieval filters and deletes can use B-tree indexes
+    document = models.ForeignKey('Document', on_delete=models.CASCADE, null=True, blank=True, related_name='memories')
+    source = models.CharField(max_length=32, blank=True, default='')  # pdf | '' (chat history, images)
+    source_type = models.CharField(max_length=32, blank=True, default='')  # merged | image_ocr | ...
+    page = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['session', 'document', 'page'], name='chatmemory_session_doc_page'),
+            # Binary-quantized (1 bit/dim) index for the coarse pass of VECTOR_SEARCH_MODE=binary
+            HnswIndex(
+                OpClass(
+                    Cast(Func(F('embedding'), function='binary_quantize', output_field=BitField()), BitField(length=1536)),
+                    name='bit_hamming_ops',
+                ),
+                name='chatmemory_embedding_bq_hnsw',
+                m=16,
+                ef_construction=64,
+            ),
+            *[
+                HnswIndex(
+                    OpClass(
+                        Cast(
+                            Func(F('embedding'), Value(1), Value(dims), function='subvector', output_field=HalfVectorField()),
+                            HalfVectorField(dimensions=dims),
+                        ),
+                        name='halfvec_cosine_ops',
+                    ),
+                    name=f'chatmemory_embedding_d{dims}_hnsw',
+                    m=16,
+                    ef_construction=64,
+                )
+                for dims in SHORT_VECTOR_DIMENSIONS
+            ],
+            # Matches Django's icontains SQL (UPPER(content) LIKE ...) so keyword filters can use it
+            GinIndex(OpClass(Upper('content'), name='gin_trgm_ops'), name='chatmemory_content_trgm'),
+            HnswIndex(
+                name='chatmemory_embedding_hnsw',
+                fields=['embedding'],
+                m=16,
+                ef_construction=64,
+                opclasses=['halfvec_cosine_ops'],
+            ),
+        ]
 
 
 class Message(models.Model):
@@ -88,18 +152,96 @@ class Document(models.Model):
     error_message = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveManager()
+    all_objects = models.Manager()
 
     class Meta:
         ordering = ['-created_at']
 
 
+class DocumentNgramPosting(models.Model):
+    """Posting list of a character bigram within one document (see apps.chats.ngram)."""
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='ngram_postings')
+    gram = models.CharField(max_length=2)
+    memory_ids = ArrayField(models.BigIntegerField(), default=list)
+    tfs = ArrayField(models.PositiveSmallIntegerField(), default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'gram'], name='ngram_posting_document_gram'),
+        ]
+
+
+class DocumentImage(models.Model):
+    """
+    An extracted image object a document uses. Images are stored once per session by
+    content hash, so an object is deleted with a document only when no other document
+    of the session holds a row for it (see apps.chats.deletion).
+    """
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='images')
+    key = models.CharField(max_length=255)
+    sha256 = models.CharField(max_length=64)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['document', 'key'], name='document_image_document_key'),
+        ]
+        indexes = [models.Index(fields=['key'], name='document_image_key')]
+
+
+class ImageOcrResult(models.Model):
+    """OCR text of an image by content hash, shared across documents and sessions."""
+    sha256 = models.CharField(max_length=64)
+    endpoint = models.CharField(max_length=100)
+    text = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['sha256', 'endpoint'], name='image_ocr_result_sha256_endpoint'),
+        ]
+
+
+class MemoryCompaction(models.Model):
+    """Provenance of a summary ChatMemory written by session compaction (see apps.chats.compaction)."""
+    session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='memory_compactions')
+    # No database constraint: ChatMemory is partitioned, so its id alone is not unique in SQL.
+    # Null once the summary is itself compacted; the row stays as a link in the chain.
+    summary = models.OneToOneField(ChatMemory, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='compaction', db_constraint=False)
+    # The next-level compaction that replaced this summary
+    parent = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='children')
+    level = models.PositiveSmallIntegerField()
+    # Direct children: chat memories for level 1, lower-level summaries above that
+    source_memory_ids = ArrayField(models.BigIntegerField(), default=list)
+    # Flattened across levels; messages and images outlive the compacted memories
+    message_ids = ArrayField(models.BigIntegerField(), default=list)
+    image_record_ids = ArrayField(models.BigIntegerField(), default=list)
+    memory_count = models.PositiveIntegerField()  # original chat memories covered
+    first_created_at = models.DateTimeField()
+    last_created_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
 class Job(models.Model):
-    task_id = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    # Partitioned by created_at month (apps.chats.partitions), so uniqueness has to include it
+    task_id = models.CharField(max_length=255, null=True, blank=True)
     session = models.ForeignKey(Session, on_delete=models.CASCADE, related_name='jobs')
     kind = models.CharField(max_length=20)  # chat | image
     status = models.CharField(max_length=20, default='pending')  # pending | running | success | failure
     message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     image_record = models.ForeignKey(ImageRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     error_message = models.TextField(blank=True)
+    # Timing spans of the task run (apps.chats.timing): total_ms, spans, counters
+    timings = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['task_id', 'created_at'], name='chats_job_task_id_created_uniq'),
+        ]
+        # job_status looks jobs up by task_id alone
+        indexes = [models.Index(fields=['task_id'], name='chats_job_task_id_idx')]
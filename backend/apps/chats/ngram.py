@@ -0,0 +1,112 @@
+"""
+Character-bigram inverted index for document chunks.
+
+Korean compounds (모집기간 vs 모집 기간) defeat whitespace tokenization, so document
+chunks are indexed by overlapping character bigrams of their text with whitespace and
+punctuation removed. One posting row per (document, bigram) holds the chunk ids and
+term frequencies; a query token matches a chunk when the chunk appears in the posting
+lists of all of the token's bigrams. Session-wide searches concatenate the posting
+lists of every document in the session (chunk ids are unique across documents).
+"""
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Iterable
+
+from django.db import transaction
+
+from .models import DocumentNgramPosting
+
+_STRIP_RE = re.compile(r"[^0-9a-z가-힣]+")
+
+
+def normalize_for_ngrams(text: str) -> str:
+    return _STRIP_RE.sub("", (text or "").lower())
+
+
+def char_bigrams(text: str) -> Counter:
+    normalized = normalize_for_ngrams(text)
+    return Counter(normalized[i:i + 2] for i in range(len(normalized) - 1))
+
+
+def build_document_postings(document_id: int, memories: Iterable) -> int:
+    """(Re)builds the posting lists of a document from its ChatMemory rows."""
+    postings: dict[str, list[tuple[int, int]]] = defaultdict(list)
+    for memory in memories:
+        for gram, tf in char_bigrams(memory.content).items():
+            postings[gram].append((memory.id, min(tf, 32767)))
+
+    rows = [
+        DocumentNgramPosting(
+            document_id=document_id,
+            gram=gram,
+            memory_ids=[memory_id for memory_id, _ in entries],
+            tfs=[tf for _, tf in entries],
+        )
+        for gram, entries in postings.items()
+    ]
+    with transaction.atomic():
+        DocumentNgramPosting.objects.filter(document_id=document_id).delete()
+        DocumentNgramPosting.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def score_postings(
+    postings: dict[str, tuple[list[int], list[int]]],
+    token_grams: list[list[str]],
+    total_chunks: int,
+    k1: float = 1.2,
+) -> dict[int, float]:
+    """
+    Scores chunks against query tokens given their bigram posting lists.
+    For each token the posting lists are intersected rarest-first; every chunk in the
+    intersection gains the sum of IDF-weighted, saturated term frequencies of the
+    token's bigrams.
+    """
+    n = max(total_chunks, 1)
+    idf = {
+        gram: math.log(1.0 + (n - len(ids) + 0.5) / (len(ids) + 0.5))
+        for gram, (ids, _) in postings.items()
+    }
+    scores: dict[int, float] = defaultdict(float)
+    for grams in token_grams:
+        if not grams or any(g not in postings for g in grams):
+            continue
+        ordered = sorted(set(grams), key=lambda g: len(postings[g][0]))
+        matched = set(postings[ordered[0]][0])
+        for gram in ordered[1:]:
+            if not matched:
+                break
+            matched.intersection_update(postings[gram][0])
+        if not matched:
+            continue
+        for gram in ordered:
+            ids, tfs = postings[gram]
+            for memory_id, tf in zip(ids, tfs):
+                if memory_id in matched:
+                    scores[memory_id] += idf[gram] * tf * (k1 + 1.0) / (tf + k1)
+    return dict(scores)
+
+
+def search_document(document_id: int, tokens: list[str], total_chunks: int, limit: int) -> list[tuple[int, float]]:
+    """Returns up to `limit` (memory_id, score) pairs, best first."""
+    return search_documents([document_id], tokens, total_chunks, limit)
+
+
+def search_documents(document_ids: list[int], tokens: list[str], total_chunks: int, limit: int) -> list[tuple[int, float]]:
+    """search_document over the union of several documents' chunks."""
+    token_grams = [list(char_bigrams(token)) for token in tokens]
+    token_grams = [grams for grams in token_grams if grams]
+    all_grams = {gram for grams in token_grams for gram in grams}
+    if not all_grams or not document_ids:
+        return []
+    postings: dict[str, tuple[list[int], list[int]]] = {}
+    for gram, memory_ids, tfs in DocumentNgramPosting.objects.filter(
+        document_id__in=document_ids, gram__in=all_grams
+    ).values_list('gram', 'memory_ids', 'tfs'):
+        ids, freqs = postings.setdefault(gram, ([], []))
+        ids.extend(memory_ids)
+        freqs.extend(tfs)
+    scores = score_postings(postings, token_grams, total_chunks)
+    ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+    return ranked[:limit]
@@ -0,0 +1,159 @@
+"""
+Monthly partition maintenance and retention for the partitioned tables.
+
+Migration 0019 turns chats_chatmemory into a LIST partitioned table on `source`:
+document chunks ('pdf') live in chats_chatmemory_pdf and are only removed together
+with their documents, while chat history goes to chats_chatmemory_history, which is
+RANGE partitioned by created_at month. chats_job is RANGE partitioned by created_at
+month directly; jobs older than the migration sit in chats_job_p_legacy. A DEFAULT
+partition catches rows for months that have no partition yet.
+
+maintain() (run daily by Celery beat) creates the partitions of the coming months
+and drops whole partitions past their retention window, so pruning is a DROP TABLE
+rather than a large DELETE followed by vacuum. Retention is opt-in per table
+(CHAT_MEMORY_RETENTION_DAYS, JOB_RETENTION_DAYS; 0 keeps everything).
+"""
+import logging
+import os
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Optional
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_TABLE = 'chats_chatmemory_history'
+JOB_TABLE = 'chats_job'
+MONTHLY_TABLES = (CHAT_HISTORY_TABLE, JOB_TABLE)
+
+_UPPER_BOUND_RE = re.compile(r"TO \('([^']+)'\)")
+
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1, tzinfo=dt_timezone.utc)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    index = value.year * 12 + value.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(table: str, start: datetime) -> str:
+    return f"{table}_p{start:%Y_%m}"
+
+
+def is_partitioned(table: str) -> bool:
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE relname = %s", [table])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def list_partitions(table: str) -> list[tuple[str, Optional[datetime]]]:
+    """(partition name, exclusive upper bound) for every partition of `table`; None for DEFAULT."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            ORDER BY c.relname
+            """,
+            [table],
+        )
+        rows = cursor.fetchall()
+    partitions = []
+    for name, bound in rows:
+        match = _UPPER_BOUND_RE.search(bound or '')
+        upper = None
+        if match:
+            upper = datetime.fromisoformat(re.sub(r"([+-]\d\d)$", r"\1:00", match.group(1)))
+        partitions.append((name, upper))
+    return partitions
+
+
+def create_month_partition(table: str, start: datetime) -> bool:
+    """
+    Creates the partition for the month beginning at `start` unless it exists.
+    Rows that already landed in the DEFAULT partition for that month are moved into it.
+    """
+    name = partition_name(table, start)
+    end = add_months(start, 1)
+    qn = connection.ops.quote_name
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [name])
+        if cursor.fetchone():
+            return False
+        cursor.execute(f"CREATE TABLE {qn(name)} (LIKE {qn(table)} INCLUDING DEFAULTS)")
+        cursor.execute(
+            f"WITH moved AS (DELETE FROM {qn(table + '_default')} "
+            f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+            f"INSERT INTO {qn(name)} SELECT * FROM moved",
+            [start, end],
+        )
+        cursor.execute(
+            f"ALTER TABLE {qn(table)} ATTACH PARTITION {qn(name)} FOR VALUES FROM (%s) TO (%s)",
+            [start, end],
+        )
+    return True
+
+
+def ensure_partitions(months_ahead: int = 3, now: Optional[datetime] = None) -> list[str]:
+    now = now or timezone.now()
+    created = []
+    for table in MONTHLY_TABLES:
+        if not is_partitioned(table):
+            continue
+        for offset in range(months_ahead + 1):
+            start = add_months(month_start(now), offset)
+            if create_month_partition(table, start):
+                created.append(partition_name(table, start))
+    return created
+
+
+def _has_unfinished_jobs(partition: str) -> bool:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT 1 FROM {connection.ops.quote_name(partition)} WHERE status IN ('pending', 'running') LIMIT 1"
+        )
+        return cursor.fetchone() is not None
+
+
+def drop_expired_partitions(table: str, cutoff: datetime) -> list[str]:
+    """Drops partitions of `table` whose rows are all older than `cutoff`."""
+    from .models import MemoryCompaction
+
+    dropped = []
+    for name, upper in list_partitions(table):
+        if upper is None or upper > cutoff:
+            continue
+        if table == JOB_TABLE and _has_unfinished_jobs(name):
+            logger.warning(f"Keeping partition {name}: it still has pending or running jobs")
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"ALTER TABLE {connection.ops.quote_name(table)} DETACH PARTITION {connection.ops.quote_name(name)}")
+            cursor.execute(f"DROP TABLE {connection.ops.quote_name(name)}")
+            if table == CHAT_HISTORY_TABLE:
+                # A summary's created_at equals its provenance's last_created_at
+                MemoryCompaction.objects.filter(last_created_at__lt=upper).delete()
+        logger.info(f"Dropped expired partition {name} (rows before {upper:%Y-%m-%d})")
+        dropped.append(name)
+    return dropped
+
+
+def maintain(now: Optional[datetime] = None) -> dict:
+    now = now or timezone.now()
+    report = {'created': ensure_partitions(int(os.environ.get("PARTITION_PREMAKE_MONTHS", "3")), now), 'dropped': []}
+    retention = {
+        CHAT_HISTORY_TABLE: int(os.environ.get("CHAT_MEMORY_RETENTION_DAYS", "0")),
+        JOB_TABLE: int(os.environ.get("JOB_RETENTION_DAYS", "0")),
+    }
+    for table, days in retention.items():
+        if days > 0 and is_partitioned(table):
+            report['dropped'] += drop_expired_partitions(table, now - timedelta(days=days))
+    return report
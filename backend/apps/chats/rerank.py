@@ -0,0 +1,96 @@
+"""
+CPU-only reranker used instead of the LLM reranker on the hot path.
+
+Scores each candidate with BM25 over the candidate set (substring term frequency, so
+Korean compounds still match), a proximity bonus for query terms that appear close
+together, and the share of query character bigrams the passage covers. The lexical
+order is then fused with the first-stage order by RRF, so one strong lexical match
+cannot push every first-stage hit out of the top results.
+"""
+import math
+from typing import Sequence
+
+from .ngram import char_bigrams, normalize_for_ngrams
+
+
+class LexicalReranker:
+    def __init__(self, k1: float = 1.2, b: float = 0.75, proximity_weight: float = 1.0,
+                 coverage_weight: float = 2.0, proximity_window: int = 50, rrf_k: int = 60):
+        self.k1 = k1
+        self.b = b
+        self.proximity_weight = proximity_weight
+        self.coverage_weight = coverage_weight
+        self.proximity_window = proximity_window
+        self.rrf_k = rrf_k
+
+    def _proximity(self, text: str, terms: list[str]) -> float:
+        """Bonus for the smallest window of text that contains every matched term once."""
+        positions = []
+        for term_idx, term in enumerate(terms):
+            start = text.find(term)
+            while start != -1:
+                positions.append((start, term_idx))
+                start = text.find(term, start + 1)
+        matched = {term_idx for _, term_idx in positions}
+        if len(matched) < 2:
+            return 0.0
+        positions.sort()
+        best = math.inf
+        counts: dict[int, int] = {}
+        left = 0
+        for right, (pos, term_idx) in enumerate(positions):
+            counts[term_idx] = counts.get(term_idx, 0) + 1
+            while len(counts) == len(matched):
+                left_pos, left_term = positions[left]
+                best = min(best, pos - left_pos)
+                counts[left_term] -= 1
+                if not counts[left_term]:
+                    del counts[left_term]
+                left += 1
+        return (len(matched) - 1) / (1.0 + best / self.proximity_window)
+
+    def score(self, query: str, terms: list[str], passages: Sequence[str]) -> list[float]:
+        terms = [t.lower() for t in dict.fromkeys(terms) if t]
+        texts = [(p or "").lower() for p in passages]
+        if not texts:
+            return []
+        n = len(texts)
+        avg_len = max(sum(len(t) for t in texts) / n, 1.0)
+        df = {term: sum(1 for t in texts if term in t) for term in terms}
+        query_grams = set(char_bigrams(query))
+
+        scores = []
+        for text in texts:
+            bm25 = 0.0
+            for term in terms:
+                if not df[term]:
+                    continue
+                tf = text.count(term)
+                if not tf:
+                    continue
+                idf = math.log(1.0 + (n - df[term] + 0.5) / (df[term] + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * len(text) / avg_len)
+                bm25 += idf * tf * (self.k1 + 1.0) / (tf + norm)
+            coverage = 0.0
+            if query_grams:
+                normalized = normalize_for_ngrams(text)
+                coverage = sum(1 for g in query_grams if g in normalized) / len(query_grams)
+            scores.append(
+                bm25
+                + self.proximity_weight * self._proximity(text, terms)
+                + self.coverage_weight * coverage
+            )
+        return scores
+
+    def rerank(self, query: str, terms: list[str], candidates: list, limit: int) -> list:
+        """Reorders objects exposing `.content` (in first-stage order); returns the best `limit`."""
+        if not candidates:
+            return []
+        scores = self.score(query, terms, [c.content for c in candidates])
+        lexical = sorted(range(len(candidates)), key=lambda i: (-scores[i], i))
+        lexical_rank = {i: rank for rank, i in enumerate(lexical)}
+        order = sorted(
+            range(len(candidates)),
+            key=lambda i: (-(1.0 / (self.rrf_k + lexical_rank[i] + 1) + 1.0 / (self.rrf_k + i + 1)), i),
+        )
+        return [candidates[i] for i in order[:limit]]
@@ -2,14 +2,25 @@ import os
 import logging
 import re
 import json
+import threading
+import time
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from typing import Optional
 from openai import OpenAI
 import requests
-from pgvector.django import CosineDistance
+from pgvector import Vector
+from pgvector.django import BitField, CosineDistance, HalfVectorField, HammingDistance
 from django.conf import settings
-from django.db.models import Case, IntegerField, Value, When
-from django.db.models.functions import Cast
-from .models import ChatMemory, Session
+from django.db import connection, transaction
+from django.db.models import Avg, Count, ExpressionWrapper, F, FloatField, Func, Q, Value, Window
+from django.db.models.functions import Cast, Greatest, Length, Ln, Lower, Replace
+from .models import SHORT_VECTOR_DIMENSIONS, ChatMemory, Document, ImageOcrResult, Session
+from .batching import EmbeddingCoalescer
+from .cache import EmbeddingCache, RerankCache
+from . import ngram, timing
+from .rerank import LexicalReranker
 try:
     from apps.ai.router import run_chat
 except Exception:
@@ -17,6 +28,49 @@ except Exception:
 
 logger = logging.getLogger(__name__)
 
+# Shared pool for I/O-bound retrieval stages (embedding HTTP calls) that overlap DB work
+_retrieval_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("RETRIEVAL_THREADS", "8")),
+    thread_name_prefix="retrieval",
+)
+
+# Shortest icontains pattern the trigram GIN index on UPPER(content) can narrow
+TRIGRAM_MIN_TOKEN_LENGTH = 3
+
+FAL_OCR_ENDPOINT = "fal-ai/llava-next"
+FAL_OCR_PROMPT = "Extract all text from this image exactly as it appears. If there is no text, return an empty string."
+# Bounds the OCR requests in flight to the fal endpoint from one worker process
+_fal_ocr_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("FAL_OCR_CONCURRENCY", "8")),
+    thread_name_prefix="fal-ocr",
+)
+
+class RetrievedMemory:
+    """
+    Lightweight retrieval result. Built from .values() rows so the 1536-dim
+    embedding is never transferred or deserialized on the query path.
+    """
+    __slots__ = ('id', 'content', 'metadata', 'page', 'score', 'vector_rank', 'keyword_rank')
+    FIELDS = ('id', 'content', 'metadata', 'page')
+
+    def __init__(self, id: int, content: str, metadata: Optional[dict], page: Optional[int] = None,
+                 score: Optional[float] = None, vector_rank: Optional[int] = None, keyword_rank: Optional[int] = None):
+        self.id = id
+        self.content = content
+        self.metadata = metadata or {}
+        self.page = page
+        self.score = score
+        self.vector_rank = vector_rank
+        self.keyword_rank = keyword_rank
+
+    @classmethod
+    def from_row(cls, row: dict, score: Optional[float] = None) -> 'RetrievedMemory':
+        return cls(row['id'], row['content'], row['metadata'], row.get('page'), score=row.get('score', score))
+
+    def __repr__(self):
+        return f"RetrievedMemory(id={self.id}, page={self.page}, score={self.score})"
+
+
 class ChatMemoryService:
     def __init__(self):
         # Use fal OpenRouter embeddings (OpenAI-compatible)
@@ -29,6 +83,53 @@ class ChatMemoryService:
         self.rerank_enabled = os.environ.get("RERANK_ENABLED", "1") == "1"
         self.rerank_model = os.environ.get("RERANK_MODEL", "openai/gpt-4o-mini")
         self.rerank_max_candidates = int(os.environ.get("RERANK_MAX_CANDIDATES", "24"))
+        self.rerank_cache = None
+        if os.environ.get("RERANK_CACHE_ENABLED", "1") == "1":
+            self.rerank_cache = RerankCache(ttl=int(os.environ.get("RERANK_CACHE_TTL", str(24 * 3600))))
+        # RERANK_MODEL=local (or local:lexical) selects the in-process CPU reranker
+        self.local_reranker = LexicalReranker() if self.rerank_model.startswith("local") else None
+        # Session-wide searches are only reranked with RERANK_ALL=1
+        self.rerank_all = os.environ.get("RERANK_ALL", "0") == "1"
+        self.embedding_batch_size = int(os.environ.get("EMBEDDING_BATCH_SIZE", "64"))
+        self.embedding_timeout = float(os.environ.get("EMBEDDING_TIMEOUT", "30"))
+        self.ngram_search_enabled = os.environ.get("NGRAM_SEARCH_ENABLED", "1") == "1"
+        self.ocr_timeout = float(os.environ.get("FAL_OCR_TIMEOUT", "60"))
+        self.concurrent_retrieval = os.environ.get("RETRIEVAL_CONCURRENT", "1") == "1"
+        self._local = threading.local()
+        self.hybrid_search_mode = os.environ.get("HYBRID_SEARCH_MODE", "python")  # python | sql
+        # full: HNSW over full-precision vectors; binary / matryoshka: approximate pass
+        # over the binary-quantized or prefix (VECTOR_SHORT_DIMENSIONS) index, then
+        # exact cosine re-scoring of the top candidates
+        self.vector_search_mode = os.environ.get("VECTOR_SEARCH_MODE", "full")
+        self.vector_short_dimensions = 256
+        short_dimensions = os.environ.get("VECTOR_SHORT_DIMENSIONS", "256")
+        if short_dimensions.strip().isdigit() and int(short_dimensions) in SHORT_VECTOR_DIMENSIONS:
+            self.vector_short_dimensions = int(short_dimensions)
+        else:
+            # The service is built at import time, so a bad value must not take the process down
+            logger.warning(f"VECTOR_SHORT_DIMENSIONS={short_dimensions!r} is not one of "
+                           f"{SHORT_VECTOR_DIMENSIONS}; using {self.vector_short_dimensions}")
+        self.vector_rescore_factor = int(os.environ.get("VECTOR_RESCORE_FACTOR", "4"))
+        self.vector_ef_search = int(os.environ.get("VECTOR_EF_SEARCH", "100"))
+        self.vector_iterative_scan = os.environ.get("VECTOR_ITERATIVE_SCAN", "")
+        self.vector_exact_threshold = int(os.environ.get("VECTOR_EXACT_SEARCH_THRESHOLD", "2000"))
+        self.embedding_cache = None
+        if os.environ.get("EMBEDDING_CACHE_ENABLED", "1") == "1":
+            self.embedding_cache = EmbeddingCache(
+                max_entries=int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "2048")),
+                local_ttl=float(os.environ.get("EMBEDDING_CACHE_LOCAL_TTL", "3600")),
+                redis_ttl=int(os.environ.get("EMBEDDING_CACHE_REDIS_TTL", str(7 * 24 * 3600))),
+                use_redis=os.environ.get("EMBEDDING_CACHE_REDIS", "1") == "1",
+            )
+        # Concurrent single-text embed_text calls share one provider request
+        self.embedding_coalescer = None
+        if os.environ.get("EMBEDDING_COALESCE_ENABLED", "1") == "1":
+            self.embedding_coalescer = EmbeddingCoalescer(
+                self._request_embeddings,
+                max_batch=int(os.environ.get("EMBEDDING_COALESCE_MAX_BATCH", str(self.embedding_batch_size))),
+                max_wait=float(os.environ.get("EMBEDDING_COALESCE_WAIT_MS", "5")) / 1000,
+                max_concurrency=int(os.environ.get("EMBEDDING_COALESCE_CONCURRENCY", "8")),
+            )
         if api_key:
             self.client = OpenAI(
                 base_url="https://fal.run/openrouter/router/openai/v1",
@@ -45,37 +146,114 @@ class ChatMemoryService:
             # Return zero vector if no client (for testing/dev safety)
             return [0.0] * 1536
 
+        if self.embedding_cache:
+            cached = self.embedding_cache.get(self.embedding_model, text)
+            if cached is not None:
+                timing.incr('embedding_cache.hit')
+                return cached
+            timing.incr('embedding_cache.miss')
+
         try:
-            response = self.client.embeddings.create(
-                input=text,
-                model=self.embedding_model
-            )
-            return response.data[0].embedding
+            # Timed on the caller's thread: the coalesced provider call runs on a pool
+            # thread, outside the caller's trace
+            with timing.span('embedding.request', inputs=1, coalesced=bool(self.embedding_coalescer)):
+                if self.embedding_coalescer:
+                    # The provider call is bounded by embedding_timeout, the batch wait by max_wait
+                    embedding = self.embedding_coalescer.submit(text).result(
+                        timeout=self.embedding_timeout + self.embedding_coalescer.max_wait
+                    )
+                else:
+                    embedding = self._request_embeddings([text])[0]
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return [0.0] * 1536
+        if self.embedding_cache:
+            self.embedding_cache.set(self.embedding_model, text, embedding)
+        return embedding
+
+    def _request_embeddings(self, texts: list[str]) -> list[list[float]]:
+        """One provider call for `texts`; raises on failure or a short response."""
+        response = self.client.embeddings.create(
+            input=texts,
+            model=self.embedding_model,
+            timeout=self.embedding_timeout,
+        )
+        data = sorted(response.data, key=lambda d: d.index)
+        if len(data) != len(texts):
+            raise ValueError(f"expected {len(texts)} embeddings, got {len(data)}")
+        return [d.embedding for d in data]
 
-    def ocr_image_with_fal(self, image_url: str) -> str:
+    def embed_texts(self, texts: list[str], strict: bool = False) -> list[list[float]]:
+        """
+        Generates embeddings for many texts, one provider call per batch. Failed batches
+        become zero vectors, which vector search never returns; with strict=True the
+        provider error is raised instead, for callers that would otherwise lose data.
+        """
+        if not texts:
+            return []
+        if not self.client:
+            if strict:
+                raise RuntimeError("No embedding client configured (FAL_KEY not set)")
+            return [[0.0] * 1536 for _ in texts]
+
+        resolved: dict[str, list[float]] = {}
+        if self.embedding_cache:
+            resolved.update(self.embedding_cache.get_many(self.embedding_model, texts))
+        # Identical chunks (e.g. repeated headers) are only sent once
+        missing = list(dict.fromkeys(t for t in texts if t not in resolved))
+
+        batch_size = max(1, self.embedding_batch_size)
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            try:
+                with timing.span('embedding.request', inputs=len(batch)):
+                    fresh = dict(zip(batch, self._request_embeddings(batch)))
+            except Exception as e:
+                logger.error(f"Error generating batch embedding ({len(batch)} inputs): {e}")
+                if strict:
+                    raise
+                for text in batch:
+                    resolved[text] = [0.0] * 1536
+                continue
+            resolved.update(fresh)
+            if self.embedding_cache:
+                self.embedding_cache.set_many(self.embedding_model, fresh)
+        return [resolved[t] for t in texts]
+
+    def ocr_image_with_fal(self, image_url: str, timeout: Optional[float] = None) -> Optional[str]:
         """
         Uses fal.ai Vision model (Llava-Next) to extract text from an image URL.
+        Returns None when the request failed, or was still unfinished after `timeout`
+        seconds (it is then cancelled), so callers can tell failures from images without text.
         """
         import time
         api_key = getattr(settings, 'FAL_KEY', os.environ.get("FAL_KEY"))
         if not api_key:
             logger.warning("FAL_KEY not set. Skipping image OCR.")
-            return ""
+            return None
+        deadline = time.monotonic() + (timeout or 30)
 
         # Attempt to use fal_client if available
         try:
             import fal_client
             handler = fal_client.submit(
-                "fal-ai/llava-next",
+                FAL_OCR_ENDPOINT,
                 arguments={
                     "image_url": image_url,
-                    "prompt": "Extract all text from this image exactly as it appears. If there is no text, return an empty string.",
+                    "prompt": FAL_OCR_PROMPT,
                     "max_tokens": 1024
                 },
             )
+            if timeout:
+                while not isinstance(handler.status(), fal_client.Completed):
+                    if time.monotonic() >= deadline:
+                        try:
+                            handler.cancel()
+                        except Exception:
+                            pass
+                        logger.warning(f"Fal.ai OCR timed out after {timeout}s: {image_url[:80]}")
+                        return None
+                    time.sleep(0.5)
             result = handler.get()
             output = result.get('output', '')
             # Sometimes output is a dict or list depending on model
@@ -86,14 +264,14 @@ class ChatMemoryService:
             # Fallback to direct HTTP request with polling (simplified)
             # This is a bit risky due to complexity but necessary if fal_client is missing
             try:
-                queue_url = "https://queue.fal.run/fal-ai/llava-next"
+                queue_url = f"https://queue.fal.run/{FAL_OCR_ENDPOINT}"
                 headers = {
                     "Authorization": f"Key {api_key}",
                     "Content-Type": "application/json"
                 }
                 payload = {
                     "image_url": image_url,
-                    "prompt": "Extract all text from this image exactly as it appears. If there is no text, return an empty string.",
+                    "prompt": FAL_OCR_PROMPT,
                     "max_tokens": 1024
                 }
                 
@@ -102,15 +280,15 @@ class ChatMemoryService:
                     job = resp.json()
                     request_id = job.get('request_id')
                     if request_id:
-                        # Poll
-                        status_url = f"https://queue.fal.run/fal-ai/llava-next/requests/{request_id}/status"
-                        for _ in range(15): # 30s
+                        # Poll until the deadline
+                        status_url = f"{queue_url}/requests/{request_id}/status"
+                        while time.monotonic() < deadline:
                             time.sleep(2)
                             s_resp = requests.get(status_url, headers=headers, timeout=10)
                             if s_resp.status_code == 200:
                                 s_data = s_resp.json()
                                 if s_data.get('status') == 'COMPLETED':
-                                    res_url = f"https://queue.fal.run/fal-ai/llava-next/requests/{request_id}"
+                                    res_url = f"{queue_url}/requests/{request_id}"
                                     r_resp = requests.get(res_url, headers=headers, timeout=10)
                                     if r_resp.status_code == 200:
                                         out = r_resp.json().get('output', '')
@@ -122,10 +300,51 @@ class ChatMemoryService:
                                     break
             except Exception as e:
                 logger.error(f"Fal.ai direct request failed: {e}")
-            return ""
+            return None
         except Exception as e:
             logger.error(f"Fal.ai client extracted failed: {e}")
-            return ""
+            return None
+
+    def ocr_images_with_fal(self, image_urls: list[str], content_hashes: Optional[list[str]] = None) -> list[Optional[str]]:
+        """
+        OCRs images concurrently, at most FAL_OCR_CONCURRENCY requests in flight per
+        process, each cut off after FAL_OCR_TIMEOUT seconds. Returns texts in input
+        order, None for failed or timed-out images. With content_hashes (SHA-256 of
+        each image), results are looked up in and saved to ImageOcrResult, so an image
+        seen in any earlier document is not sent again.
+        """
+        texts: list[Optional[str]] = [None] * len(image_urls)
+        cached = {}
+        if content_hashes is not None:
+            cached = dict(
+                ImageOcrResult.objects.filter(sha256__in=set(content_hashes), endpoint=FAL_OCR_ENDPOINT)
+                .values_list('sha256', 'text')
+            )
+        pending = {}
+        for i, url in enumerate(image_urls):
+            sha256 = content_hashes[i] if content_hashes is not None else None
+            if sha256 in cached:
+                texts[i] = cached[sha256]
+            else:
+                pending[i] = _fal_ocr_executor.submit(
+                    contextvars.copy_context().run, self.ocr_image_with_fal, url, self.ocr_timeout
+                )
+        if content_hashes is not None:
+            logger.info(f"Image OCR cache: {len(image_urls) - len(pending)} hits, {len(pending)} misses")
+
+        for i, future in pending.items():
+            try:
+                texts[i] = future.result()
+            except Exception as e:
+                logger.error(f"Fal.ai OCR failed for {image_urls[i][:80]}: {e}")
+
+        if content_hashes is not None:
+            results = {content_hashes[i]: texts[i] for i in pending if texts[i] is not None}
+            ImageOcrResult.objects.bulk_create(
+                [ImageOcrResult(sha256=sha256, endpoint=FAL_OCR_ENDPOINT, text=text) for sha256, text in results.items()],
+                ignore_conflicts=True,
+            )
+        return texts
 
     def _tokenize_query(self, query: str) -> list[str]:
         if not query:
@@ -179,6 +398,18 @@ class ChatMemoryService:
             unique.append(t)
         return unique[:8]
 
+    def _indexed_fields(self, metadata: Optional[dict]) -> dict:
+        """Column values mirrored from metadata for indexed filtering."""
+        meta = metadata or {}
+        page = meta.get('page')
+        document_id = meta.get('document_id')
+        return {
+            'document_id': document_id if isinstance(document_id, int) else None,
+            'source': str(meta.get('source') or '')[:32],
+            'source_type': str(meta.get('source_type') or '')[:32],
+            'page': page if isinstance(page, int) else None,
+        }
+
     def add_memory(self, session_id: int, content: str, metadata: dict = None):
         """Adds a memory item to the vector store."""
         if not content:
@@ -189,38 +420,367 @@ class ChatMemoryService:
             session_id=session_id,
             content=content,
             embedding=embedding,
-            metadata=metadata or {}
+            metadata=metadata or {},
+            **self._indexed_fields(metadata)
+        )
+
+    def add_memories_bulk(self, session_id: int, items: list[tuple[str, Optional[dict]]]) -> list[ChatMemory]:
+        """
+        Adds many memory items at once: embeddings are requested in batches and
+        rows are written with a single bulk insert. Returns the created rows.
+        """
+        return self.add_memory_records([(session_id, content, metadata) for content, metadata in items])
+
+    def add_memory_records(self, records: list[tuple[int, str, Optional[dict]]], strict: bool = False) -> list[ChatMemory]:
+        """
+        Bulk variant of add_memory for (session_id, content, metadata) records that may span
+        sessions. With strict=True an embedding failure raises before anything is written.
+        """
+        records = [(session_id, content, metadata) for session_id, content, metadata in records if content]
+        if not records:
+            return []
+
+        embeddings = self.embed_texts([content for _, content, _ in records], strict=strict)
+        memories = [
+            ChatMemory(
+                session_id=session_id,
+                content=content,
+                embedding=embedding,
+                metadata=metadata or {},
+                **self._indexed_fields(metadata)
+            )
+            for (session_id, content, metadata), embedding in zip(records, embeddings)
+        ]
+        with transaction.atomic():
+            ChatMemory.objects.bulk_create(memories, batch_size=500)
+        return memories
+
+    def _bm25_score(self, tokens: list[str], k1: float = 1.2, b: float = 0.75):
+        """
+        BM25-style score expression evaluated by Postgres over the rows that matched
+        at least one token. Term frequency counts substring occurrences (Korean
+        compounds defeat word tokenization); df, N and average length come from
+        window aggregates over the matched rows.
+        """
+        lowered = Lower('content')
+        doc_len = Cast(Length(lowered), FloatField())
+        matched = Cast(Window(Count('id')), FloatField())
+        avg_len = Greatest(Window(Avg(Length(lowered))), Value(1.0), output_field=FloatField())
+        score = Value(0.0, output_field=FloatField())
+        for token in tokens:
+            needle = token.lower()
+            tf = (doc_len - Cast(Length(Replace(lowered, Value(needle), Value(''))), FloatField())) / Value(float(len(needle)))
+            df = Cast(Window(Count('id', filter=Q(content__icontains=token))), FloatField())
+            idf = Ln(Value(1.0) + (matched - df + Value(0.5)) / (df + Value(0.5)))
+            norm = Value(k1) * (Value(1.0 - b) + Value(b) * doc_len / avg_len)
+            score = score + idf * tf * Value(k1 + 1.0) / (tf + norm)
+        return ExpressionWrapper(score, output_field=FloatField())
+
+    def _ngram_search(self, qs, document_ids: list[int], tokens: list[str], limit: int) -> list[RetrievedMemory]:
+        """Keyword search over the documents' character-bigram postings (Korean-aware)."""
+        total_chunks = ChatMemory.objects.filter(document_id__in=document_ids).count()
+        ranked = ngram.search_documents(document_ids, tokens, total_chunks, limit)
+        if not ranked:
+            return []
+        rows = qs.filter(id__in=[memory_id for memory_id, _ in ranked]).values(*RetrievedMemory.FIELDS)
+        by_id = {row['id']: row for row in rows}
+        return [
+            RetrievedMemory.from_row(by_id[memory_id], score=score)
+            for memory_id, score in ranked
+            if memory_id in by_id
+        ]
+
+    def _bm25_queryset(self, qs, tokens: list[str]):
+        """
+        Rows matching the query tokens, annotated with their BM25 score.
+
+        Rows are selected by the tokens of TRIGRAM_MIN_TOKEN_LENGTH or more characters:
+        an icontains pattern only has trigrams for the trigram GIN index on
+        UPPER(content) to use when it is at least three characters long, and one
+        unindexable arm in the OR turns the whole filter into a scan. Shorter tokens
+        (most two-syllable Korean words: 모집, 기간) then only add to the score of the
+        selected rows. When every token is short the filter scans `qs`, so the cost
+        grows with the rows in scope; search paths keep that scope to rows without
+        bigram postings (chat history, which compaction bounds) where they can.
+        """
+        selecting = [t for t in tokens if len(t) >= TRIGRAM_MIN_TOKEN_LENGTH] or tokens
+        match = Q()
+        for token in selecting:
+            match |= Q(content__icontains=token)
+        return qs.filter(match).annotate(score=self._bm25_score(tokens))
+
+    def _bm25_search(self, qs, tokens: list[str], limit: int) -> list[RetrievedMemory]:
+        scored = self._bm25_queryset(qs, tokens).order_by('-score', 'page', 'id')
+        return [RetrievedMemory.from_row(row) for row in scored.values(*RetrievedMemory.FIELDS, 'score')[:limit]]
+
+    def _uses_ngram(self, tokens: list[str], document_id: Optional[int], session_ids: Optional[list[int]],
+                    exclude_sources: Optional[list[str]]) -> bool:
+        """Whether _keyword_search goes through the bigram postings for this scope."""
+        # The postings only hold document chunks (source='pdf'); with those excluded
+        # (task_chat's session-wide prompt) they cannot match anything
+        return (
+            bool(tokens) and self.ngram_search_enabled and 'pdf' not in (exclude_sources or ())
+            and (document_id is not None or bool(session_ids))
         )
 
-    def _keyword_search(self, qs, query: str, limit: int) -> tuple[list[ChatMemory], bool]:
+    def _keyword_search(self, qs, query: str, limit: int, document_id: Optional[int] = None,
+                        session_ids: Optional[list[int]] = None,
+                        exclude_sources: Optional[list[str]] = None) -> tuple[list[RetrievedMemory], bool]:
         tokens = self._tokenize_query(query)
+        use_ngram = self._uses_ngram(tokens, document_id, session_ids, exclude_sources)
+        if use_ngram and document_id is not None:
+            results = self._ngram_search(qs, [document_id], tokens, limit)
+            if results:
+                return results, True
+        elif use_ngram:
+            # Document chunks through the session's bigram postings, the rest (chat
+            # history, generated images) has no postings and keeps the BM25 scan
+            document_ids = list(Document.objects.filter(session_id__in=session_ids).values_list('id', flat=True))
+            results = self._ngram_search(qs, document_ids, tokens, limit)
+            if results:
+                other = self._bm25_search(qs.filter(document__isnull=True), tokens, limit)
+                return self._rrf_merge(results, other)[:limit], True
         if tokens:
-            score_expr = Value(0, output_field=IntegerField())
-            for token in tokens:
-                score_expr = score_expr + Case(
-                    When(content__icontains=token, then=Value(1)),
-                    default=Value(0),
-                    output_field=IntegerField(),
-                )
-            scored = qs.annotate(
-                score=score_expr,
-                page_num=Cast('metadata__page', IntegerField()),
-            ).order_by('-score', 'page_num', 'id')
-            results = list(scored[:limit])
-            if results and getattr(results[0], 'score', 0) > 0:
+            results = self._bm25_search(qs, tokens, limit)
+            if results:
                 return results, True
-        results = list(
-            qs.annotate(
-                page_num=Cast('metadata__page', IntegerField()),
-            ).order_by('page_num', 'id')[:limit]
-        )
+        results = [RetrievedMemory.from_row(row) for row in qs.order_by('page', 'id').values(*RetrievedMemory.FIELDS)[:limit]]
         return results, False
 
-    def _rrf_merge(self, vector_results: list[ChatMemory], keyword_results: list[ChatMemory], k: int = 60) -> list[ChatMemory]:
+    @contextmanager
+    def _vector_scan_settings(self, exact: bool, limit: int):
+        """
+        Transaction with per-query pgvector settings: exact scans disable index
+        scans, approximate scans set hnsw.ef_search (and iterative scan if configured).
+
+        The settings are transaction-local. Inside a caller's transaction
+        (ATOMIC_REQUESTS, an atomic block in a task) this block is only a savepoint,
+        and releasing it keeps them, so the previous values are restored on exit; an
+        error rolls the savepoint, and the settings with it, back.
+        """
+        if exact:
+            values = {'enable_indexscan': 'off'}
+        else:
+            values = {'hnsw.ef_search': str(max(int(self.vector_ef_search), limit))}
+            if self.vector_iterative_scan:
+                # pgvector >= 0.8: keep scanning the graph until enough rows pass the filter
+                values['hnsw.iterative_scan'] = self.vector_iterative_scan
+        nested = connection.in_atomic_block
+        with transaction.atomic():
+            previous = {}
+            with connection.cursor() as cursor:
+                for name, value in values.items():
+                    if nested:
+                        cursor.execute("SELECT current_setting(%s, true)", [name])
+                        previous[name] = cursor.fetchone()[0]
+                    cursor.execute("SELECT set_config(%s, %s, true)", [name, value])
+            yield
+            with connection.cursor() as cursor:
+                for name, value in previous.items():
+                    if value is None:
+                        # Not defined before (pgvector's GUCs load with the extension)
+                        cursor.execute(f"RESET {name}")
+                    else:
+                        cursor.execute("SELECT set_config(%s, %s, true)", [name, value])
+
+    def _binary_quantize(self, expression):
+        return Cast(
+            Func(expression, function='binary_quantize', output_field=BitField()),
+            BitField(length=1536),
+        )
+
+    def _vector_prefix(self, expression, dims: int):
+        return Cast(
+            Func(expression, Value(1), Value(dims), function='subvector', output_field=HalfVectorField()),
+            HalfVectorField(dimensions=dims),
+        )
+
+    def _coarse_distance(self, embedding: list[float]):
+        """
+        Ordering expression of the approximate first pass for the configured
+        VECTOR_SEARCH_MODE, or None when searching full-precision vectors directly.
+        Each expression matches one of the ChatMemory expression indexes.
+        """
+        query_vector = Cast(Value(Vector(embedding).to_text()), HalfVectorField(dimensions=1536))
+        if self.vector_search_mode == 'binary':
+            return HammingDistance(self._binary_quantize(F('embedding')), self._binary_quantize(query_vector))
+        if self.vector_search_mode == 'matryoshka':
+            dims = self.vector_short_dimensions
+            return CosineDistance(self._vector_prefix(F('embedding'), dims), self._vector_prefix(query_vector, dims))
+        return None
+
+    def _vector_scan_limit(self, limit: int, exact: bool) -> int:
+        if self.vector_search_mode in ('binary', 'matryoshka') and not exact:
+            return limit * self.vector_rescore_factor
+        return limit
+
+    def _vector_candidates_sql(self, qs, embedding: list[float], limit: int, exact: bool) -> tuple[str, tuple]:
+        """
+        SQL selecting (id, content, metadata, page, distance) for the `limit` rows
+        nearest to `embedding` by cosine distance.
+        In binary/matryoshka mode the approximate pass orders by the compact
+        representation (Hamming distance over binary-quantized vectors, or cosine
+        distance over a short prefix) and only its top `limit * VECTOR_RESCORE_FACTOR`
+        rows are re-scored with exact cosine distance on the full vectors.
+        """
+        coarse = None if exact else self._coarse_distance(embedding)
+        if coarse is not None:
+            coarse_sql, coarse_params = (
+                qs.annotate(coarse_distance=coarse)
+                .order_by('coarse_distance')
+                .values(*RetrievedMemory.FIELDS, 'embedding')[:self._vector_scan_limit(limit, exact)]
+                .query.sql_with_params()
+            )
+            sql = (
+                "SELECT c.id, c.content, c.metadata, c.page, c.embedding <=> %s::halfvec AS distance "
+                f"FROM ({coarse_sql}) AS c ORDER BY distance, c.id LIMIT %s"
+            )
+            return sql, (Vector(embedding).to_text(), *coarse_params, limit)
+        return (
+            qs.annotate(distance=CosineDistance('embedding', embedding))
+            .order_by('distance')
+            .values(*RetrievedMemory.FIELDS, 'distance')[:limit]
+            .query.sql_with_params()
+        )
+
+    def _vector_search(self, qs, embedding: list[float], limit: int, exact: Optional[bool] = None) -> list[RetrievedMemory]:
+        """
+        Nearest-neighbour search ordered by cosine distance.
+        Large candidate sets go through the HNSW index with a per-query ef_search;
+        small filtered sets (a single document, a short session) use exact search,
+        since post-filtering an approximate scan can return fewer than `limit` rows.
+        """
+        if connection.vendor != 'postgresql':
+            rows = (
+                qs.annotate(distance=CosineDistance('embedding', embedding))
+                .order_by('distance')
+                .values(*RetrievedMemory.FIELDS, 'distance')[:limit]
+            )
+            return [RetrievedMemory.from_row(row, score=1.0 - row['distance']) for row in rows]
+
+        if exact is None:
+            exact = self._use_exact_search(qs)
+        sql, params = self._vector_candidates_sql(qs, embedding, limit, exact)
+        metadata_field = ChatMemory._meta.get_field('metadata')
+        with self._vector_scan_settings(exact, self._vector_scan_limit(limit, exact)):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+        return [
+            RetrievedMemory(
+                memory_id,
+                content,
+                metadata_field.from_db_value(metadata, None, connection),
+                page,
+                score=1.0 - distance,
+            )
+            for memory_id, content, metadata, page, distance in rows
+        ]
+
+    def _use_exact_search(self, qs) -> bool:
+        if connection.vendor != 'postgresql':
+            return True
+        return qs[:self.vector_exact_threshold + 1].count() <= self.vector_exact_threshold
+
+    def _submit_embedding(self, text: str, timings: dict[str, float]) -> Future:
+        def run():
+            stage = time.perf_counter()
+            try:
+                return self.embed_text(text)
+            finally:
+                timings['embed'] = (time.perf_counter() - stage) * 1000
+
+        if not self.concurrent_retrieval:
+            future: Future = Future()
+            future.set_result(run())
+            return future
+        # Copy the context so cache hits in the worker thread land on the caller's trace
+        return _retrieval_executor.submit(contextvars.copy_context().run, run)
+
+    def _hybrid_search_sql(self, qs, query: str, embedding: list[float], candidate_limit: int, top_k: int, exact: bool,
+                           keyword_ids: Optional[list[int]] = None, k: int = 60) -> list[RetrievedMemory]:
+        """
+        Hybrid retrieval in a single statement: vector and keyword candidates are
+        ranked with ROW_NUMBER() in CTEs and fused with reciprocal rank fusion in
+        Postgres. Returns up to `top_k` RetrievedMemory records with the RRF
+        score, vector_rank and keyword_rank.
+
+        The keyword CTE is the BM25 query of _bm25_search unless `keyword_ids` is
+        given: scopes searched through the bigram postings rank their keyword
+        candidates in _keyword_search first and pass the ordered ids in, so both
+        modes fuse the same keyword list. Unlike the python mode, the keyword-only
+        shortcuts (no vector hit contains a query or critical token) are not applied.
+        """
+        vec_sql, vec_params = self._vector_candidates_sql(qs, embedding, candidate_limit, exact)
+        tokens = self._tokenize_query(query)
+        if keyword_ids is not None:
+            kw_sql = (
+                "SELECT ranked_ids.id, -ranked_ids.ord::float AS score, NULL::integer AS page "
+                "FROM unnest(%s::bigint[]) WITH ORDINALITY AS ranked_ids(id, ord)"
+            )
+            kw_params = (list(keyword_ids),)
+        elif tokens:
+            kw_sql, kw_params = (
+                self._bm25_queryset(qs, tokens)
+                .order_by('-score', 'page', 'id')
+                .values('id', 'score', 'page')[:candidate_limit]
+                .query.sql_with_params()
+            )
+        else:
+            kw_sql, kw_params = "SELECT NULL::bigint AS id, NULL::float AS score, NULL::integer AS page WHERE false", ()
+
+        table = connection.ops.quote_name(ChatMemory._meta.db_table)
+        sql = f"""
+            WITH vec AS (
+                SELECT v.id, ROW_NUMBER() OVER (ORDER BY v.distance, v.id) AS rank
+                FROM ({vec_sql}) AS v
+            ), kw AS (
+                SELECT kw_hits.id, ROW_NUMBER() OVER (ORDER BY kw_hits.score DESC, kw_hits.page ASC NULLS LAST, kw_hits.id) AS rank
+                FROM ({kw_sql}) AS kw_hits
+            ), fused AS (
+                SELECT ranked.id,
+                       SUM(1.0 / (%s + ranked.rank)) AS rrf_score,
+                       MIN(CASE WHEN ranked.src = 'v' THEN ranked.rank END) AS vector_rank,
+                       MIN(CASE WHEN ranked.src = 'k' THEN ranked.rank END) AS keyword_rank
+                FROM (
+                    SELECT id, rank, 'v' AS src FROM vec
+                    UNION ALL
+                    SELECT id, rank, 'k' AS src FROM kw
+                ) AS ranked
+                GROUP BY ranked.id
+                ORDER BY rrf_score DESC, ranked.id
+                LIMIT %s
+            )
+            SELECT m.id, m.content, m.metadata, m.page,
+                   f.rrf_score, f.vector_rank, f.keyword_rank
+            FROM fused AS f
+            JOIN {table} AS m ON m.id = f.id
+            ORDER BY f.rrf_score DESC, f.id
+        """
+        params = (*vec_params, *kw_params, k, top_k)
+        metadata_field = ChatMemory._meta.get_field('metadata')
+        with self._vector_scan_settings(exact, self._vector_scan_limit(candidate_limit, exact)):
+            with connection.cursor() as cursor:
+                cursor.execute(sql, params)
+                rows = cursor.fetchall()
+        return [
+            RetrievedMemory(
+                memory_id,
+                content,
+                metadata_field.from_db_value(metadata, None, connection),
+                page,
+                score=float(rrf_score),
+                vector_rank=vector_rank,
+                keyword_rank=keyword_rank,
+            )
+            for memory_id, content, metadata, page, rrf_score, vector_rank, keyword_rank in rows
+        ]
+
+    def _rrf_merge(self, vector_results: list[RetrievedMemory], keyword_results: list[RetrievedMemory], k: int = 60) -> list[RetrievedMemory]:
         if not vector_results and not keyword_results:
             return []
         scores: dict[int, float] = {}
-        items: dict[int, ChatMemory] = {}
+        items: dict[int, RetrievedMemory] = {}
         for rank, item in enumerate(vector_results):
             scores[item.id] = scores.get(item.id, 0.0) + 1.0 / (k + rank + 1)
             items[item.id] = item
@@ -230,13 +790,36 @@ class ChatMemoryService:
         ranked_ids = sorted(scores.keys(), key=lambda i: scores[i], reverse=True)
         return [items[i] for i in ranked_ids]
 
-    def _rerank_with_llm(self, query: str, candidates: list[ChatMemory], limit: int) -> list[ChatMemory]:
+    def _rerank(self, query: str, candidates: list[RetrievedMemory], limit: int, document_id: Optional[int] = None) -> list[RetrievedMemory]:
+        if self.local_reranker is not None:
+            return self._rerank_local(query, candidates, limit)
+        return self._rerank_with_llm(query, candidates, limit, document_id=document_id)
+
+    def _rerank_local(self, query: str, candidates: list[RetrievedMemory], limit: int) -> list[RetrievedMemory]:
+        if not self.rerank_enabled or not candidates:
+            return candidates[:limit]
+        items = candidates[:self.rerank_max_candidates]
+        # Only the query's own terms: the synonym expansions widen the first stage but
+        # weighting them like the user's words reorders candidates toward the synonyms
+        terms = [t for t in self._tokenize_query(query) if t in query]
+        ranked = self.local_reranker.rerank(query, terms, items, limit)
+        return ranked + candidates[len(items):][:max(0, limit - len(ranked))]
+
+    def _rerank_with_llm(self, query: str, candidates: list[RetrievedMemory], limit: int, document_id: Optional[int] = None) -> list[RetrievedMemory]:
         if not self.rerank_enabled or not run_chat or not candidates:
             return candidates[:limit]
         if os.environ.get('FAL_KEY', '') == '':
             return candidates[:limit]
         top_k = min(len(candidates), self.rerank_max_candidates)
         items = candidates[:top_k]
+        candidate_ids = [item.id for item in items]
+        if self.rerank_cache:
+            cached = self.rerank_cache.get(self.rerank_model, query, candidate_ids, document_id)
+            if cached:
+                timing.incr('rerank_cache.hit')
+                by_id = {item.id: item for item in items}
+                return [by_id[i] for i in cached if i in by_id][:limit]
+            timing.incr('rerank_cache.miss')
         lines = []
         for idx, item in enumerate(items, start=1):
             snippet = (item.content or "").replace("\n", " ").strip()
@@ -251,7 +834,8 @@ class ChatMemoryService:
         )
         prompt = f"Query: {query}\n\nPassages:\n" + "\n".join(lines)
         try:
-            output = run_chat(prompt, model=self.rerank_model, system_prompt=system_prompt, temperature=0, max_tokens=200)
+            with timing.span('rerank.llm', model=self.rerank_model, candidates=len(items)):
+                output = run_chat(prompt, model=self.rerank_model, system_prompt=system_prompt, temperature=0, max_tokens=200)
             # Parse JSON
             match = re.search(r"\{.*\}", output, re.S)
             if match:
@@ -273,30 +857,105 @@ class ChatMemoryService:
                     for item in items:
                         if item.id not in seen:
                             ranked.append(item)
+                    if self.rerank_cache:
+                        self.rerank_cache.set(
+                            self.rerank_model, query, candidate_ids, [item.id for item in ranked], document_id
+                        )
                     return ranked[:limit]
         except Exception as e:
             logger.warning(f"Rerank failed: {e}")
         return candidates[:limit]
 
-    def search_memory(self, session_ids: list[int], query: str, limit: int = 5, document_id: Optional[int] = None, exclude_sources: Optional[list[str]] = None):
+    def search_memory(self, session_ids: list[int], query: str, limit: int = 5, document_id: Optional[int] = None, exclude_sources: Optional[list[str]] = None) -> list[RetrievedMemory]:
         """Retrieves relevant memories based on semantic similarity."""
+        with timing.span('search_memory', document_scoped=document_id is not None) as attrs:
+            results = self._search_memory(session_ids, query, limit, document_id, exclude_sources)
+            attrs.update(self._local.counts, results=len(results))
+        for stage, ms in self.last_search_timings.items():
+            if stage != 'total':
+                timing.record(f'search_memory.{stage}', ms)
+        return results
+
+    def _search_memory(self, session_ids: list[int], query: str, limit: int, document_id: Optional[int], exclude_sources: Optional[list[str]]) -> list[RetrievedMemory]:
         # Filter by sessions
         qs = ChatMemory.objects.filter(session_id__in=session_ids)
         if document_id is not None:
-            qs = qs.filter(metadata__document_id=document_id)
+            qs = qs.filter(document_id=document_id)
         if exclude_sources:
-            qs = qs.exclude(metadata__source__in=exclude_sources)
+            qs = qs.exclude(source__in=exclude_sources)
+
+        timings: dict[str, float] = {}
+        counts: dict[str, int] = {}
+        self._local.timings = timings
+        self._local.counts = counts
+        started = time.perf_counter()
 
         if not self.client:
-            results, _ = self._keyword_search(qs, query, limit)
+            results, _ = self._keyword_search(qs, query, limit, document_id=document_id, session_ids=session_ids,
+                                              exclude_sources=exclude_sources)
+            timings['keyword'] = timings['total'] = (time.perf_counter() - started) * 1000
             return results
 
         candidate_limit = max(limit * 4, 20)
-        embedding = self.embed_text(query)
+        rerank = self.rerank_enabled and (document_id is not None or self.rerank_all)
+        # The embedding HTTP call runs in the background while this thread does the
+        # DB work that does not depend on it (keyword search, exact-search pre-check).
+        embedding_future = self._submit_embedding(query, timings)
+
+        if self.hybrid_search_mode == 'sql' and connection.vendor == 'postgresql':
+            keyword_ids = None
+            if self._uses_ngram(self._tokenize_query(query), document_id, session_ids, exclude_sources):
+                # Postings lookups cannot be inlined; rank them (while the embedding
+                # is in flight) and hand the ids to the statement's keyword CTE
+                stage = time.perf_counter()
+                keyword_results, keyword_hit = self._keyword_search(
+                    qs, query, candidate_limit, document_id=document_id, session_ids=session_ids,
+                    exclude_sources=exclude_sources,
+                )
+                keyword_ids = [item.id for item in keyword_results] if keyword_hit else []
+                timings['keyword'] = (time.perf_counter() - stage) * 1000
+            # Same small-candidate-set rule (VECTOR_EXACT_SEARCH_THRESHOLD) as the python mode
+            stage = time.perf_counter()
+            exact = self._use_exact_search(qs)
+            timings['prefilter'] = (time.perf_counter() - stage) * 1000
+            embedding = embedding_future.result()
+            top_k = max(limit, self.rerank_max_candidates) if rerank else limit
+            stage = time.perf_counter()
+            merged = self._hybrid_search_sql(
+                qs, query, embedding, candidate_limit, top_k, exact=exact, keyword_ids=keyword_ids
+            )
+            timings['hybrid_sql'] = (time.perf_counter() - stage) * 1000
+            counts['exact_vector_search'] = int(exact)
+            counts['hybrid_candidates'] = len(merged)
+            if rerank:
+                stage = time.perf_counter()
+                merged = self._rerank(query, merged, limit, document_id=document_id)
+                timings['rerank'] = (time.perf_counter() - stage) * 1000
+            timings['total'] = (time.perf_counter() - started) * 1000
+            return merged[:limit]
+
+        stage = time.perf_counter()
+        keyword_results, keyword_hit = self._keyword_search(
+            qs, query, candidate_limit, document_id=document_id, session_ids=session_ids,
+            exclude_sources=exclude_sources,
+        )
+        timings['keyword'] = (time.perf_counter() - stage) * 1000
+        counts['keyword_candidates'] = len(keyword_results)
+        stage = time.perf_counter()
+        exact = self._use_exact_search(qs)
+        timings['prefilter'] = (time.perf_counter() - stage) * 1000
+
+        stage = time.perf_counter()
+        embedding = embedding_future.result()
+        timings['embed_wait'] = (time.perf_counter() - stage) * 1000
         # Order by Cosine Distance (smaller is closer)
-        keyword_results, keyword_hit = self._keyword_search(qs, query, candidate_limit)
-        vector_results = list(qs.order_by(CosineDistance('embedding', embedding))[:candidate_limit])
+        stage = time.perf_counter()
+        vector_results = self._vector_search(qs, embedding, candidate_limit, exact=exact)
+        timings['vector'] = (time.perf_counter() - stage) * 1000
+        counts['vector_candidates'] = len(vector_results)
+        counts['exact_vector_search'] = int(exact)
         if not vector_results:
+            timings['total'] = (time.perf_counter() - started) * 1000
             return keyword_results
 
         tokens = self._tokenize_query(query)
@@ -331,17 +990,34 @@ class ChatMemoryService:
                 )
                 if not has_critical:
                     if keyword_hit:
+                        timings['total'] = (time.perf_counter() - started) * 1000
                         return keyword_results[:limit]
             if best_score == 0:
                 if keyword_hit:
+                    timings['total'] = (time.perf_counter() - started) * 1000
                     return keyword_results[:limit]
 
+        stage = time.perf_counter()
         merged = self._rrf_merge(vector_results, keyword_results)
-        rerank_all = os.environ.get("RERANK_ALL", "0") == "1"
-        if self.rerank_enabled and (document_id is not None or rerank_all):
-            merged = self._rerank_with_llm(query, merged, limit)
+        timings['merge'] = (time.perf_counter() - stage) * 1000
+        if rerank:
+            stage = time.perf_counter()
+            merged = self._rerank(query, merged, limit, document_id=document_id)
+            timings['rerank'] = (time.perf_counter() - stage) * 1000
+        timings['total'] = (time.perf_counter() - started) * 1000
+        logger.debug(f"search_memory timings (ms): {timings}")
         return merged[:limit]
 
+    def invalidate_document_caches(self, document_id: int):
+        """Drops cached rerank orderings for a document whose memories were deleted."""
+        if self.rerank_cache:
+            self.rerank_cache.invalidate_document(document_id)
+
+    @property
+    def last_search_timings(self) -> dict[str, float]:
+        """Per-stage timings (ms) of the last search_memory call on this thread."""
+        return dict(getattr(self._local, 'timings', {}))
+
     def get_relevant_context(self, session_id: int, query: str, max_chars: int = 3000) -> str:
         """
         Retrieves relevant context for the given query within the character limit.
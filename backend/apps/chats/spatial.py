@@ -0,0 +1,46 @@
+"""
+Uniform-grid index over axis-aligned boxes for overlap queries.
+
+Boxes are [x0, y0, x1, y1] in page coordinates. Every box is registered in each grid
+cell it touches, so a query only looks at boxes that share a cell with it instead
+of every box on the page. The cell size follows the mean box extent, which keeps
+layouts made of many small blocks (tables, forms) close to one cell per box. It is
+bounded below so that one full-page block cannot span an unbounded number of cells.
+"""
+import math
+from collections import defaultdict
+from typing import Iterator, Optional, Sequence
+
+# At most this many cells along the longer side of the indexed area
+MAX_CELLS_PER_SIDE = 256
+
+
+class BoxGrid:
+    def __init__(self, boxes: Sequence[Sequence[float]], cell_size: Optional[float] = None):
+        self.boxes = [list(b) for b in boxes]
+        self.cells: dict[tuple[int, int], list[int]] = defaultdict(list)
+        if not self.boxes:
+            self.cell_size = 1.0
+            return
+        if cell_size is None:
+            mean_w = sum(b[2] - b[0] for b in self.boxes) / len(self.boxes)
+            mean_h = sum(b[3] - b[1] for b in self.boxes) / len(self.boxes)
+            extent = max(max(b[2] for b in self.boxes), max(b[3] for b in self.boxes))
+            cell_size = max(mean_w, mean_h, extent / MAX_CELLS_PER_SIDE, 1.0)
+        self.cell_size = cell_size
+        for index, box in enumerate(self.boxes):
+            for cell in self._cells(box):
+                self.cells[cell].append(index)
+
+    def _cells(self, box) -> Iterator[tuple[int, int]]:
+        size = self.cell_size
+        for cx in range(math.floor(box[0] / size), math.floor(box[2] / size) + 1):
+            for cy in range(math.floor(box[1] / size), math.floor(box[3] / size) + 1):
+                yield cx, cy
+
+    def candidates(self, box) -> list[int]:
+        """Indexes of boxes sharing a cell with `box`, in insertion order; a superset of the overlapping ones."""
+        found = set()
+        for cell in self._cells(box):
+            found.update(self.cells.get(cell, ()))
+        return sorted(found)
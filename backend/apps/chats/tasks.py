@@ -6,18 +6,19 @@ import shutil
 import subprocess
 import uuid
 import re
-import fitz  # PyMuPDF
+from datetime import timedelta
 from celery import shared_task
 from django.conf import settings
-from .models import Document, ChatMemory
-from .services import ChatMemoryService
-try:
-    from PIL import Image
-    import pytesseract
-except ImportError:
-    Image = None
-    pytesseract = None
-
+from django.db.models import Count
+from django.utils import timezone
+from .models import Document, ChatMemory, Session
+from .services import ChatMemoryService, memory_service
+from .indexing import index_queue
+from .compaction import MemoryCompactor
+from .deletion import BulkDeleter, claim_document_images
+from .extraction import PdfExtractor, dedupe_images, extract_pages, ocr_available
+from .spatial import BoxGrid
+from . import ngram, partitions
 try:
     from storage.s3 import minio_client
 except ImportError:
@@ -110,98 +111,17 @@ def extract_text_and_bbox_with_pymupdf(doc):
     Extracts text blocks with their bounding boxes and page numbers using PyMuPDF (fitz).
     Returns a list of dicts: {'text': str, 'bbox': list, 'page': int, 'source_type': 'parsed'}
     """
-    extracted_data = []
-    try:
-        for page_num, page in enumerate(doc):
-            page_width = float(page.rect.width)
-            page_height = float(page.rect.height)
-            # "blocks" -> (x0, y0, x1, y1, "lines", block_no, block_type)
-            # block_type=0 is text, block_type=1 is image
-            blocks = page.get_text("blocks")
-            for block in blocks:
-                if block[6] == 0:  # Text block
-                    text = block[4].strip()
-                    if not text:
-                        continue
-                        
-                    bbox = list(block[0:4]) # [x0, y0, x1, y1]
-                    extracted_data.append({
-                        'text': text,
-                        'bbox': bbox,
-                        'page': page_num + 1, # 1-indexed for user friendliness
-                        'source_type': 'parsed',
-                        'page_width': page_width,
-                        'page_height': page_height
-                    })
-    except Exception as e:
-        logger.error(f"PyMuPDF block extraction failed: {e}")
-    return extracted_data
+    return extract_pages(doc, 0, doc.page_count, ocr=False).parsed
 
 def extract_text_and_bbox_with_ocr(doc):
     """
     Extracts text blocks using OCR on page images.
     Returns a list of dicts: {'text': str, 'bbox': list, 'page': int, 'source_type': 'ocr'}
     """
-    extracted_data = []
-    if not pytesseract or not Image:
+    if not ocr_available():
         logger.warning("pytesseract or PIL not installed. Skipping OCR.")
-        return extracted_data
-
-    try:
-        for page_num, page in enumerate(doc):
-            page_width = float(page.rect.width)
-            page_height = float(page.rect.height)
-            pix = page.get_pixmap()
-            img_data = pix.tobytes("png")
-            image = Image.open(io.BytesIO(img_data))
-            
-            # Use image_to_data to get boxes
-            ocr_res = pytesseract.image_to_data(image, output_type=pytesseract.Output.DICT)
-            
-            n_boxes = len(ocr_res['text'])
-            
-            # Group by block_num
-            # block_num -> {'text': [], 'bboxes': []}
-            blocks = {} 
-            
-            for i in range(n_boxes):
-                if int(ocr_res['conf'][i]) < 30: # Low confidence filter
-                    continue
-                text = ocr_res['text'][i].strip()
-                if not text:
-                    continue
-                
-                block_num = ocr_res['block_num'][i]
-                x, y, w, h = ocr_res['left'][i], ocr_res['top'][i], ocr_res['width'][i], ocr_res['height'][i]
-                x0, y0, x1, y1 = x, y, x + w, y + h
-                
-                if block_num not in blocks:
-                    blocks[block_num] = {'text': [text], 'bbox': [x0, y0, x1, y1]}
-                else:
-                    blocks[block_num]['text'].append(text)
-                    # Expand bbox to cover all words in block
-                    b = blocks[block_num]['bbox']
-                    blocks[block_num]['bbox'] = [
-                        min(b[0], x0), min(b[1], y0),
-                        max(b[2], x1), max(b[3], y1)
-                    ]
-            
-            for b_id, content in blocks.items():
-                full_text = " ".join(content['text'])
-                if len(full_text) > 3: # Ignore tiny noise
-                    extracted_data.append({
-                        'text': full_text,
-                        'bbox': content['bbox'],
-                        'page': page_num + 1,
-                        'source_type': 'ocr',
-                        'page_width': page_width,
-                        'page_height': page_height
-                    })
-
-    except Exception as e:
-        logger.error(f"OCR extraction failed: {e}")
-    
-    return extracted_data
+        return []
+    return extract_pages(doc, 0, doc.page_count, ocr=True).ocr
 
 def merge_parsed_and_ocr(parsed_data, ocr_data):
     """
@@ -214,27 +134,23 @@ def merge_parsed_and_ocr(parsed_data, ocr_data):
         
     merged_data = list(parsed_data)
     
-    # Organize parsed data by page for faster lookup
+    # Organize parsed data by page into spatial indexes, so each OCR block is only
+    # compared with the parsed blocks near it
     parsed_by_page = {}
     for item in parsed_data:
-        p = item['page']
-        if p not in parsed_by_page:
-            parsed_by_page[p] = []
-        parsed_by_page[p].append(item)
+        parsed_by_page.setdefault(item['page'], []).append(item['bbox'])
+    grids = {page: BoxGrid(boxes) for page, boxes in parsed_by_page.items()}
     
     for ocr_item in ocr_data:
         page = ocr_item['page']
         ocr_bbox = ocr_item['bbox']
         
         is_duplicate = False
-        if page in parsed_by_page:
-            for parsed_item in parsed_by_page[page]:
-                # Check IoU or simple box overlap
-                parsed_bbox = parsed_item['bbox']
-                iou = get_bbox_iou(ocr_bbox, parsed_bbox)
-                
+        grid = grids.get(page)
+        if grid is not None:
+            for index in grid.candidates(ocr_bbox):
                 # If overlap is significant, assume it's covered by parsed text
-                if iou > 0.1:
+                if get_bbox_iou(ocr_bbox, grid.boxes[index]) > 0.1:
                     is_duplicate = True
                     break
         
@@ -332,63 +248,56 @@ def merge_text_chunks_by_page(chunks, max_chars: int = 450, overlap_chars: int =
 
     return merged
 
-def extract_images_from_pdf(doc, session_id):
+def image_key(session_id, sha256, ext):
+    """Content-addressed key: identical images of documents in one session share the object."""
+    return f"images/{session_id}/{sha256}.{ext}"
+
+def upload_extracted_images(images, session_id, document_id):
     """
-    Extracts embedded images from PDF pages and uploads to MinIO.
-    Returns list of dicts.
+    Uploads deduplicated images returned by the page extraction to MinIO, skipping
+    images the session already stores. Every image is claimed for the document first,
+    whether or not its OCR later yields a chunk, so deleting the document finds it.
+    Returns list of dicts with 'image_url' and 'image_key' in place of the image bytes.
     """
-    extracted_images = []
+    uploaded = []
     if not minio_client:
-        return extracted_images
-
-    for page_num, page in enumerate(doc):
+        return uploaded
+
+    claim_document_images(
+        document_id, session_id,
+        [(image_key(session_id, image['sha256'], image['ext']), image['sha256']) for image in images],
+    )
+    skipped = 0
+    for image in images:
+        filename = image_key(session_id, image['sha256'], image['ext'])
         try:
-            image_list = page.get_images(full=True)
-            page_width = float(page.rect.width)
-            page_height = float(page.rect.height)
-
-            for img_idx, img in enumerate(image_list):
-                xref = img[0]
-                try:
-                    base_image = doc.extract_image(xref)
-                    image_bytes = base_image["image"]
-                    image_ext = base_image["ext"]
-                    
-                    # Get location
-                    rects = page.get_image_rects(xref)
-                    if not rects:
-                        continue
-                    # Rect to list
-                    r = rects[0]
-                    bbox = [r.x0, r.y0, r.x1, r.y1]
-
-                    # Filter small icons/noise (e.g. < 50px)
-                    if (bbox[2] - bbox[0] < 50) or (bbox[3] - bbox[1] < 50):
-                        continue
-                    
-                    # Upload
-                    filename = f"images/{session_id}/{page_num+1}_{img_idx}.{image_ext}"
-                    file_obj = io.BytesIO(image_bytes)
-                    
-                    url = minio_client.upload_file(file_obj, filename, content_type=f"image/{image_ext}")
-                    
-                    extracted_images.append({
-                        'text': '', 
-                        'bbox': bbox,
-                        'page': page_num + 1,
-                        'source_type': 'image_ocr',
-                        'image_url': url,
-                        'page_width': page_width,
-                        'page_height': page_height,
-                        'is_image_ocr': True
-                    })
-                except Exception as e:
-                    logger.warning(f"Image extraction error on page {page_num}: {e}")
-                    continue
+            if minio_client.exists(filename):
+                url = minio_client.get_public_url(filename)
+                skipped += 1
+            else:
+                url = minio_client.upload_file(
+                    io.BytesIO(image['image_bytes']), filename, content_type=f"image/{image['ext']}"
+                )
         except Exception as e:
-             logger.error(f"Failed to get images from page {page_num}: {e}")
-
-    return extracted_images
+            logger.warning(f"Image upload error on page {image['page']}: {e}")
+            continue
+        chunk = {k: v for k, v in image.items() if k not in ('image_bytes', 'ext', 'index', 'xref')}
+        chunk['image_url'] = url
+        chunk['image_key'] = filename
+        uploaded.append(chunk)
+    if skipped:
+        logger.info(f"Reused {skipped} images already stored for session {session_id}")
+    return uploaded
+
+def extract_images_from_pdf(doc, session_id, document_id):
+    """
+    Extracts embedded images from PDF pages and uploads to MinIO.
+    Returns list of dicts.
+    """
+    if not minio_client:
+        return []
+    images = extract_pages(doc, 0, doc.page_count, ocr=False).images
+    return upload_extracted_images(dedupe_images(images), session_id, document_id)
 
 @shared_task(bind=True, max_retries=3)
 def process_pdf_document(self, document_id):
@@ -430,29 +339,32 @@ def process_pdf_document(self, document_id):
             pdf_path = converted_pdf_path
 
         # 2. Extract & Merge
-        # We need to open the PDF file with fitz
-        pdf_doc = fitz.open(pdf_path)
-        
+        # Text layer, embedded images and Tesseract OCR, page ranges in parallel
         logger.info(f"Starting extraction for doc {document_id}")
+        pages = PdfExtractor().extract(pdf_path)
 
         # A. Parse Text + BBox
-        parsed_chunks = extract_text_and_bbox_with_pymupdf(pdf_doc)
+        parsed_chunks = pages.parsed
         logger.info(f"Parsed {len(parsed_chunks)} text blocks.")
         
         # A-2. Extract Images & OCR
-        image_chunks = extract_images_from_pdf(pdf_doc, doc_record.session_id)
-        logger.info(f"Extracted {len(image_chunks)} images.")
+        unique_images = dedupe_images(pages.images)
+        image_chunks = upload_extracted_images(unique_images, doc_record.session_id, doc_record.id)
+        logger.info(f"Extracted {len(image_chunks)} distinct images ({len(pages.images)} placements).")
         
         chat_service = ChatMemoryService()
         valid_image_chunks = []
-        for img in image_chunks:
-            # Call Fal.ai OCR
-            if img.get('image_url'):
-                extracted_text = chat_service.ocr_image_with_fal(img['image_url'])
-                if extracted_text and len(extracted_text.strip()) > 5:
-                    img['text'] = extracted_text.strip()
-                    img['source_type'] = 'image_ocr' # ensure type
-                    valid_image_chunks.append(img)
+        # Call Fal.ai OCR, several images at a time
+        ocr_targets = [img for img in image_chunks if img.get('image_url')]
+        ocr_texts = chat_service.ocr_images_with_fal(
+            [img['image_url'] for img in ocr_targets],
+            content_hashes=[img['sha256'] for img in ocr_targets],
+        )
+        for img, extracted_text in zip(ocr_targets, ocr_texts):
+            if extracted_text and len(extracted_text.strip()) > 5:
+                img['text'] = extracted_text.strip()
+                img['source_type'] = 'image_ocr' # ensure type
+                valid_image_chunks.append(img)
         
         
         logger.info(f"OCR processed {len(valid_image_chunks)} images with text.")
@@ -460,7 +372,7 @@ def process_pdf_document(self, document_id):
         # parsed_chunks.extend(valid_image_chunks) 
         
         # B. OCR Text + BBox
-        ocr_chunks = extract_text_and_bbox_with_ocr(pdf_doc)
+        ocr_chunks = pages.ocr
         logger.info(f"OCR extracted {len(ocr_chunks)} blocks.")
         
         # C. Merge
@@ -481,7 +393,8 @@ def process_pdf_document(self, document_id):
 
         # 3. Indexing
         service = ChatMemoryService()
-        
+        items = []
+
         for i, chunk in enumerate(final_chunks):
             content_text = chunk['text']
             page_width = chunk.get('page_width') or 1.0
@@ -506,14 +419,20 @@ def process_pdf_document(self, document_id):
                 'page_height': page_height,
                 'source_type': chunk.get('source_type', 'unknown'),
                 'image_url': chunk.get('image_url'),
-                'is_image_ocr': chunk.get('is_image_ocr', False)
+                'is_image_ocr': chunk.get('is_image_ocr', False),
+                # Whether Tesseract ran on this page, and the layout numbers behind it
+                'ocr_decision': pages.ocr_decisions.get(chunk['page']),
             }
-            
-            service.add_memory(
-                session_id=doc_record.session_id,
-                content=content_text,
-                metadata=meta
-            )
+            if chunk.get('image_key'):
+                meta['image_key'] = chunk['image_key']
+                meta['image_sha256'] = chunk['sha256']
+                # Every page a deduplicated image appears on
+                meta['image_pages'] = chunk['pages']
+            items.append((content_text, meta))
+
+        memories = service.add_memories_bulk(doc_record.session_id, items)
+        postings = ngram.build_document_postings(doc_record.id, memories)
+        logger.info(f"Indexed {len(memories)} chunks ({postings} bigram postings) for doc {document_id}")
             
         doc_record.status = Document.STATUS_COMPLETED
         doc_record.save()
@@ -529,22 +448,113 @@ def process_pdf_document(self, document_id):
         except:
             pass
     finally:
-        try:
-            if 'pdf_doc' in locals():
-                pdf_doc.close()
-        except Exception:
-            pass
         if converted_dir and os.path.isdir(converted_dir):
             shutil.rmtree(converted_dir, ignore_errors=True)
         if tmp_path and os.path.exists(tmp_path):
-            try:
-                # PDF might be open by fitz, close it explicitly if referenced, 
-                # but 'pdf_doc' is local. fitz usually doesn't lock heavily on linux but on windows might.
-                # pdf_doc.close() should be called if we persist the object
-                pass
-            except:
-                pass
             try:
                 os.unlink(tmp_path)
             except Exception as e:
                  logger.warning(f"Failed to delete temp file {tmp_path}: {e}")
+
+
+@shared_task
+def drain_index_queue():
+    """
+    Indexes the records queued by indexing.index_memory in micro-batches: one
+    batched embeddings call and one bulk insert per batch, across sessions.
+    """
+    # Release first so records pushed while this run is busy schedule the next one.
+    index_queue.release()
+    if not index_queue.acquire():
+        # The running drain reschedules on exit if records are left
+        return {'indexed': 0, 'skipped': True}
+    indexed = 0
+    retry_delay = None
+    try:
+        while True:
+            records = index_queue.pop_batch()
+            if not records:
+                index_queue.ack()
+                break
+            try:
+                # Sessions deleted while their records were queued are skipped.
+                live = set(Session.objects.filter(
+                    id__in={session_id for session_id, _, _ in records}
+                ).values_list('id', flat=True))
+                records = [record for record in records if record[0] in live]
+                # Strict: a provider error must requeue the batch, not index zero vectors
+                indexed += len(memory_service.add_memory_records(records, strict=True))
+            except Exception as e:
+                logger.warning(f"Index queue batch of {len(records)} failed, requeueing: {e}")
+                index_queue.requeue()
+                retry_delay = index_queue.retry_delay
+                return {'indexed': indexed, 'requeued': len(records)}
+            index_queue.ack()
+    finally:
+        index_queue.release_drain(countdown=retry_delay)
+    return {'indexed': indexed}
+
+
+@shared_task
+def compact_session_memories(session_id: int):
+    return MemoryCompactor().compact_session(session_id)
+
+
+@shared_task
+def compact_chat_memories():
+    """Periodic sweep: queues compaction for sessions whose chat history outgrew the keep window."""
+    compactor = MemoryCompactor()
+    threshold = compactor.keep_recent + compactor.group_size
+    session_ids = list(
+        ChatMemory.objects.filter(source='', document__isnull=True)
+        .values('session_id')
+        .annotate(n=Count('id'))
+        .filter(n__gt=threshold)
+        .values_list('session_id', flat=True)
+    )
+    for session_id in session_ids:
+        compact_session_memories.delay(session_id)
+    return {'sessions': len(session_ids)}
+
+
+@shared_task
+def maintain_partitions():
+    """Creates the coming months' partitions and drops partitions past their retention."""
+    return partitions.maintain()
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def delete_session_data(self, session_id: int):
+    """Removes a session marked as deleted, with its memories and stored files."""
+    try:
+        return BulkDeleter().delete_session(session_id)
+    except Exception as e:
+        logger.warning(f"Deleting session {session_id} failed, retrying: {e}")
+        raise self.retry(exc=e)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def delete_document_data(self, document_id: int):
+    """Removes a document marked as deleted, with its memories and stored files."""
+    try:
+        return BulkDeleter().delete_document(document_id)
+    except Exception as e:
+        logger.warning(f"Deleting document {document_id} failed, retrying: {e}")
+        raise self.retry(exc=e)
+
+
+@shared_task
+def purge_deleted_records():
+    """Periodic sweep: re-queues deletions whose task was lost or ran out of retries."""
+    cutoff = timezone.now() - timedelta(seconds=int(os.environ.get("DELETE_SWEEP_AFTER_SECONDS", "3600")))
+    session_ids = list(Session.all_objects.filter(deleted_at__lt=cutoff).values_list('id', flat=True))
+    document_ids = list(
+        Document.all_objects.filter(deleted_at__lt=cutoff)
+        .exclude(session_id__in=session_ids)
+        .values_list('id', flat=True)
+    )
+    for session_id in session_ids:
+        delete_session_data.delay(session_id)
+    for document_id in document_ids:
+        delete_document_data.delay(document_id)
+    return {'sessions': len(session_ids), 'documents': len(document_ids)}
@@ -0,0 +1,163 @@
+"""
+Named timing spans for the chat/image hot path.
+
+A Celery task opens a trace(); span() blocks inside it (search_memory, rerank, fal
+calls, ...) record their duration plus attributes such as candidate counts, and
+incr() counts cache hits; outside a trace both are no-ops. When the trace closes,
+the caller saves it on the Job row and its spans are observed into Prometheus-style
+histograms. The histograms live in Redis because spans are produced in worker
+processes and scraped from the web process; render_prometheus() produces the text
+exposition format for /metrics.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from .cache import RedisConnection
+
+# Upper bounds in seconds, as in the Prometheus client defaults plus long LLM calls
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_current_trace: ContextVar[Optional['Trace']] = ContextVar('timing_trace', default=None)
+
+
+class Trace:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: list[dict] = []
+        self.counters: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, ms: float, **attrs):
+        with self._lock:
+            self.spans.append({'name': name, 'ms': round(ms, 2), **attrs})
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def as_dict(self) -> dict:
+        return {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 2),
+            'spans': list(self.spans),
+            'counters': dict(self.counters),
+        }
+
+
+class SpanHistograms:
+    """Per-span duration histograms and counters aggregated in Redis hashes."""
+
+    names_key = 'metrics:span_names'
+    counters_key = 'metrics:counters'
+
+    def __init__(self, redis_connection: Optional[RedisConnection] = None):
+        self.redis = redis_connection or RedisConnection()
+
+    def _key(self, name: str) -> str:
+        return f'metrics:span:{name}'
+
+    def observe(self, durations: list[tuple[str, float]], counters: Optional[dict[str, int]] = None):
+        """Records (span name, milliseconds) observations in one round trip."""
+        client = self.redis.get()
+        if client is None or not (durations or counters):
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for name, ms in durations:
+                seconds = ms / 1000
+                bucket = next((str(b) for b in BUCKETS if seconds <= b), '+Inf')
+                key = self._key(name)
+                pipe.sadd(self.names_key, name)
+                pipe.hincrby(key, bucket, 1)
+                pipe.hincrby(key, 'count', 1)
+                pipe.hincrbyfloat(key, 'sum', seconds)
+            for name, amount in (counters or {}).items():
+                pipe.hincrby(self.counters_key, name, amount)
+            pipe.execute()
+        except Exception as e:
+            self.redis.mark_down(e)
+
+    def render_prometheus(self) -> str:
+        client = self.redis.get()
+        if client is None:
+            return ''
+        try:
+            names = sorted(n.decode() for n in client.smembers(self.names_key))
+            pipe = client.pipeline(transaction=False)
+            for name in names:
+                pipe.hgetall(self._key(name))
+            pipe.hgetall(self.counters_key)
+            *histograms, counters = pipe.execute()
+        except Exception as e:
+            self.redis.mark_down(e)
+            return ''
+
+        lines = [
+            '# HELP span_duration_seconds Duration of named retrieval/generation spans.',
+            '# TYPE span_duration_seconds histogram',
+        ]
+        for name, raw in zip(names, histograms):
+            values = {k.decode(): v.decode() for k, v in raw.items()}
+            cumulative = 0
+            for bound in BUCKETS:
+                cumulative += int(values.get(str(bound), 0))
+                lines.append(f'span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            cumulative += int(values.get('+Inf', 0))
+            lines.append(f'span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {cumulative}')
+            lines.append(f'span_duration_seconds_sum{{span="{name}"}} {float(values.get("sum", 0))}')
+            lines.append(f'span_duration_seconds_count{{span="{name}"}} {int(values.get("count", 0))}')
+        lines += [
+            '# HELP span_events_total Cache hits and other events counted inside spans.',
+            '# TYPE span_events_total counter',
+        ]
+        for name, value in sorted((k.decode(), int(v)) for k, v in counters.items()):
+            lines.append(f'span_events_total{{event="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+histograms = SpanHistograms()
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def trace():
+    """Collects spans recorded in this context; observes them into the histograms on exit."""
+    active = Trace()
+    token = _current_trace.set(active)
+    try:
+        yield active
+    finally:
+        _current_trace.reset(token)
+        histograms.observe([(s['name'], s['ms']) for s in active.spans], active.counters)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """
+    Times the block and stores it on the current trace; a no-op outside a trace.
+    The yielded dict can be filled with attributes (candidate counts, cache hits)
+    that are stored with the span.
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record(name, (time.perf_counter() - started) * 1000, **attrs)
+
+
+def record(name: str, ms: float, **attrs):
+    """Adds an already measured span to the current trace."""
+    active = _current_trace.get()
+    if active is not None:
+        active.add(name, ms, **attrs)
+
+
+def incr(name: str, amount: int = 1):
+    active = _current_trace.get()
+    if active is not None:
+        active.incr(name, amount)
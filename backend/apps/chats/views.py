@@ -6,10 +6,11 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.http import HttpResponse
+from django.utils import timezone
 
-from .models import Session, Message, ImageRecord, Document, ChatMemory, SESSION_KIND_CHAT, SESSION_KIND_IMAGE, SESSION_KIND_STUDIO
+from .models import Session, Message, ImageRecord, Document, SESSION_KIND_CHAT, SESSION_KIND_IMAGE, SESSION_KIND_STUDIO
 from .serializers import SessionListSerializer, SessionDetailSerializer, MessageSerializer, ImageRecordSerializer, DocumentSerializer
-from .tasks import process_pdf_document
+from .tasks import process_pdf_document, delete_session_data, delete_document_data
 
 try:
     from storage.s3 import minio_client
@@ -65,7 +66,10 @@ def session_detail(request, session_id):
             session.save(update_fields=['title', 'updated_at'])
         return Response(SessionListSerializer(session).data)
     if request.method == 'DELETE':
-        session.delete()
+        # Hidden right away; memories, messages and stored files are removed by the worker
+        session.deleted_at = timezone.now()
+        session.save(update_fields=['deleted_at'])
+        delete_session_data.delay(session.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
     return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
@@ -227,22 +231,8 @@ def session_document_delete(request, session_id, document_id):
     except Document.DoesNotExist:
         return Response({'detail': 'Not found'}, status=status.HTTP_404_NOT_FOUND)
 
-    # Delete stored files
-    if minio_client:
-        keys = {doc.file_name}
-        if doc.pdf_file_name:
-            keys.add(doc.pdf_file_name)
-        for key in keys:
-            try:
-                minio_client.delete_file(key)
-            except Exception:
-                logger.warning(f"Failed to delete file key from MinIO: {key}")
-
-    # Remove related vector memory
-    try:
-        ChatMemory.objects.filter(session_id=session_id, metadata__document_id=document_id).delete()
-    except Exception as e:
-        logger.warning(f"Failed to delete memories for doc {document_id}: {e}")
-
-    doc.delete()
+    # Hidden right away; memories, postings and stored files are removed by the worker
+    doc.deleted_at = timezone.now()
+    doc.save(update_fields=['deleted_at'])
+    delete_document_data.delay(doc.id)
     return Response(status=status.HTTP_204_NO_CONTENT)
@@ -3,6 +3,7 @@ from . import views
 
 urlpatterns = [
     path('health/', views.health),
+    path('metrics/', views.metrics),
     path('studio/trending/', views.youtube_trending),
     path('studio/llm/', views.studio_llm),
     path('studio/image/', views.studio_image),
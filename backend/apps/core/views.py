@@ -1,7 +1,8 @@
+import hmac
 import json
 import logging
 
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.http import require_GET, require_http_methods
 from django.views.decorators.csrf import csrf_exempt
 from decouple import config
@@ -13,6 +14,24 @@ def health(request):
     return JsonResponse({'status': 'ok'})
 
 
+@require_GET
+def metrics(request):
+    """
+    Prometheus text exposition of the timing span histograms recorded by the workers.
+    Disabled (404) unless METRICS_TOKEN is set; the scraper sends it as a bearer token.
+    The api port is published by compose, so the nginx deny alone does not protect it.
+    """
+    from apps.chats.timing import histograms
+
+    token = config('METRICS_TOKEN', default='')
+    if not token:
+        return HttpResponse(status=404)
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=403)
+
+    return HttpResponse(histograms.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 # YouTube categoryId: 인기=브이로그·엔터·하우투·코미디·음악, 틈새=교육·과학·게임
 TREND_CATEGORY_MAINSTREAM = ('22', '24', '26', '23', '10')  # People, Entertainment, Howto, Comedy, Music
 TREND_CATEGORY_NICHE = ('27', '28', '20')  # Education, Science/Tech, Gaming
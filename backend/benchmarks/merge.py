@@ -0,0 +1,99 @@
+"""
+Micro-benchmark of merge_parsed_and_ocr on synthetic dense pages.
+
+Each page is a table of rows x cols parsed cells. The OCR side holds one jittered
+copy of every cell, which must be recognized as a duplicate, plus a unique block per
+row in the page margin, which must be kept. The indexed merge is timed against
+naive_merge, the previous all-pairs comparison, and both outputs are checked to be
+identical. No database needed.
+"""
+import logging
+import math
+import random
+import time
+
+from apps.chats.tasks import get_bbox_iou, merge_parsed_and_ocr
+
+from .metrics import percentile
+
+PAGE_WIDTH = 595.0
+PAGE_HEIGHT = 842.0
+
+
+def naive_merge(parsed_data, ocr_data):
+    """The O(n*m) per-page merge that merge_parsed_and_ocr replaced."""
+    if not ocr_data:
+        return parsed_data
+    merged_data = list(parsed_data)
+    parsed_by_page = {}
+    for item in parsed_data:
+        parsed_by_page.setdefault(item['page'], []).append(item)
+    for ocr_item in ocr_data:
+        if not any(get_bbox_iou(ocr_item['bbox'], p['bbox']) > 0.1 for p in parsed_by_page.get(ocr_item['page'], [])):
+            merged_data.append(ocr_item)
+    merged_data.sort(key=lambda x: (x['page'], x['bbox'][1]))
+    return merged_data
+
+
+def dense_page(blocks: int, page: int = 1, seed: int = 0) -> tuple[list[dict], list[dict]]:
+    """(parsed, ocr) blocks for a table page with about `blocks` cells."""
+    rng = random.Random(seed)
+    cols = max(1, round(math.sqrt(blocks * PAGE_WIDTH / PAGE_HEIGHT)))
+    rows = max(1, math.ceil(blocks / cols))
+    # The right 10% of the page is left free for the OCR-only margin notes
+    cell_w = PAGE_WIDTH * 0.9 / cols
+    cell_h = PAGE_HEIGHT / rows
+    parsed, ocr = [], []
+    for r in range(rows):
+        for c in range(cols):
+            if len(parsed) == blocks:
+                break
+            box = [c * cell_w + 1, r * cell_h + 1, (c + 1) * cell_w - 1, (r + 1) * cell_h - 1]
+            parsed.append({'text': f'cell {r}.{c}', 'bbox': box, 'page': page, 'source_type': 'parsed'})
+            jitter = [rng.uniform(-0.5, 0.5) for _ in range(4)]
+            ocr.append({
+                'text': f'cell {r}.{c}',
+                'bbox': [v + d for v, d in zip(box, jitter)],
+                'page': page,
+                'source_type': 'ocr',
+            })
+        margin = [PAGE_WIDTH * 0.9 + 2, r * cell_h + 1, PAGE_WIDTH - 2, (r + 1) * cell_h - 1]
+        ocr.append({'text': f'note {r}', 'bbox': margin, 'page': page, 'source_type': 'ocr'})
+    return parsed, ocr
+
+
+def _time(fn, parsed, ocr, repeat: int) -> tuple[list[float], list[dict]]:
+    timings, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(parsed, ocr)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings, result
+
+
+def run(sizes: list[int], repeat: int = 5, naive_limit: int = 5000) -> dict:
+    """Blocks per page -> p50 latencies (ms) of both merges; naive is skipped above naive_limit."""
+    report = {'repeat': repeat, 'sizes': {}}
+    # merge_parsed_and_ocr logs every unique OCR block
+    tasks_logger = logging.getLogger('apps.chats.tasks')
+    level = tasks_logger.level
+    tasks_logger.setLevel(logging.WARNING)
+    try:
+        for size in sorted(sizes):
+            parsed, ocr = dense_page(size)
+            indexed_ms, indexed = _time(merge_parsed_and_ocr, parsed, ocr, repeat)
+            result = {
+                'parsed_blocks': len(parsed),
+                'ocr_blocks': len(ocr),
+                'kept_ocr_blocks': len(indexed) - len(parsed),
+                'indexed_p50_ms': round(percentile(indexed_ms, 50), 3),
+            }
+            if size <= naive_limit:
+                naive_ms, naive = _time(naive_merge, parsed, ocr, repeat)
+                result['naive_p50_ms'] = round(percentile(naive_ms, 50), 3)
+                result['speedup'] = round(result['naive_p50_ms'] / max(result['indexed_p50_ms'], 1e-6), 1)
+                result['same_output'] = naive == indexed
+            report['sizes'][str(size)] = result
+    finally:
+        tasks_logger.setLevel(level)
+    return report
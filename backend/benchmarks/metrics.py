@@ -0,0 +1,34 @@
+"""Ranking metrics and fixture loading shared by the retrieval benchmarks."""
+import json
+import math
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+
+def load_corpus(name: str = 'retrieval_corpus.json') -> dict:
+    with open(FIXTURES_DIR / name, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def recall_at_k(ranked_ids: list[int], relevant: list[int], k: int) -> float:
+    if not relevant:
+        return 0.0
+    return len(set(ranked_ids[:k]) & set(relevant)) / len(relevant)
+
+
+def reciprocal_rank(ranked_ids: list[int], relevant: list[int]) -> float:
+    relevant_set = set(relevant)
+    for rank, memory_id in enumerate(ranked_ids, start=1):
+        if memory_id in relevant_set:
+            return 1.0 / rank
+    return 0.0
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
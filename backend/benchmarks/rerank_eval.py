@@ -0,0 +1,81 @@
+"""
+Recall comparison of rerank backends on the fixture corpus.
+Each query's candidates come from the same first stage search_memory runs: bigram
+BM25 over the passages (apps.chats.ngram) fused by RRF with vector search, here
+over HashingEmbedder vectors. The top `depth` candidates are then reranked by every
+backend, and 'none' reports the first-stage order itself.
+"""
+import time
+from collections import defaultdict
+
+from apps.chats.ngram import char_bigrams, score_postings
+from apps.chats.services import ChatMemoryService, RetrievedMemory
+
+from .metrics import load_corpus, recall_at_k, reciprocal_rank
+from .retrieval import HashingEmbedder
+
+
+class FirstStage:
+    """In-memory hybrid keyword + vector candidate search over the fixture passages."""
+
+    def __init__(self, service: ChatMemoryService, passages: list[dict], candidate_limit: int = 20):
+        self.service = service
+        self.passages = {p['id']: p for p in passages}
+        self.candidate_limit = candidate_limit
+        self.postings: dict[str, tuple[list[int], list[int]]] = defaultdict(lambda: ([], []))
+        for p in passages:
+            for gram, tf in char_bigrams(p['text']).items():
+                ids, tfs = self.postings[gram]
+                ids.append(p['id'])
+                tfs.append(tf)
+        self.postings = dict(self.postings)
+        self.embedder = HashingEmbedder()
+        self.vectors = {p['id']: self.embedder.embed(p['text']) for p in passages}
+
+    def _item(self, pid: int) -> RetrievedMemory:
+        p = self.passages[pid]
+        return RetrievedMemory(pid, p['text'], {'page': p['page']}, p['page'])
+
+    def search(self, query: str, depth: int) -> list[RetrievedMemory]:
+        token_grams = [list(char_bigrams(token)) for token in self.service._tokenize_query(query)]
+        scores = score_postings(self.postings, [g for g in token_grams if g], len(self.passages))
+        keyword = sorted(scores, key=lambda pid: (-scores[pid], pid))[:self.candidate_limit]
+        query_vector = self.embedder.embed(query)
+        similarity = {
+            pid: sum(a * b for a, b in zip(query_vector, vector)) for pid, vector in self.vectors.items()
+        }
+        vector = sorted(similarity, key=lambda pid: (-similarity[pid], pid))[:self.candidate_limit]
+        merged = self.service._rrf_merge([self._item(pid) for pid in vector], [self._item(pid) for pid in keyword])
+        return merged[:depth]
+
+
+def evaluate(service: ChatMemoryService, backends: list[str], k: int = 3, depth: int = 12) -> dict:
+    corpus = load_corpus()
+    first_stage = FirstStage(service, corpus['passages'])
+    candidates = {q['query']: first_stage.search(q['query'], depth) for q in corpus['queries']}
+    rerank_fns = {
+        'none': lambda query, items, limit: items[:limit],
+        'local': service._rerank_local,
+        'llm': service._rerank_with_llm,
+    }
+    report = {}
+    for backend in backends:
+        rerank = rerank_fns[backend]
+        recalls, rrs, latencies = [], [], []
+        for q in corpus['queries']:
+            items = list(candidates[q['query']])
+            started = time.perf_counter()
+            ranked = rerank(q['query'], items, len(items))
+            latencies.append((time.perf_counter() - started) * 1000)
+            ranked_ids = [item.id for item in ranked]
+            recalls.append(recall_at_k(ranked_ids, q['relevant'], k))
+            rrs.append(reciprocal_rank(ranked_ids, q['relevant']))
+        n = len(corpus['queries'])
+        report[backend] = {
+            f'recall@{k}': sum(recalls) / n,
+            'mrr': sum(rrs) / n,
+            'mean_latency_ms': sum(latencies) / n,
+            'queries': n,
+            'depth': depth,
+        }
+    return report
@@ -0,0 +1,191 @@
+"""
+End-to-end benchmark of ChatMemoryService.search_memory.
+
+The fixture passages are loaded into a dedicated benchmark session, padded with
+deterministic Korean/English filler chunks up to each requested corpus size, and
+every labeled query is run through search_memory. Embeddings come from
+HashingEmbedder, an offline stub (signed feature hashing of words and character
+bigrams), so runs need no provider key and are reproducible. Recall and MRR are
+scored against the fixture labels; per-stage latencies are taken from
+last_search_timings.
+Needs PostgreSQL with pgvector.
+"""
+import hashlib
+import math
+import random
+import re
+import time
+
+from apps.chats.models import SESSION_KIND_CHAT, ChatMemory, Session
+from apps.chats.rerank import LexicalReranker
+from apps.chats.services import ChatMemoryService
+
+from .metrics import load_corpus, percentile, recall_at_k, reciprocal_rank
+
+DIMENSIONS = 1536
+BENCHMARK_SESSION_TITLE = '__retrieval_benchmark__'
+
+_WORD_RE = re.compile(r"[0-9a-z가-힣]+")
+
+FILLER_VOCABULARY = [
+    '사업', '지원', '신청', '접수', '공고', '평가', '선정', '협약', '기관', '예산', '보고서', '제출',
+    '서류', '대상', '기업', '교육', '운영', '계획', '결과', '관리', '변경', '환수', '정산', '회의',
+    '담당자', '일정', '안내', '문의', '시스템', '등록', '확인', '증빙', '위탁', '성과', '점검', '분기',
+    'project', 'budget', 'report', 'review', 'schedule', 'office', 'policy', 'support', 'program',
+    'deadline', 'contract', 'team', 'meeting', 'quarter', 'update', 'service', 'account', 'data',
+]
+
+
+class HashingEmbedder:
+    """Deterministic, L2-normalized bag-of-features embedding."""
+
+    def __init__(self, dimensions: int = DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _features(self, text: str) -> list[str]:
+        words = _WORD_RE.findall((text or '').lower())
+        features = [f'w:{w}' for w in words]
+        for word in words:
+            features += [f'g:{word[i:i + 2]}' for i in range(len(word) - 1)]
+        return features
+
+    def embed(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+        for feature in self._features(text):
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector))
+        if not norm:
+            vector[0] = 1.0
+            return vector
+        return [v / norm for v in vector]
+
+
+class BenchmarkMemoryService(ChatMemoryService):
+    """ChatMemoryService with the provider replaced by HashingEmbedder."""
+
+    def __init__(self, embedder: HashingEmbedder, rerank: bool = False):
+        super().__init__()
+        self.embedder = embedder
+        # search_memory only takes the vector path when a client is configured
+        self.client = object()
+        self.embedding_cache = None
+        self.embedding_coalescer = None
+        # The LLM reranker needs the provider, so only the local one is benchmarked
+        self.rerank_enabled = rerank
+        self.local_reranker = LexicalReranker() if rerank else None
+        # The benchmark queries the whole session, which is only reranked with rerank_all
+        self.rerank_all = rerank
+
+    def _request_embeddings(self, texts: list[str]) -> list[list[float]]:
+        return [self.embedder.embed(text) for text in texts]
+
+
+def filler_chunks(start: int, count: int, seed: int = 0):
+    """Yields (index, text) for filler chunks; chunk i is the same in every run."""
+    for index in range(start, start + count):
+        rng = random.Random(seed * 1_000_003 + index)
+        words = rng.choices(FILLER_VOCABULARY, k=rng.randint(25, 60))
+        yield index, f"[문서 {index // 40 + 1}] " + ' '.join(words)
+
+
+class RetrievalBenchmark:
+    def __init__(self, rerank: bool = False, k: int = 5, repeat: int = 3, batch_size: int = 2000, seed: int = 0):
+        self.corpus = load_corpus()
+        self.embedder = HashingEmbedder()
+        self.service = BenchmarkMemoryService(self.embedder, rerank=rerank)
+        self.k = k
+        self.repeat = repeat
+        self.batch_size = batch_size
+        self.seed = seed
+        self.session = None
+        self.passage_ids: dict[int, int] = {}
+        self.filler_count = 0
+
+    def setup(self):
+        Session.objects.filter(title=BENCHMARK_SESSION_TITLE).delete()
+        self.session = Session.objects.create(kind=SESSION_KIND_CHAT, title=BENCHMARK_SESSION_TITLE)
+        memories = ChatMemory.objects.bulk_create([
+            ChatMemory(
+                session=self.session,
+                content=p['text'],
+                embedding=self.embedder.embed(p['text']),
+                metadata={'source': 'pdf', 'page': p['page'], 'benchmark_passage_id': p['id']},
+                source='pdf',
+                page=p['page'],
+            )
+            for p in self.corpus['passages']
+        ])
+        self.passage_ids = {m.metadata['benchmark_passage_id']: m.id for m in memories}
+
+    def grow_to(self, size: int):
+        """Adds filler chunks until the session holds `size` rows."""
+        missing = size - len(self.passage_ids) - self.filler_count
+        while missing > 0:
+            count = min(missing, self.batch_size)
+            ChatMemory.objects.bulk_create([
+                ChatMemory(
+                    session=self.session,
+                    content=text,
+                    embedding=self.embedder.embed(text),
+                    metadata={'source': 'benchmark_filler'},
+                    source='benchmark_filler',
+                )
+                for _, text in filler_chunks(self.filler_count, count, self.seed)
+            ])
+            self.filler_count += count
+            missing -= count
+
+    def run_queries(self) -> dict:
+        memory_to_passage = {memory_id: pid for pid, memory_id in self.passage_ids.items()}
+        recalls, rrs = [], []
+        stages: dict[str, list[float]] = {}
+        for q in self.corpus['queries']:
+            for attempt in range(self.repeat):
+                results = self.service.search_memory([self.session.id], q['query'], limit=self.k)
+                for stage, ms in self.service.last_search_timings.items():
+                    stages.setdefault(stage, []).append(ms)
+                if attempt == 0:
+                    ranked = [memory_to_passage.get(r.id, -r.id) for r in results]
+                    recalls.append(recall_at_k(ranked, q['relevant'], self.k))
+                    rrs.append(reciprocal_rank(ranked, q['relevant']))
+        n = len(self.corpus['queries'])
+        return {
+            f'recall@{self.k}': sum(recalls) / n,
+            'mrr': sum(rrs) / n,
+            'latency_ms': {
+                stage: {'p50': percentile(values, 50), 'p95': percentile(values, 95), 'samples': len(values)}
+                for stage, values in sorted(stages.items())
+            },
+        }
+
+    def teardown(self):
+        if self.session is not None:
+            self.session.delete()
+
+    def run(self, sizes: list[int], keep: bool = False) -> dict:
+        report = {
+            'k': self.k,
+            'repeat': self.repeat,
+            'queries': len(self.corpus['queries']),
+            'rerank': 'local' if self.service.rerank_enabled else 'none',
+            'hybrid_search_mode': self.service.hybrid_search_mode,
+            'vector_search_mode': self.service.vector_search_mode,
+            'sizes': {},
+        }
+        try:
+            self.setup()
+            for size in sorted(sizes):
+                started = time.perf_counter()
+                self.grow_to(size)
+                load_seconds = time.perf_counter() - started
+                # Warm up connections and caches before timing
+                self.service.search_memory([self.session.id], self.corpus['queries'][0]['query'], limit=self.k)
+                result = self.run_queries()
+                result['load_seconds'] = load_seconds
+                report['sizes'][str(size)] = result
+        finally:
+            if not keep:
+                self.teardown()
+        return report
@@ -0,0 +1,88 @@
+"""
+Recall/latency comparison of the vector search modes on stored embeddings.
+Sampled chunk embeddings serve as queries; the exact full-dimension top-k of each
+(sequential scan, no index) is the ground truth the approximate modes are scored against.
+Needs PostgreSQL with pgvector and some indexed ChatMemory rows.
+storage() reports the on-disk size of the table and of each vector index, summed
+over all partitions.
+"""
+import random
+import time
+
+from django.db import connection
+
+from apps.chats.models import SHORT_VECTOR_DIMENSIONS, ChatMemory
+from apps.chats.services import ChatMemoryService
+
+from .metrics import percentile, recall_at_k
+
+
+def _modes() -> list[tuple[str, str, int]]:
+    modes = [(f'matryoshka{dims}', 'matryoshka', dims) for dims in SHORT_VECTOR_DIMENSIONS]
+    return modes + [('binary', 'binary', SHORT_VECTOR_DIMENSIONS[0]), ('full1536', 'full', SHORT_VECTOR_DIMENSIONS[0])]
+
+
+VECTOR_INDEXES = (
+    'chatmemory_embedding_hnsw',
+    'chatmemory_embedding_bq_hnsw',
+    *[f'chatmemory_embedding_d{dims}_hnsw' for dims in SHORT_VECTOR_DIMENSIONS],
+)
+
+
+def _tree_size(cursor, relation: str, size_function: str) -> int:
+    cursor.execute(
+        f"SELECT COALESCE(SUM({size_function}(relid)), 0) FROM pg_partition_tree(%s::regclass)",
+        [relation],
+    )
+    return int(cursor.fetchone()[0])
+
+
+def storage() -> dict:
+    """Bytes of the ChatMemory heap (with TOAST) and of each vector index, over all partitions."""
+    table = ChatMemory._meta.db_table
+    with connection.cursor() as cursor:
+        report = {
+            'heap_bytes': _tree_size(cursor, table, 'pg_table_size'),
+            'indexes': {},
+        }
+        for name in VECTOR_INDEXES:
+            cursor.execute("SELECT to_regclass(%s)", [name])
+            if cursor.fetchone()[0] is not None:
+                report['indexes'][name] = _tree_size(cursor, name, 'pg_relation_size')
+    report['vector_index_bytes'] = sum(report['indexes'].values())
+    return report
+
+
+def evaluate(service: ChatMemoryService, queries: int = 50, k: int = 10, seed: int = 0) -> dict:
+    qs = ChatMemory.objects.exclude(embedding=None)
+    ids = list(qs.values_list('id', flat=True))
+    if not ids:
+        return {'error': 'no embedded ChatMemory rows'}
+    sample_ids = random.Random(seed).sample(ids, min(queries, len(ids)))
+    embeddings = [
+        embedding.to_list()
+        for embedding in ChatMemory.objects.filter(id__in=sample_ids).values_list('embedding', flat=True)
+    ]
+
+    service.vector_search_mode = 'full'
+    truth = [
+        [m.id for m in service._vector_search(qs, embedding, k, exact=True)]
+        for embedding in embeddings
+    ]
+
+    report = {'rows': len(ids), 'queries': len(embeddings), 'k': k, 'modes': {}}
+    for name, mode, dims in _modes():
+        service.vector_search_mode = mode
+        service.vector_short_dimensions = dims
+        recalls, latencies = [], []
+        for embedding, expected in zip(embeddings, truth):
+            started = time.perf_counter()
+            ranked = service._vector_search(qs, embedding, k, exact=False)
+            latencies.append((time.perf_counter() - started) * 1000)
+            recalls.append(recall_at_k([m.id for m in ranked], expected, k))
+        report['modes'][name] = {
+            f'recall@{k}': sum(recalls) / len(recalls),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+        }
+    return report
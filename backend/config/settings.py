@@ -115,6 +115,31 @@ CELERY_RESULT_BACKEND = config('CELERY_RESULT_BACKEND', default=CELERY_BROKER_UR
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
+# PDF extraction starts its own process pool, which prefork children (daemonic) cannot
+# do; the queue is served by a --pool=solo worker (infra/docker-compose.yml worker-pdf)
+PDF_TASK_QUEUE = config('PDF_TASK_QUEUE', default='pdf')
+CELERY_TASK_ROUTES = {
+    'apps.chats.tasks.process_pdf_document': {'queue': PDF_TASK_QUEUE},
+} if PDF_TASK_QUEUE else {}
+CELERY_BEAT_SCHEDULE = {
+    'compact-chat-memories': {
+        'task': 'apps.chats.tasks.compact_chat_memories',
+        'schedule': config('COMPACTION_INTERVAL_SECONDS', default=3600, cast=int),
+    },
+    'maintain-partitions': {
+        'task': 'apps.chats.tasks.maintain_partitions',
+        'schedule': 24 * 3600,
+    },
+    # Picks up batches of a drain that died, when no new reply triggers one
+    'drain-index-queue': {
+        'task': 'apps.chats.tasks.drain_index_queue',
+        'schedule': config('INDEX_QUEUE_SWEEP_SECONDS', default=300, cast=int),
+    },
+    'purge-deleted-records': {
+        'task': 'apps.chats.tasks.purge_deleted_records',
+        'schedule': 3600,
+    },
+}
 
 FAL_KEY = config('FAL_KEY', default='')
 
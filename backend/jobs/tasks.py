@@ -102,17 +102,18 @@ def process_pdf(self, session_id: int, file_key: str, filename: str):
         
         # 5. Indexing
         logger.info(f"[Task {task_id}] Indexing {len(chunks)} chunks to PGVector")
-        for i, chunk in enumerate(chunks):
-            memory_service.add_memory(
-                session_id=session_id,
-                content=chunk,
-                metadata={
+        memory_service.add_memories_bulk(
+            session_id,
+            [
+                (chunk, {
                     'source': 'pdf',
                     'filename': filename,
                     'chunk_index': i,
                     'total_chunks': len(chunks)
-                }
-            )
+                })
+                for i, chunk in enumerate(chunks)
+            ]
+        )
         
         logger.info(f"[Task {task_id}] PDF processing completed successfully.")
         return "Success"
@@ -6,6 +6,9 @@ from django.conf import settings
 logger = logging.getLogger(__name__)
 
 class MinIOStorage:
+    # S3 limit on keys per DeleteObjects request
+    DELETE_BATCH_SIZE = 1000
+
     def __init__(self):
         self.endpoint_url = f"http{'s' if settings.MINIO_USE_SSL else ''}://{settings.MINIO_ENDPOINT}"
         self.public_endpoint_url = f"http{'s' if settings.MINIO_PUBLIC_USE_SSL else ''}://{settings.MINIO_PUBLIC_ENDPOINT}"
@@ -74,11 +77,7 @@ class MinIOStorage:
             # return url
             
             # Actually, better to return the presigned URL for safety
-            url = self.public_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': filename},
-                ExpiresIn=24 * 3600
-            )
+            url = self.get_public_url(filename)
             logger.info(f"Successfully uploaded {filename} to MinIO.")
             return url
         except Exception as e:
@@ -110,14 +109,63 @@ class MinIOStorage:
             logger.error(f"Failed to generate presigned URL for {filename}: {e}")
             raise
 
+    def get_public_url(self, filename: str, expires_in: int = 24 * 3600) -> str:
+        """
+        Returns a presigned URL on the public endpoint, as upload_file does.
+        """
+        return self.public_client.generate_presigned_url(
+            'get_object',
+            Params={'Bucket': self.bucket_name, 'Key': filename},
+            ExpiresIn=expires_in
+        )
+
+    def exists(self, filename: str) -> bool:
+        """
+        Checks whether an object exists.
+        """
+        try:
+            self.client.head_object(Bucket=self.bucket_name, Key=filename)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
     def delete_file(self, filename: str):
         """
         Deletes a file from MinIO.
         """
         try:
-            self.client.delete_object(self.bucket_name, filename)
+            self.client.delete_object(Bucket=self.bucket_name, Key=filename)
         except Exception as e:
             logger.error(f"Failed to delete {filename} from MinIO: {e}")
             raise
 
+    def list_keys(self, prefix: str) -> list[str]:
+        """
+        Returns the keys of all objects under a prefix.
+        """
+        keys = []
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            keys.extend(obj['Key'] for obj in page.get('Contents', []))
+        return keys
+
+    def delete_files(self, filenames: list[str]) -> list[str]:
+        """
+        Deletes files with batched DeleteObjects calls (at most 1000 keys per request).
+        Returns the keys that could not be deleted.
+        """
+        failed = []
+        for start in range(0, len(filenames), self.DELETE_BATCH_SIZE):
+            batch = filenames[start:start + self.DELETE_BATCH_SIZE]
+            response = self.client.delete_objects(
+                Bucket=self.bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True},
+            )
+            for error in response.get('Errors', []):
+                logger.error(f"Failed to delete {error.get('Key')} from MinIO: {error.get('Message')}")
+                failed.append(error.get('Key'))
+        return failed
+
 minio_client = MinIOStorage()
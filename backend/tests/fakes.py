@@ -0,0 +1,103 @@
+"""
+테스트용 인메모리 Redis 대역 (RedisConnection 자리에 주입).
+Docker 환경에서만 실행합니다.
+"""
+
+
+class FakePipeline:
+    """Queues calls and runs them on execute(), like a redis-py pipeline."""
+
+    def __init__(self, client):
+        self.client = client
+        self.calls = []
+
+    def __getattr__(self, name):
+        method = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            self.calls.append(lambda: method(*args, **kwargs))
+        return call
+
+    def execute(self):
+        return [call() for call in self.calls]
+
+
+class FakeRedis:
+    """The subset of redis-py used by the caches, the index queue and the span histograms."""
+
+    def __init__(self):
+        self.data = {}
+        self.lists = {}
+        self.sets = {}
+        self.hashes = {}
+
+    @staticmethod
+    def _encode(value):
+        return value.encode() if isinstance(value, str) else value
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.data:
+            return None
+        self.data[key] = self._encode(value)
+        return True
+
+    def incr(self, key):
+        self.data[key] = str(int(self.data.get(key, b"0")) + 1).encode()
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def delete(self, key):
+        for store in (self.data, self.lists, self.sets, self.hashes):
+            store.pop(key, None)
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(self._encode(v) for v in values)
+
+    def lmove(self, source, destination, src_side, dest_side):
+        items = self.lists.get(source)
+        if not items:
+            return None
+        value = items.pop(0 if src_side == "LEFT" else -1)
+        target = self.lists.setdefault(destination, [])
+        target.insert(0 if dest_side == "LEFT" else len(target), value)
+        return value
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def sadd(self, key, value):
+        self.sets.setdefault(key, set()).add(self._encode(value))
+
+    def smembers(self, key):
+        return self.sets.get(key, set())
+
+    def hincrby(self, key, field, amount):
+        h = self.hashes.setdefault(key, {})
+        h[field.encode()] = str(int(h.get(field.encode(), b"0")) + amount).encode()
+
+    def hincrbyfloat(self, key, field, amount):
+        h = self.hashes.setdefault(key, {})
+        h[field.encode()] = str(float(h.get(field.encode(), b"0")) + amount).encode()
+
+    def hgetall(self, key):
+        return self.hashes.get(key, {})
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakeConnection:
+    """Stands in for RedisConnection; pass client=None to simulate Redis being down."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self):
+        return self.client
+
+    def mark_down(self, error):
+        raise error
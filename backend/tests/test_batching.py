@@ -0,0 +1,74 @@
+"""
+임베딩 요청 병합(coalescing) 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+import threading
+
+from django.test import SimpleTestCase
+from apps.chats.batching import EmbeddingCoalescer
+
+
+class EmbeddingCoalescerTests(SimpleTestCase):
+    def setUp(self):
+        self.calls = []
+
+        def embed_batch(texts):
+            self.calls.append(list(texts))
+            return [[float(len(t))] for t in texts]
+
+        self.coalescer = EmbeddingCoalescer(embed_batch, max_batch=8, max_wait=0.05)
+
+    def test_concurrent_submits_share_one_request(self):
+        texts = ["a", "bb", "a", "ccc", "bb"]
+        results = {}
+        barrier = threading.Barrier(len(texts))
+
+        def worker(i, text):
+            barrier.wait()
+            results[i] = self.coalescer.submit(text).result(timeout=2)
+
+        threads = [threading.Thread(target=worker, args=(i, t)) for i, t in enumerate(texts)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual([results[i] for i in range(len(texts))], [[1.0], [2.0], [1.0], [3.0], [2.0]])
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(sorted(self.calls[0]), ["a", "bb", "ccc"])
+
+    def test_full_batch_flushes_without_waiting(self):
+        self.coalescer.max_wait = 60
+        futures = [self.coalescer.submit(str(i)) for i in range(8)]
+        self.assertEqual([f.result(timeout=2) for f in futures], [[1.0]] * 8)
+
+    def test_errors_propagate_to_every_waiter(self):
+        coalescer = EmbeddingCoalescer(lambda texts: [], max_batch=4, max_wait=0.01)
+        future = coalescer.submit("x")
+        with self.assertRaises(ValueError):
+            future.result(timeout=2)
+
+    def test_batches_run_concurrently_and_coalesce_while_slots_are_busy(self):
+        release = threading.Event()
+        started = threading.Semaphore(0)
+        calls = []
+
+        def slow_batch(texts):
+            calls.append(list(texts))
+            started.release()
+            release.wait(2)
+            return [[0.0] for _ in texts]
+
+        coalescer = EmbeddingCoalescer(slow_batch, max_batch=8, max_wait=0.01, max_concurrency=2)
+        first = coalescer.submit("a")
+        self.assertTrue(started.acquire(timeout=2))
+        second = coalescer.submit("b")
+        # A second provider call starts while the first is still running
+        self.assertTrue(started.acquire(timeout=2))
+        # With both slots busy, later texts wait together for the next free slot
+        rest = [coalescer.submit(t) for t in ("c", "d", "e")]
+        release.set()
+        for future in [first, second, *rest]:
+            future.result(timeout=2)
+        self.assertEqual(calls[:2], [["a"], ["b"]])
+        self.assertEqual(calls[2:], [["c", "d", "e"]])
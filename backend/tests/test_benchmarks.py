@@ -0,0 +1,55 @@
+"""
+검색 벤치마크 도구 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+import io
+import math
+import os
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase
+from benchmarks.metrics import percentile
+from benchmarks.retrieval import HashingEmbedder, filler_chunks
+
+
+class BenchmarkToolTests(SimpleTestCase):
+    def test_hashing_embedder_is_deterministic_and_normalized(self):
+        embedder = HashingEmbedder()
+        vector = embedder.embed("모집 기간 안내 deadline")
+        self.assertEqual(vector, HashingEmbedder().embed("모집 기간 안내 deadline"))
+        self.assertAlmostEqual(math.sqrt(sum(v * v for v in vector)), 1.0)
+
+    def test_hashing_embedder_ranks_overlapping_text_closer(self):
+        embedder = HashingEmbedder()
+        query = embedder.embed("모집 기간이 언제야?")
+        near = embedder.embed("모집기간은 3월 1일부터 3월 31일까지입니다.")
+        far = embedder.embed("quarterly budget report")
+        dot = lambda a, b: sum(x * y for x, y in zip(a, b))
+        self.assertGreater(dot(query, near), dot(query, far))
+
+    def test_filler_chunks_are_stable_across_batches(self):
+        whole = list(filler_chunks(0, 6))
+        self.assertEqual(whole, list(filler_chunks(0, 3)) + list(filler_chunks(3, 3)))
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([], 95), 0.0)
+
+    def test_retrieval_benchmark_refuses_non_test_databases(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': 'weavai'}), \
+                mock.patch('benchmarks.retrieval.RetrievalBenchmark.setup') as setup:
+            with self.assertRaises(CommandError):
+                call_command('retrieval_benchmark', '--sizes', '10')
+        setup.assert_not_called()
+
+    def test_rerank_flag_does_not_leak_into_the_environment(self):
+        with mock.patch.dict(connection.settings_dict, {'NAME': 'test_weavai'}), \
+                mock.patch.dict(os.environ, {}, clear=False), \
+                mock.patch('benchmarks.retrieval.RetrievalBenchmark.run', return_value={'sizes': {}}):
+            os.environ.pop('RERANK_ALL', None)
+            call_command('retrieval_benchmark', '--sizes', '10', '--rerank', stdout=io.StringIO())
+            self.assertNotIn('RERANK_ALL', os.environ)
@@ -0,0 +1,76 @@
+"""
+세션 메모리 압축 계획·요약 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase
+from apps.chats import compaction
+from apps.chats.compaction import MemoryCompactor
+from apps.chats.services import ChatMemoryService
+
+
+def _rows(n):
+    start = datetime(2026, 1, 1)
+    return [
+        {
+            'id': i + 1,
+            'content': f"reply {i + 1}",
+            'metadata': {'role': 'assistant', 'message_id': 100 + i} if i % 2 else {'type': 'image_generation', 'image_record_id': 500 + i},
+            'created_at': start + timedelta(hours=i),
+        }
+        for i in range(n)
+    ]
+
+
+class MemoryCompactorTests(SimpleTestCase):
+    def setUp(self):
+        self.compactor = MemoryCompactor()
+        self.compactor.group_size = 4
+        self.compactor.summary_model = ''
+
+    def test_plan_keeps_recent_rows_and_full_groups_only(self):
+        groups = self.compactor.plan(_rows(15), keep=5)
+        self.assertEqual([[r['id'] for r in g] for g in groups], [[1, 2, 3, 4], [5, 6, 7, 8]])
+        self.assertEqual(self.compactor.plan(_rows(8), keep=5), [])
+
+    def test_level_zero_provenance(self):
+        group = _rows(4)
+        provenance = self.compactor._provenance(group, 0)
+        self.assertEqual(provenance['source_memory_ids'], [1, 2, 3, 4])
+        self.assertEqual(provenance['message_ids'], [101, 103])
+        self.assertEqual(provenance['image_record_ids'], [500, 502])
+        self.assertEqual(provenance['memory_count'], 4)
+
+    def test_extractive_summary_is_bounded(self):
+        self.compactor.max_chars = 400
+        group = _rows(4)
+        group[0]['content'] = "가" * 1000
+        text = self.compactor.summarize(group, group[0]['created_at'], group[-1]['created_at'])
+        self.assertTrue(text.startswith("[대화 요약 2026-01-01 ~ 2026-01-01]"))
+        self.assertLess(len(text), 600)
+        self.assertIn("- reply 4", text)
+
+    def test_failed_embedding_keeps_the_originals(self):
+        service = ChatMemoryService()
+        service.client = object()
+        service.embedding_cache = None
+        service._request_embeddings = mock.Mock(side_effect=TimeoutError("provider down"))
+        self.compactor.service = service
+        self.compactor.keep_recent = 4
+        with mock.patch.object(MemoryCompactor, '_level_rows', side_effect=lambda sid, level: _rows(12) if level == 0 else []), \
+                mock.patch.object(compaction.transaction, 'atomic') as atomic:
+            result = self.compactor.compact_session(1)
+        # No zero-vector summary is written and nothing is deleted
+        atomic.assert_not_called()
+        self.assertEqual(result, {'summaries': 0, 'compacted': 0})
+
+    def test_embed_texts_only_falls_back_to_zero_vectors_when_not_strict(self):
+        service = ChatMemoryService()
+        service.client = object()
+        service.embedding_cache = None
+        service._request_embeddings = mock.Mock(side_effect=TimeoutError("provider down"))
+        self.assertEqual(service.embed_texts(["a"]), [[0.0] * 1536])
+        with self.assertRaises(TimeoutError):
+            service.embed_texts(["a"], strict=True)
@@ -0,0 +1,58 @@
+"""
+세션·문서 백그라운드 삭제의 저장소 정리 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase
+from apps.chats.deletion import BulkDeleter, session_prefixes
+from storage.s3 import MinIOStorage
+
+
+class FakeStorage:
+    def __init__(self, objects, failing=()):
+        self.objects = set(objects)
+        self.failing = set(failing)
+        self.deleted = []
+
+    def list_keys(self, prefix):
+        return sorted(key for key in self.objects if key.startswith(prefix))
+
+    def delete_files(self, keys):
+        self.deleted.append(list(keys))
+        return [key for key in keys if key in self.failing]
+
+
+class BulkDeleterStorageTests(SimpleTestCase):
+    def test_session_prefixes_cover_uploads_and_extracted_images_only(self):
+        storage = FakeStorage([
+            '7/a.pdf', '7/b.pdf', 'images/7/3/1_0.png', 'images/7/1_0.png',
+            '70/c.pdf', 'images/70/1/1_0.png',
+        ])
+        deleter = BulkDeleter(storage=storage, service=mock.Mock())
+        count = deleter.delete_objects({'7/a.pdf'}, session_prefixes(7))
+        self.assertEqual(count, 4)
+        self.assertEqual(storage.deleted, [['7/a.pdf', '7/b.pdf', 'images/7/1_0.png', 'images/7/3/1_0.png']])
+
+    def test_failed_keys_raise_so_the_task_retries(self):
+        storage = FakeStorage(['7/a.pdf'], failing={'7/a.pdf'})
+        deleter = BulkDeleter(storage=storage, service=mock.Mock())
+        with self.assertRaises(RuntimeError):
+            deleter.delete_objects(set(), session_prefixes(7))
+
+    def test_delete_files_batches_delete_objects_requests(self):
+        storage = MinIOStorage.__new__(MinIOStorage)
+        storage.bucket_name = 'bucket'
+        storage.client = mock.Mock()
+        storage.client.delete_objects.side_effect = [{}, {'Errors': [{'Key': 'k2000', 'Message': 'denied'}]}, {}]
+        failed = storage.delete_files([f'k{i}' for i in range(2500)])
+        self.assertEqual(failed, ['k2000'])
+        sizes = [len(call.kwargs['Delete']['Objects']) for call in storage.client.delete_objects.call_args_list]
+        self.assertEqual(sizes, [1000, 1000, 500])
+
+    def test_missing_keys_are_dropped_before_sorting(self):
+        storage = FakeStorage(['7/a.pdf', 'images/7/abc.png'])
+        deleter = BulkDeleter(storage=storage, service=mock.Mock())
+        count = deleter.delete_objects({None, '', 'images/7/abc.png', '7/a.pdf'})
+        self.assertEqual(count, 2)
+        self.assertEqual(storage.deleted, [['7/a.pdf', 'images/7/abc.png']])
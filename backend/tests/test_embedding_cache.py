@@ -0,0 +1,58 @@
+"""
+임베딩·리랭크 캐시 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase
+from apps.chats.cache import EmbeddingCache, RerankCache, content_hash
+from tests.fakes import FakeConnection, FakeRedis
+
+
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = EmbeddingCache(max_entries=2, local_ttl=60, use_redis=False)
+
+    def test_key_ignores_whitespace_differences(self):
+        self.assertEqual(content_hash("모집  기간\n안내"), content_hash(" 모집 기간 안내 "))
+        self.assertNotEqual(
+            self.cache.key("model-a", "text"),
+            self.cache.key("model-b", "text"),
+        )
+
+    def test_hit_and_miss_counters(self):
+        self.assertIsNone(self.cache.get("m", "hello"))
+        self.cache.set("m", "hello", [0.1, 0.2])
+        self.assertEqual(self.cache.get("m", "hello"), [0.1, 0.2])
+        stats = self.cache.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits_local"], 1)
+
+    def test_lru_eviction(self):
+        self.cache.set("m", "a", [1.0])
+        self.cache.set("m", "b", [2.0])
+        self.cache.get("m", "a")
+        self.cache.set("m", "c", [3.0])
+        self.assertIsNone(self.cache.get("m", "b"))
+        self.assertEqual(self.cache.get("m", "a"), [1.0])
+
+    def test_ttl_expiry(self):
+        with mock.patch("apps.chats.cache.time.monotonic", return_value=1000.0):
+            self.cache.set("m", "a", [1.0])
+        with mock.patch("apps.chats.cache.time.monotonic", return_value=1061.0):
+            self.assertIsNone(self.cache.get("m", "a"))
+
+
+class RerankCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = RerankCache(redis_connection=FakeConnection(FakeRedis()))
+
+    def test_round_trip_with_normalized_query(self):
+        self.cache.set("m", "모집 기간은?", [3, 1, 2], [2, 3, 1], document_id=7)
+        self.assertEqual(self.cache.get("m", "  모집   기간은? ", [3, 1, 2], document_id=7), [2, 3, 1])
+        self.assertIsNone(self.cache.get("m", "모집 기간은?", [1, 2, 3], document_id=7))
+
+    def test_document_invalidation(self):
+        self.cache.set("m", "q", [1, 2], [2, 1], document_id=7)
+        self.cache.invalidate_document(7)
+        self.assertIsNone(self.cache.get("m", "q", [1, 2], document_id=7))
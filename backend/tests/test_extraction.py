@@ -0,0 +1,202 @@
+"""
+페이지 단위 병렬 PDF 추출 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+import hashlib
+import os
+import tempfile
+from concurrent.futures import Future
+from unittest import mock
+
+import fitz
+from django.test import SimpleTestCase
+from apps.chats import extraction
+
+
+def write_pdf(path, pages):
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Page {i + 1} heading")
+        page.insert_text((72, 300), f"Body text of page {i + 1}")
+    doc.save(path)
+    doc.close()
+
+
+class PdfExtractorTests(SimpleTestCase):
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        write_pdf(self.path, 7)
+        self.addCleanup(os.unlink, self.path)
+
+    def extractor(self, workers):
+        with mock.patch.dict(os.environ, {
+            'PDF_EXTRACT_WORKERS': str(workers),
+            'PDF_EXTRACT_PAGES_PER_TASK': '2',
+            'PDF_EXTRACT_PARALLEL_MIN_PAGES': '1',
+        }):
+            return extraction.PdfExtractor()
+
+    def test_page_ranges_cover_every_page_once(self):
+        self.assertEqual(self.extractor(2).page_ranges(7), [(0, 2), (2, 4), (4, 6), (6, 7)])
+
+    def test_parallel_result_matches_sequential_in_page_order(self):
+        with mock.patch.object(extraction, 'ocr_available', return_value=False):
+            sequential = self.extractor(1).extract(self.path)
+            parallel = self.extractor(2).extract(self.path)
+        self.assertEqual(parallel.parsed, sequential.parsed)
+        self.assertEqual([b['page'] for b in parallel.parsed], [1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6, 7, 7])
+        # Every range came back from a pool worker, none from the fallback in this process
+        self.assertTrue(parallel.worker_pids)
+        self.assertNotIn(os.getpid(), parallel.worker_pids)
+        self.assertEqual(parallel.failed_pages, [])
+
+    def test_failed_worker_range_is_extracted_in_process(self):
+        with mock.patch.object(extraction, 'ocr_available', return_value=False), \
+                mock.patch.object(extraction, 'ProcessPoolExecutor', side_effect=OSError('no pool')):
+            result = self.extractor(2).extract(self.path)
+        self.assertEqual(len(result.parsed), 14)
+
+    def _crashing_pool(self, bad_page, in_flight=1):
+        """
+        Stand-in for ProcessPoolExecutor whose worker dies on `bad_page` (0-indexed). The
+        crash breaks the pool: `in_flight` ranges from the crashing one on (capped by the
+        pool's workers) had started, the later ones fail without starting.
+        """
+        from concurrent.futures.process import BrokenProcessPool
+
+        pools = []
+
+        def fake_pool(max_workers, initargs, **kwargs):
+            started = initargs[1]
+            pool = mock.MagicMock()
+            pool.__enter__.return_value = pool
+            state = {'broken_at': None}
+            pools.append([])
+
+            def submit(fn, index, pdf_path, start, end, *args):
+                pools[-1].append((start, end))
+                future = Future()
+                broken_at = state['broken_at']
+                if broken_at is not None:
+                    if index < broken_at + min(in_flight, max_workers):
+                        started[index] = 1
+                    future.set_exception(BrokenProcessPool('worker died'))
+                elif start <= bad_page < end:
+                    started[index] = 1
+                    state['broken_at'] = index
+                    future.set_exception(BrokenProcessPool('worker died'))
+                else:
+                    started[index] = 1
+                    future.set_result(extraction.extract_page_range(pdf_path, start, end, *args))
+                return future
+            pool.submit.side_effect = submit
+            return pool
+        return fake_pool, pools
+
+    def test_crash_retries_pending_ranges_on_one_pool_and_isolates_the_crasher(self):
+        fake_pool, pools = self._crashing_pool(bad_page=2)
+        with mock.patch.object(extraction, 'ocr_available', return_value=False), \
+                mock.patch.object(extraction, 'ProcessPoolExecutor', side_effect=fake_pool), \
+                mock.patch.object(extraction, 'extract_pages', wraps=extraction.extract_pages) as in_process:
+            result = self.extractor(2).extract(self.path)
+        # Range (2, 4) crashed: page 4 succeeds on its own, page 3 keeps crashing and is reported
+        self.assertEqual(result.failed_pages, [3])
+        self.assertEqual(sorted({b['page'] for b in result.parsed}), [1, 2, 4, 5, 6, 7])
+        self.assertEqual(pools, [
+            [(0, 2), (2, 4), (4, 6), (6, 7)],
+            [(4, 6), (6, 7)],          # never started: one shared retry pool
+            [(2, 3)], [(3, 4)],        # only the crashed range goes page by page
+        ])
+        self.assertNotIn((2, 4), [call.args[1:3] for call in in_process.call_args_list])
+
+    def test_ranges_in_flight_at_a_crash_are_told_apart_one_at_a_time(self):
+        fake_pool, pools = self._crashing_pool(bad_page=2, in_flight=2)
+        with mock.patch.object(extraction, 'ocr_available', return_value=False), \
+                mock.patch.object(extraction, 'ProcessPoolExecutor', side_effect=fake_pool):
+            result = self.extractor(2).extract(self.path)
+        self.assertEqual(result.failed_pages, [3])
+        self.assertEqual(pools, [
+            [(0, 2), (2, 4), (4, 6), (6, 7)],
+            [(6, 7)],
+            [(2, 4), (4, 6)],          # both were running: a single-worker pool finds the crasher
+            [(4, 6)],
+            [(2, 3)], [(3, 4)],
+        ])
+
+    def test_daemonic_process_extracts_sequentially_without_a_pool(self):
+        with mock.patch.object(extraction, 'ocr_available', return_value=False), \
+                mock.patch.object(extraction, '_in_daemon_process', return_value=True), \
+                mock.patch.object(extraction, 'ProcessPoolExecutor') as pool:
+            result = self.extractor(2).extract(self.path)
+        pool.assert_not_called()
+        self.assertEqual(len(result.parsed), 14)
+
+
+def write_mixed_pdf(path):
+    """1쪽: 텍스트 위주, 2쪽: 텍스트 없는 스캔, 3쪽: 큰 이미지 + 짧은 캡션 여러 줄."""
+    pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+    pixmap.clear_with(200)
+    png = pixmap.tobytes("png")
+    doc = fitz.open()
+    page = doc.new_page()
+    for line in range(20):
+        page.insert_text((72, 72 + line * 14), f"Born-digital paragraph line {line} with enough text")
+    doc.new_page().insert_image(fitz.Rect(0, 0, 595, 842), stream=png)
+    page = doc.new_page()
+    page.insert_image(fitz.Rect(0, 0, 595, 700), stream=png)
+    page.insert_text((72, 760), "Caption under the poster image with a few more words in it " * 2, fontsize=6)
+    doc.save(path)
+    doc.close()
+
+
+class OcrPageClassifierTests(SimpleTestCase):
+    def test_decisions(self):
+        classifier = extraction.OcrPageClassifier()
+        self.assertEqual(classifier.decide({'text_chars': 2000, 'text_coverage': 0.6, 'image_ratio': 0.0}), (False, 'text_layer'))
+        self.assertEqual(classifier.decide({'text_chars': 10, 'text_coverage': 0.01, 'image_ratio': 1.0}), (True, 'sparse_text'))
+        self.assertEqual(classifier.decide({'text_chars': 300, 'text_coverage': 0.05, 'image_ratio': 0.8}), (True, 'image_heavy'))
+        with mock.patch.dict(os.environ, {'OCR_PAGE_MODE': 'always'}):
+            self.assertEqual(extraction.OcrPageClassifier().decide({'text_chars': 2000, 'text_coverage': 0.6, 'image_ratio': 0.0}), (True, 'always'))
+
+    def test_only_selected_pages_are_ocred(self):
+        fd, path = tempfile.mkstemp(suffix='.pdf')
+        os.close(fd)
+        self.addCleanup(os.unlink, path)
+        write_mixed_pdf(path)
+        with mock.patch.object(extraction, 'page_ocr_blocks', return_value=[]) as ocr, fitz.open(path) as doc:
+            result = extraction.extract_pages(doc, 0, doc.page_count, True, extraction.OcrPageClassifier())
+        self.assertEqual([call.args[1] for call in ocr.call_args_list], [1, 2])
+        self.assertEqual({p: d['reason'] for p, d in result.ocr_decisions.items()},
+                         {1: 'text_layer', 2: 'sparse_text', 3: 'image_heavy'})
+
+
+class ImageDedupTests(SimpleTestCase):
+    def test_repeated_xref_is_extracted_once(self):
+        pixmap = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 64, 64), False)
+        pixmap.clear_with(90)
+        doc = fitz.open()
+        xref = doc.new_page().insert_image(fitz.Rect(50, 50, 250, 250), stream=pixmap.tobytes("png"))
+        for _ in range(2):
+            doc.new_page().insert_image(fitz.Rect(50, 50, 250, 250), xref=xref)
+        images = extraction.extract_pages(doc, 0, doc.page_count, ocr=False).images
+        doc.close()
+        self.assertEqual([('image_bytes' in image, image['page']) for image in images], [(True, 1), (False, 2), (False, 3)])
+        unique = extraction.dedupe_images(images)
+        self.assertEqual(len(unique), 1)
+        self.assertEqual(unique[0]['pages'], [1, 2, 3])
+
+    def test_identical_bytes_under_different_xrefs_collapse(self):
+        def image(xref, page, data):
+            return {'xref': xref, 'page': page, 'image_bytes': data, 'ext': 'png',
+                    'sha256': hashlib.sha256(data).hexdigest()}
+        images = [
+            image(10, 1, b'logo'),
+            image(11, 1, b'chart'),
+            # Same xref seen again in another worker range, bytes not re-extracted
+            {'xref': 11, 'page': 4},
+            image(20, 5, b'logo'),
+        ]
+        unique = extraction.dedupe_images(images)
+        self.assertEqual([(u['xref'], u['pages']) for u in unique], [(10, [1, 5]), (11, [1, 4])])
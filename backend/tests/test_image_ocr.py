@@ -0,0 +1,59 @@
+"""
+PDF 이미지 fal OCR 동시 호출·해시 캐시 테스트 (외부 호출 없음).
+Docker 환경에서만 실행합니다.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.test import SimpleTestCase
+from apps.chats import services
+from apps.chats.services import ChatMemoryService
+
+
+class ConcurrentImageOcrTests(SimpleTestCase):
+    def test_results_keep_input_order_within_concurrency_limit(self):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def fake_ocr(url, timeout=None):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            # Later images finish first
+            time.sleep(0.02 * (10 - int(url.rsplit('/', 1)[1])))
+            with lock:
+                state['active'] -= 1
+            if url.endswith('/4'):
+                raise RuntimeError('fal down')
+            return f"text of {url}"
+
+        service = ChatMemoryService()
+        urls = [f"http://minio/img/{i}" for i in range(10)]
+        with mock.patch.object(services, '_fal_ocr_executor', ThreadPoolExecutor(max_workers=3)), \
+                mock.patch.object(service, 'ocr_image_with_fal', side_effect=fake_ocr):
+            texts = service.ocr_images_with_fal(urls)
+
+        self.assertEqual(texts[:4], [f"text of {u}" for u in urls[:4]])
+        self.assertIsNone(texts[4])
+        self.assertEqual(texts[5:], [f"text of {u}" for u in urls[5:]])
+        self.assertLessEqual(state['peak'], 3)
+        self.assertGreater(state['peak'], 1)
+
+    def test_cached_hashes_skip_fal_and_new_results_are_saved(self):
+        service = ChatMemoryService()
+        cache = mock.Mock()
+        cache.objects.filter.return_value.values_list.return_value = [('a' * 64, '로고 문구')]
+        fake_ocr = mock.Mock(side_effect=lambda url, timeout=None: None if url.endswith('/3') else f"text of {url}")
+        with mock.patch.object(services, 'ImageOcrResult', cache), \
+                mock.patch.object(service, 'ocr_image_with_fal', fake_ocr):
+            texts = service.ocr_images_with_fal(
+                ['http://minio/img/1', 'http://minio/img/2', 'http://minio/img/3'],
+                content_hashes=['a' * 64, 'b' * 64, 'c' * 64],
+            )
+        self.assertEqual(texts, ['로고 문구', 'text of http://minio/img/2', None])
+        self.assertEqual(sorted(call.args[0] for call in fake_ocr.call_args_list), ['http://minio/img/2', 'http://minio/img/3'])
+        # Failed OCR is not cached
+        saved = [call.kwargs for call in cache.call_args_list]
+        self.assertEqual(saved, [{'sha256': 'b' * 64, 'endpoint': services.FAL_OCR_ENDPOINT, 'text': 'text of http://minio/img/2'}])
@@ -0,0 +1,92 @@
+"""
+백그라운드 인덱싱 큐 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase
+from apps.chats import indexing, tasks
+from apps.chats.indexing import IndexQueue
+from tests.fakes import FakeConnection, FakeRedis
+
+
+class IndexQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.queue = IndexQueue(redis_connection=FakeConnection(self.redis))
+        self.queue.enabled = True
+        self.queue.batch_size = 2
+
+    def test_burst_schedules_a_single_drain(self):
+        with mock.patch.object(IndexQueue, '_schedule_drain') as schedule:
+            for i in range(3):
+                self.assertTrue(self.queue.push(1, f"reply {i}", {'role': 'assistant'}))
+        schedule.assert_called_once()
+
+    def test_pop_batch_drains_in_order(self):
+        with mock.patch.object(IndexQueue, '_schedule_drain'):
+            for i in range(3):
+                self.queue.push(i, f"reply {i}")
+        self.assertEqual(self.queue.pop_batch(), [(0, "reply 0", {}), (1, "reply 1", {})])
+        self.assertEqual(self.queue.pop_batch(), [(2, "reply 2", {})])
+        self.assertEqual(self.queue.pop_batch(), [])
+
+    def test_batch_stays_in_processing_until_acked(self):
+        with mock.patch.object(IndexQueue, '_schedule_drain'):
+            for i in range(3):
+                self.queue.push(i, f"reply {i}")
+        self.assertTrue(self.queue.acquire())
+        self.queue.pop_batch()
+        self.assertEqual(self.redis.llen(IndexQueue.processing_key), 2)
+        self.queue.ack()
+        self.assertEqual(self.redis.llen(IndexQueue.processing_key), 0)
+        self.assertEqual(self.queue.backlog(), 1)
+
+    def test_next_drain_restores_a_dead_drains_batch_in_order(self):
+        with mock.patch.object(IndexQueue, '_schedule_drain'):
+            for i in range(3):
+                self.queue.push(i, f"reply {i}")
+        self.assertTrue(self.queue.acquire())
+        self.queue.pop_batch()
+        # The drain dies holding the batch; its lock expires
+        self.redis.data.pop(IndexQueue.draining_key)
+        self.assertTrue(self.queue.acquire())
+        self.assertEqual(self.queue.pop_batch(), [(0, "reply 0", {}), (1, "reply 1", {})])
+
+    def test_requeued_batch_schedules_its_own_drain(self):
+        with mock.patch.object(IndexQueue, '_schedule_drain'):
+            self.queue.push(1, "reply")
+        self.assertTrue(self.queue.acquire())
+        self.queue.pop_batch()
+        self.queue.requeue()
+        with mock.patch.object(IndexQueue, '_schedule_drain') as schedule:
+            self.queue.release_drain(countdown=30)
+        schedule.assert_called_once_with(30)
+        self.assertEqual(self.queue.backlog(), 1)
+
+    def test_falls_back_to_inline_indexing_without_redis(self):
+        queue = IndexQueue(redis_connection=FakeConnection(None))
+        with mock.patch.object(indexing, 'index_queue', queue), \
+                mock.patch.object(indexing.memory_service, 'add_memory') as add_memory:
+            indexing.index_memory(5, "reply", {'role': 'assistant'})
+        add_memory.assert_called_once_with(5, "reply", metadata={'role': 'assistant'})
+
+    def test_embedding_failure_requeues_the_batch(self):
+        with mock.patch.object(IndexQueue, '_schedule_drain'):
+            self.queue.push(1, "reply 0")
+            self.queue.push(1, "reply 1")
+        service = indexing.memory_service
+        live_sessions = mock.Mock()
+        live_sessions.filter.return_value.values_list.return_value = [1]
+        with mock.patch.object(tasks, 'index_queue', self.queue), \
+                mock.patch.object(tasks, 'Session', mock.Mock(objects=live_sessions)), \
+                mock.patch.object(service, 'client', object()), \
+                mock.patch.object(service, 'embedding_cache', None), \
+                mock.patch.object(service, '_request_embeddings', side_effect=TimeoutError("provider down")), \
+                mock.patch.object(tasks.ChatMemory.objects, 'bulk_create') as bulk_create, \
+                mock.patch.object(IndexQueue, '_schedule_drain') as schedule:
+            result = tasks.drain_index_queue()
+        bulk_create.assert_not_called()
+        self.assertEqual(result, {'indexed': 0, 'requeued': 2})
+        self.assertEqual(self.queue.pop_batch(), [(1, "reply 0", {}), (1, "reply 1", {})])
+        schedule.assert_called_once_with(self.queue.retry_delay)
@@ -0,0 +1,53 @@
+"""
+문자 bigram 역색인 점수 계산 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+from unittest import mock
+
+from django.test import SimpleTestCase
+from apps.chats import ngram
+from apps.chats.ngram import char_bigrams, score_postings
+
+
+class NgramScoringTests(SimpleTestCase):
+    def test_bigrams_ignore_spacing(self):
+        self.assertEqual(char_bigrams("모집 기간"), char_bigrams("모집기간"))
+        self.assertEqual(char_bigrams("AB-c"), char_bigrams("abc"))
+
+    def test_token_requires_all_bigrams(self):
+        # chunk 1: "모집기간 안내", chunk 2: "모집 대상", chunk 3: "신청기간"
+        postings = {}
+        for memory_id, text in ((1, "모집기간 안내"), (2, "모집 대상"), (3, "신청기간")):
+            for gram, tf in char_bigrams(text).items():
+                ids, tfs = postings.setdefault(gram, ([], []))
+                ids.append(memory_id)
+                tfs.append(tf)
+        token_grams = [list(char_bigrams("모집기간"))]
+        scores = score_postings(postings, token_grams, total_chunks=3)
+        self.assertEqual(set(scores), {1})
+
+    def test_rarer_bigrams_score_higher(self):
+        postings = {
+            "기간": ([1, 2, 3], [1, 1, 1]),
+            "모집": ([1], [1]),
+        }
+        scores = score_postings(postings, [["기간"], ["모집"]], total_chunks=3)
+        self.assertGreater(scores[1], scores[2])
+        self.assertEqual(scores[2], scores[3])
+
+    def test_unknown_bigram_matches_nothing(self):
+        postings = {"기간": ([1], [1])}
+        self.assertEqual(score_postings(postings, [["기간", "없음"]], total_chunks=1), {})
+
+    def test_session_search_merges_postings_of_all_documents(self):
+        # 문서 1: chunk 1 "모집기간", 문서 2: chunk 7 "모집기간 연장"
+        rows = [
+            ("모집", [1], [1]), ("집기", [1], [1]), ("기간", [1], [1]),
+            ("모집", [7], [1]), ("집기", [7], [1]), ("기간", [7], [1]),
+        ]
+        with mock.patch.object(ngram.DocumentNgramPosting.objects, 'filter') as query:
+            query.return_value.values_list.return_value = rows
+            ranked = ngram.search_documents([1, 2], ["모집기간"], total_chunks=10, limit=5)
+        query.assert_called_once()
+        self.assertEqual(query.call_args.kwargs['document_id__in'], [1, 2])
+        self.assertEqual(sorted(memory_id for memory_id, _ in ranked), [1, 7])
@@ -0,0 +1,34 @@
+"""
+파티션 이름·기간 계산 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+from datetime import datetime, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase
+from apps.chats import partitions
+
+
+class PartitionTests(SimpleTestCase):
+    def test_month_arithmetic_crosses_years(self):
+        start = partitions.month_start(datetime(2026, 11, 17, 9, 30, tzinfo=timezone.utc))
+        self.assertEqual(start, datetime(2026, 11, 1, tzinfo=timezone.utc))
+        self.assertEqual(partitions.add_months(start, 2), datetime(2027, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(partitions.add_months(start, -11), datetime(2025, 12, 1, tzinfo=timezone.utc))
+        self.assertEqual(partitions.partition_name('chats_job', start), 'chats_job_p2026_11')
+
+    def test_only_partitions_entirely_before_cutoff_are_dropped(self):
+        listed = [
+            ('chats_job_default', None),
+            ('chats_job_p2026_08', datetime(2026, 9, 1, tzinfo=timezone.utc)),
+            ('chats_job_p2026_09', datetime(2026, 10, 1, tzinfo=timezone.utc)),
+            ('chats_job_p_legacy', datetime(2026, 8, 1, tzinfo=timezone.utc)),
+        ]
+        cutoff = datetime(2026, 9, 15, tzinfo=timezone.utc)
+        with mock.patch.object(partitions, 'list_partitions', return_value=listed), \
+                mock.patch.object(partitions, '_has_unfinished_jobs', side_effect=lambda name: name == 'chats_job_p_legacy'), \
+                mock.patch.object(partitions, 'connection') as conn, \
+                mock.patch.object(partitions.transaction, 'atomic'):
+            conn.ops.quote_name = lambda name: f'"{name}"'
+            dropped = partitions.drop_expired_partitions('chats_job', cutoff)
+        self.assertEqual(dropped, ['chats_job_p2026_08'])
@@ -0,0 +1,44 @@
+"""
+로컬 리랭커 테스트 (DB 불필요, 고정 코퍼스 사용).
+Docker 환경에서만 실행합니다.
+"""
+from django.test import SimpleTestCase
+from apps.chats.rerank import LexicalReranker
+from apps.chats.services import ChatMemoryService, RetrievedMemory
+from benchmarks.metrics import load_corpus
+from benchmarks.rerank_eval import FirstStage, evaluate
+
+
+class LexicalRerankerTests(SimpleTestCase):
+    def test_proximity_prefers_adjacent_terms(self):
+        reranker = LexicalReranker()
+        near = reranker._proximity("모집 기간 안내", ["모집", "기간"])
+        far = reranker._proximity("모집 대상은 다음과 같으며 " + "x" * 200 + " 기간", ["모집", "기간"])
+        self.assertGreater(near, far)
+
+    def test_rerankers_are_scored_on_the_hybrid_first_stage(self):
+        service = ChatMemoryService()
+        service.rerank_enabled = True
+        service.local_reranker = LexicalReranker()
+        report = evaluate(service, ['none', 'local'], k=3)
+        # 'none' is the real BM25 + vector RRF order, not a hand-arranged worst case
+        self.assertGreaterEqual(report['none']['recall@3'], 0.9)
+        # RERANK_MODEL=local must not rank worse than skipping the rerank stage
+        self.assertGreaterEqual(report['local']['recall@3'], report['none']['recall@3'])
+        self.assertGreaterEqual(report['local']['mrr'], report['none']['mrr'])
+
+    def test_expansion_terms_do_not_outrank_query_terms(self):
+        service = ChatMemoryService()
+        service.rerank_enabled = True
+        service.local_reranker = LexicalReranker()
+        seen = []
+        service.local_reranker.rerank = lambda query, terms, items, limit: seen.append(terms) or items[:limit]
+        service._rerank_local("발표 평가는 언제 해?", [RetrievedMemory(1, "발표 평가", {})], 3)
+        self.assertEqual(seen, [["발표", "평가는", "언제"]])
+
+    def test_first_stage_finds_every_relevant_passage(self):
+        corpus = load_corpus()
+        first_stage = FirstStage(ChatMemoryService(), corpus['passages'])
+        for q in corpus['queries']:
+            found = {item.id for item in first_stage.search(q['query'], 12)}
+            self.assertTrue(set(q['relevant']) <= found, q['query'])
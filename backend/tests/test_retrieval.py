@@ -0,0 +1,194 @@
+"""
+검색 결과 병합 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+import os
+from concurrent.futures import Future
+from contextlib import nullcontext
+from unittest import mock
+
+from django.db import connection
+from django.test import SimpleTestCase
+from apps.chats import services
+from apps.chats.models import ChatMemory
+from apps.chats.services import ChatMemoryService, RetrievedMemory
+
+
+def _hit(memory_id, content=''):
+    return RetrievedMemory(memory_id, content, {'page': 1}, 1)
+
+
+class RetrievedMemoryTests(SimpleTestCase):
+    def test_record_has_no_instance_dict(self):
+        hit = _hit(1, 'text')
+        self.assertFalse(hasattr(hit, '__dict__'))
+        self.assertEqual(hit.metadata, {'page': 1})
+
+    def test_from_row_prefers_row_score(self):
+        row = {'id': 3, 'content': 'c', 'metadata': None, 'page': 2, 'score': 1.5}
+        hit = RetrievedMemory.from_row(row, score=0.1)
+        self.assertEqual(hit.score, 1.5)
+        self.assertEqual(hit.metadata, {})
+
+
+class RRFMergeTests(SimpleTestCase):
+    def setUp(self):
+        self.service = ChatMemoryService()
+
+    def test_items_in_both_lists_rank_first(self):
+        vector = [_hit(1), _hit(2), _hit(3)]
+        keyword = [_hit(3), _hit(4)]
+        merged = self.service._rrf_merge(vector, keyword)
+        self.assertEqual([m.id for m in merged], [3, 1, 2, 4])
+
+    def test_empty_inputs(self):
+        self.assertEqual(self.service._rrf_merge([], []), [])
+
+
+class VectorSettingsTests(SimpleTestCase):
+    def test_invalid_short_dimensions_fall_back_to_default(self):
+        for value in ('300', 'abc'):
+            with mock.patch.dict(os.environ, {'VECTOR_SHORT_DIMENSIONS': value}), \
+                    self.assertLogs('apps.chats.services', level='WARNING'):
+                self.assertEqual(ChatMemoryService().vector_short_dimensions, 256)
+        with mock.patch.dict(os.environ, {'VECTOR_SHORT_DIMENSIONS': '512'}):
+            self.assertEqual(ChatMemoryService().vector_short_dimensions, 512)
+
+
+def _filter_tokens(qs):
+    """icontains values of the WHERE clause (not of the score annotation)."""
+    def leaves(node):
+        for child in node.children:
+            if hasattr(child, 'children'):
+                yield from leaves(child)
+            else:
+                yield child.rhs
+    return list(leaves(qs.query.where))
+
+
+class KeywordSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.service = ChatMemoryService()
+        self.service.ngram_search_enabled = True
+        self.qs = mock.Mock()
+
+    def test_session_search_merges_postings_with_document_less_rows(self):
+        with mock.patch('apps.chats.services.Document.objects') as documents, \
+                mock.patch.object(self.service, '_ngram_search', return_value=[_hit(1)]) as ngram_search, \
+                mock.patch.object(self.service, '_bm25_search', return_value=[_hit(2)]):
+            documents.filter.return_value.values_list.return_value = [7, 8]
+            results, hit = self.service._keyword_search(self.qs, "모집 기간", 5, session_ids=[3])
+        self.assertTrue(hit)
+        self.assertEqual(ngram_search.call_args.args[1], [7, 8])
+        self.assertEqual({r.id for r in results}, {1, 2})
+
+    def test_session_search_without_pdf_rows_skips_the_postings(self):
+        with mock.patch('apps.chats.services.Document.objects') as documents, \
+                mock.patch.object(self.service, '_ngram_search') as ngram_search, \
+                mock.patch.object(self.service, '_bm25_search', return_value=[_hit(2)]) as bm25_search:
+            results, hit = self.service._keyword_search(
+                self.qs, "모집 기간", 5, session_ids=[3], exclude_sources=['pdf']
+            )
+        # No Document id query, chunk COUNT or postings lookup on task_chat's prompt path
+        documents.filter.assert_not_called()
+        ngram_search.assert_not_called()
+        bm25_search.assert_called_once()
+        self.assertEqual(([r.id for r in results], hit), ([2], True))
+
+    def test_bm25_rows_are_selected_by_trigram_usable_tokens(self):
+        qs = self.service._bm25_queryset(ChatMemory.objects.all(), ["모집", "기간이", "언제야"])
+        # '모집' has no trigram; as an OR arm it would turn the index scan into a full scan
+        self.assertEqual(_filter_tokens(qs), ["기간이", "언제야"])
+        self.assertIn('score', qs.query.annotations)
+
+    def test_bm25_falls_back_to_short_tokens_when_none_is_long_enough(self):
+        qs = self.service._bm25_queryset(ChatMemory.objects.all(), ["모집", "기간"])
+        self.assertEqual(_filter_tokens(qs), ["모집", "기간"])
+
+
+class HybridSqlTests(SimpleTestCase):
+    """HYBRID_SEARCH_MODE=sql: statement composition and parameter order, no Postgres needed."""
+
+    def setUp(self):
+        self.service = ChatMemoryService()
+        self.cursor = mock.MagicMock()
+        self.cursor.fetchall.return_value = []
+
+    def _execute(self, **kwargs):
+        db = mock.MagicMock(ops=connection.ops)
+        db.cursor.return_value.__enter__.return_value = self.cursor
+        with mock.patch.object(self.service, '_vector_scan_settings', return_value=nullcontext()), \
+                mock.patch.object(services, 'connection', db):
+            self.service._hybrid_search_sql(
+                ChatMemory.objects.filter(session_id=3), "모집 기간이 언제야", [0.5] * 1536, 20, 5, exact=True, **kwargs
+            )
+        return self.cursor.execute.call_args.args
+
+    def test_bm25_keyword_cte_params_follow_the_vector_params(self):
+        sql, params = self._execute()
+        self.assertEqual(sql.count('%s'), len(params))
+        self.assertTrue(params[0].startswith('[0.5,'))  # query vector
+        self.assertEqual(params[1], 3)                   # vector CTE session filter
+        self.assertIn('%기간이%', params)
+        self.assertEqual(params[-2:], (60, 5))           # RRF k, top_k
+
+    def test_ranked_keyword_ids_replace_the_bm25_cte(self):
+        sql, params = self._execute(keyword_ids=[9, 4])
+        self.assertEqual(sql.count('%s'), len(params))
+        self.assertIn('unnest(%s::bigint[]) WITH ORDINALITY', sql)
+        self.assertEqual(params[2:], ([9, 4], 60, 5))
+        self.assertNotIn('%기간이%', params)
+
+    def _search(self, **kwargs):
+        future = Future()
+        future.set_result([0.5] * 1536)
+        self.service.client = object()
+        self.service.hybrid_search_mode = 'sql'
+        self.service.rerank_enabled = False
+        self.service.ngram_search_enabled = True
+        with mock.patch.object(services, 'connection', mock.Mock(vendor='postgresql')), \
+                mock.patch.object(self.service, '_submit_embedding', return_value=future), \
+                mock.patch.object(self.service, '_use_exact_search', return_value=False), \
+                mock.patch.object(self.service, '_keyword_search', return_value=([_hit(9), _hit(4)], True)) as keyword, \
+                mock.patch.object(self.service, '_hybrid_search_sql', return_value=[]) as hybrid:
+            self.service._search_memory([3], "모집 기간", 5, **kwargs)
+        return keyword, hybrid.call_args.kwargs
+
+    def test_document_scope_uses_postings_and_the_exact_threshold(self):
+        keyword, call = self._search(document_id=7, exclude_sources=None)
+        keyword.assert_called_once()
+        self.assertEqual(call['keyword_ids'], [9, 4])
+        # A document scope over VECTOR_EXACT_SEARCH_THRESHOLD rows is no longer forced exact
+        self.assertFalse(call['exact'])
+
+    def test_scope_without_postings_keeps_the_inline_bm25(self):
+        keyword, call = self._search(document_id=None, exclude_sources=['pdf'])
+        keyword.assert_not_called()
+        self.assertIsNone(call['keyword_ids'])
+
+
+class VectorScanSettingsTests(SimpleTestCase):
+    def _statements(self, in_atomic_block, previous='on'):
+        db = mock.MagicMock(in_atomic_block=in_atomic_block)
+        cursor = db.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (previous,)
+        service = ChatMemoryService()
+        with mock.patch.object(services, 'connection', db), \
+                mock.patch.object(services.transaction, 'atomic', return_value=nullcontext()):
+            with service._vector_scan_settings(exact=True, limit=20):
+                cursor.execute("SELECT 1")
+        return [c.args for c in cursor.execute.call_args_list]
+
+    def test_own_transaction_needs_no_restore(self):
+        self.assertEqual(self._statements(False), [
+            ("SELECT set_config(%s, %s, true)", ['enable_indexscan', 'off']),
+            ("SELECT 1",),
+        ])
+
+    def test_settings_do_not_outlive_the_block_in_a_callers_transaction(self):
+        self.assertEqual(self._statements(True), [
+            ("SELECT current_setting(%s, true)", ['enable_indexscan']),
+            ("SELECT set_config(%s, %s, true)", ['enable_indexscan', 'off']),
+            ("SELECT 1",),
+            ("SELECT set_config(%s, %s, true)", ['enable_indexscan', 'on']),
+        ])
@@ -0,0 +1,37 @@
+"""
+병합 단계의 격자 공간 인덱스 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+import random
+
+from django.test import SimpleTestCase
+from apps.chats.spatial import BoxGrid
+from apps.chats.tasks import merge_parsed_and_ocr
+from benchmarks.merge import dense_page, naive_merge
+
+
+def overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class BoxGridTests(SimpleTestCase):
+    def test_candidates_include_every_overlapping_box(self):
+        rng = random.Random(1)
+        boxes = []
+        for _ in range(300):
+            x, y = rng.uniform(-20, 580), rng.uniform(-20, 820)
+            boxes.append([x, y, x + rng.uniform(1, 120), y + rng.uniform(1, 40)])
+        boxes.append([0, 0, 595, 842])  # full-page block
+        grid = BoxGrid(boxes)
+        for _ in range(200):
+            x, y = rng.uniform(0, 560), rng.uniform(0, 800)
+            query = [x, y, x + rng.uniform(1, 60), y + rng.uniform(1, 30)]
+            expected = {i for i, box in enumerate(boxes) if overlaps(query, box)}
+            self.assertTrue(expected <= set(grid.candidates(query)))
+
+    def test_merge_matches_all_pairs_merge_on_dense_page(self):
+        parsed, ocr = dense_page(300, seed=3)
+        with self.assertLogs('apps.chats.tasks', level='INFO'):
+            merged = merge_parsed_and_ocr(parsed, ocr)
+        self.assertEqual(merged, naive_merge(parsed, ocr))
+        self.assertEqual(len(merged) - len(parsed), len(ocr) - len(parsed))
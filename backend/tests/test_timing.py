@@ -0,0 +1,70 @@
+"""
+타이밍 스팬·히스토그램 테스트 (DB 불필요).
+Docker 환경에서만 실행합니다.
+"""
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+from apps.chats import timing
+from apps.chats.batching import EmbeddingCoalescer
+from apps.chats.services import ChatMemoryService
+from apps.chats.timing import SpanHistograms
+from apps.core import views as core_views
+from tests.fakes import FakeConnection, FakeRedis
+
+
+class TimingTests(SimpleTestCase):
+    def setUp(self):
+        self.histograms = SpanHistograms(redis_connection=FakeConnection(FakeRedis()))
+        patcher = mock.patch.object(timing, 'histograms', self.histograms)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_spans_and_counters_are_collected_in_a_trace(self):
+        with timing.trace() as trace:
+            with timing.span('search_memory', document_scoped=True) as attrs:
+                attrs['vector_candidates'] = 20
+            timing.record('search_memory.vector', 12.5)
+            timing.incr('embedding_cache.hit')
+        data = trace.as_dict()
+        self.assertEqual([s['name'] for s in data['spans']], ['search_memory', 'search_memory.vector'])
+        self.assertEqual(data['spans'][0]['vector_candidates'], 20)
+        self.assertTrue(data['spans'][0]['document_scoped'])
+        self.assertEqual(data['counters'], {'embedding_cache.hit': 1})
+
+    def test_spans_outside_a_trace_are_ignored(self):
+        with timing.span('fal.chat'):
+            pass
+        timing.incr('rerank_cache.hit')
+        self.assertEqual(self.histograms.render_prometheus().count('span_duration_seconds_count'), 0)
+
+    def test_prometheus_histogram_is_cumulative(self):
+        self.histograms.observe([('fal.chat', 40.0), ('fal.chat', 3000.0)], {'rerank_cache.hit': 2})
+        text = self.histograms.render_prometheus()
+        self.assertIn('span_duration_seconds_bucket{span="fal.chat",le="0.05"} 1', text)
+        self.assertIn('span_duration_seconds_bucket{span="fal.chat",le="5.0"} 2', text)
+        self.assertIn('span_duration_seconds_bucket{span="fal.chat",le="+Inf"} 2', text)
+        self.assertIn('span_duration_seconds_count{span="fal.chat"} 2', text)
+        self.assertIn('span_events_total{event="rerank_cache.hit"} 2', text)
+
+    def test_coalesced_embedding_is_timed_in_the_callers_trace(self):
+        service = ChatMemoryService()
+        service.client = object()
+        service.embedding_cache = None
+        service.embedding_coalescer = EmbeddingCoalescer(lambda texts: [[1.0] for _ in texts], max_wait=0.001)
+        with timing.trace() as trace:
+            self.assertEqual(service.embed_text('질문'), [1.0])
+        self.assertEqual([s['name'] for s in trace.as_dict()['spans']], ['embedding.request'])
+
+    def test_metrics_is_disabled_without_a_token(self):
+        factory = RequestFactory()
+        with mock.patch.object(core_views, 'config', return_value=''):
+            response = core_views.metrics(factory.get('/api/v1/metrics/'))
+        self.assertEqual(response.status_code, 404)
+
+    def test_metrics_requires_the_token_when_configured(self):
+        factory = RequestFactory()
+        with mock.patch.object(core_views, 'config', return_value='secret'):
+            self.assertEqual(core_views.metrics(factory.get('/api/v1/metrics/')).status_code, 403)
+            response = core_views.metrics(factory.get('/api/v1/metrics/', HTTP_AUTHORIZATION='Bearer secret'))
+        self.assertEqual(response.status_code, 200)